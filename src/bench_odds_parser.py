@@ -0,0 +1,152 @@
+import json
+import os
+import re
+import sys
+import time
+
+from odds_parser import parse_cell, parse_total, parse_cells, parse_totals
+
+# ===========================
+# ⚙️ 運彩解析基準測試設定區
+# ===========================
+# 1. 先用黃金樣本確認解析結果與 V5 完全相同 (任何一筆不同就以 exit 1 結束)
+# 2. 再跟原始 V5 實作比速度；想加速解析引擎時，兩步都要過才算數
+# 黃金樣本 = 封存賽果頁 (data/odds_archive) 中實際出現過的每一種欄位文字 (source: archive)
+#          + 手寫的邊界案例 (source: manual)；期望值一律由下面的 V5 原始實作產生。
+# 有新的封存頁面時執行 python src/bench_odds_parser.py --rebuild 重新收集。
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'odds_cells_golden.json')
+ROUNDS = 2000   # 每一輪把所有樣本解析一遍
+
+# ===========================
+# 📜 原始 V5 實作 (基準對照組，請勿修改)
+# ===========================
+def reference_parse_cell(text):
+    if not text or text == '-' or '未開' in text: return None, None
+    is_pk = 'PK' in text.upper()
+    text = re.sub(r'\(.*?\)', '', text).replace('&nbsp;', '').strip()
+    nums = re.findall(r'[-+]?\d+\.\d+|[-+]?\d+', text)
+    final_val = None
+    final_odds = None
+    if not nums:
+        if is_pk: return 0.0, None
+        return None, None
+    nums_float = []
+    for n in nums:
+        try: nums_float.append(float(n))
+        except: pass
+    if not nums_float: return None, None
+    if len(nums_float) == 1:
+        val = nums_float[0]
+        if val > 50 or val == 0:
+            final_val = val
+        else:
+            final_odds = val
+    elif len(nums_float) >= 2:
+        final_odds = nums_float[-1]
+        final_val = nums_float[-2]
+    if is_pk: final_val = 0.0
+    return final_val, final_odds
+
+def reference_parse_total(txt):
+    if not txt: return None, None, False
+    is_ov = '大' in txt
+    v, o = reference_parse_cell(txt)
+    if v is not None: v = abs(v)
+    return v, o, is_ov
+
+def load_golden():
+    with open(GOLDEN_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+def archive_cell_texts():
+    """從所有封存的賽果頁收集欄位文字 (依出現順序去重)，用的是爬蟲本身的 extract_games"""
+    import odds_archive
+    from fetch_odds import extract_games
+
+    texts = {}
+    for gametime in odds_archive.list_gametimes():
+        content = odds_archive.load(gametime)
+        if not content: continue
+        for _, _, cells in extract_games(content):
+            for pair in cells.values():
+                texts.update(dict.fromkeys(pair))
+    return list(texts)
+
+def golden_case(text, source):
+    return {'text': text, 'cell': list(reference_parse_cell(text)),
+            'total': list(reference_parse_total(text)), 'source': source}
+
+def rebuild_golden():
+    """重新產生黃金樣本：保留手寫案例，封存頁面中的欄位文字全部重新收集"""
+    manual = [c for c in load_golden() if c.get('source') == 'manual'] if os.path.exists(GOLDEN_PATH) else []
+    known = {c['text'] for c in manual}
+    archived = [golden_case(t, 'archive') for t in archive_cell_texts() if t not in known]
+    cases = [golden_case(c['text'], 'manual') for c in manual] + archived
+    with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+        f.write('[\n' + ',\n'.join(' ' + json.dumps(c, ensure_ascii=False) for c in cases) + '\n]\n')
+    print(f"✅ 黃金樣本已更新：手寫 {len(manual)} 筆 + 封存頁面 {len(archived)} 筆")
+    return cases
+
+def check_golden(cases):
+    """逐筆比對解析引擎 (單筆與批次 API) 與黃金樣本，回傳不一致的清單"""
+    texts = [c['text'] for c in cases]
+    batch_cells = parse_cells(texts)
+    batch_totals = parse_totals(texts)
+
+    mismatches = []
+    for case in cases:
+        b_cell, b_total = batch_cells[case['text']], batch_totals[case['text']]
+        expected_cell = tuple(case['cell'])
+        expected_total = tuple(case['total'])
+        for name, got, expected in [
+            ('parse_cell', parse_cell(case['text']), expected_cell),
+            ('parse_cells', b_cell, expected_cell),
+            ('parse_total', parse_total(case['text']), expected_total),
+            ('parse_totals', b_total, expected_total),
+            ('reference', reference_parse_cell(case['text']), expected_cell),
+        ]:
+            if got != expected:
+                mismatches.append((name, case['text'], got, expected))
+    return mismatches
+
+def timeit(func, texts, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for t in texts:
+            func(t)
+    return time.perf_counter() - start
+
+def run_benchmark(cases, rounds=ROUNDS):
+    texts = [c['text'] for c in cases]
+    total_calls = len(texts) * rounds * 2
+
+    # 冷啟動：清掉快取，量測「第一次看到這些文字」的純解析成本
+    parse_cell.cache_clear(); parse_total.cache_clear()
+    t_ref = timeit(reference_parse_cell, texts, rounds) + timeit(reference_parse_total, texts, rounds)
+    parse_cell.cache_clear(); parse_total.cache_clear()
+    t_cold = timeit(parse_cell.__wrapped__, texts, rounds) + timeit(parse_total.__wrapped__, texts, rounds)
+    # 實際爬取情境：同樣的欄位文字反覆出現，直接命中快取
+    t_new = timeit(parse_cell, texts, rounds) + timeit(parse_total, texts, rounds)
+
+    print(f"📊 樣本 {len(texts)} 筆 x {rounds} 輪 (共 {total_calls:,} 次解析)")
+    print(f"   V5 原始實作   : {t_ref:.3f}s")
+    print(f"   預編譯 (無快取): {t_cold:.3f}s  ({t_ref / t_cold:.1f}x)")
+    print(f"   預編譯 + 快取 : {t_new:.3f}s  ({t_ref / t_new:.1f}x)")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if '--rebuild' in args:
+        args.remove('--rebuild')
+        cases = rebuild_golden()
+    else:
+        cases = load_golden()
+    mismatches = check_golden(cases)
+    if mismatches:
+        print(f"❌ 有 {len(mismatches)} 筆解析結果與黃金樣本不同:")
+        for name, text, got, expected in mismatches:
+            print(f"   [{name}] {text!r}: 得到 {got}，應為 {expected}")
+        sys.exit(1)
+    print(f"✅ {len(cases)} 筆黃金樣本全部一致")
+
+    rounds = int(args[0]) if args else ROUNDS
+    run_benchmark(cases, rounds)
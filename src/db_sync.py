@@ -0,0 +1,274 @@
+import hashlib
+import http.client
+import json
+import os
+import re
+import sys
+import time
+import urllib.error
+import urllib.request
+from contextlib import nullcontext
+
+# ===========================
+# ⚙️ 歷史資料庫同步設定區
+# ===========================
+# 發版時在資料庫旁邊多放一個校驗清單 (nba_raw.db.manifest.json)：
+#   {"size": 總大小, "sha256": 整檔雜湊, "chunk_size": 區塊大小, "chunks": [每個區塊的 sha256, ...]}
+# 同步時逐區塊比對：本機舊檔裡雜湊相同的區塊直接沿用，只用 HTTP Range 下載變動的區塊。
+# SQLite 是原地改寫頁面，新版資料庫大部分區塊都跟舊版一模一樣。
+CHUNK_SIZE = 1024 * 1024       # 1 MiB
+MANIFEST_SUFFIX = '.manifest.json'
+MAX_RANGE_CHUNKS = 32          # 連續缺少的區塊合併成一個 Range 請求，一次最多 32 MiB
+READ_BLOCK = 256 * 1024
+TIMEOUT = 60
+RETRIES = 4                    # 每個請求的重試次數 (指數退避)
+PART_SUFFIX = '.part'          # 下載中的暫存檔，中斷後下次從這裡續傳
+# 沒有校驗清單時的完整下載用另一個暫存檔：.part 會先被撐到完整大小再逐區塊填入，
+# 檔案大小不代表已下載的位置，拿來續傳會把沒填到的區塊當成已下載
+STREAM_PART_SUFFIX = '.stream.part'
+CONTENT_RANGE_RE = re.compile(r'bytes (?:(\d+)-\d+|\*)/(\d+)')
+
+class ChecksumError(Exception):
+    """下載內容與校驗清單不符"""
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def file_chunk_hashes(path, chunk_size=CHUNK_SIZE):
+    """回傳檔案每個區塊的 sha256 列表 (檔案不存在回傳空列表)"""
+    if not os.path.exists(path):
+        return []
+    hashes = []
+    with open(path, 'rb') as f:
+        while block := f.read(chunk_size):
+            hashes.append(_sha256(block))
+    return hashes
+
+def build_manifest(path, chunk_size=CHUNK_SIZE):
+    """替本機資料庫產生校驗清單 (發版時跟資料庫一起上傳)"""
+    whole = hashlib.sha256()
+    chunks = []
+    with open(path, 'rb') as f:
+        while block := f.read(chunk_size):
+            whole.update(block)
+            chunks.append(_sha256(block))
+    return {'size': os.path.getsize(path), 'sha256': whole.hexdigest(), 'chunk_size': chunk_size, 'chunks': chunks}
+
+def file_sha256(path):
+    whole = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(CHUNK_SIZE):
+            whole.update(block)
+    return whole.hexdigest()
+
+def _open(url, start=None, end=None):
+    headers = {}
+    if start is not None:
+        headers['Range'] = f"bytes={start}-{'' if end is None else end}"
+    return urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=TIMEOUT)
+
+def _with_retries(func, what):
+    """網路錯誤 (含傳到一半斷線的 IncompleteRead) 或校驗失敗時指數退避重試，最後一次仍失敗就把例外丟出去"""
+    for attempt in range(RETRIES):
+        try:
+            return func()
+        except (urllib.error.URLError, OSError, http.client.HTTPException, ChecksumError) as e:
+            if attempt == RETRIES - 1:
+                raise
+            wait = 2 ** attempt
+            print(f"   ⚠️ {what} 失敗 ({e})，{wait} 秒後重試...")
+            time.sleep(wait)
+
+def fetch_manifest(url):
+    """
+    下載校驗清單；只有伺服器明確回 404 (沒有提供清單) 時回傳 None。
+    連線錯誤照常重試，重試用完或清單格式錯誤都直接丟出例外：
+    暫時連不上就退回無法驗證的完整下載，等於放掉 checksum 保護。
+    """
+    def attempt():
+        try:
+            with _open(url + MANIFEST_SUFFIX) as resp:
+                return resp.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    body = _with_retries(attempt, "下載校驗清單")
+    if body is None:
+        return None
+    manifest = json.loads(body.decode('utf-8'))
+    if not all(k in manifest for k in ('size', 'sha256', 'chunk_size', 'chunks')):
+        raise ValueError(f"校驗清單格式錯誤: {url + MANIFEST_SUFFIX}")
+    return manifest
+
+def _fetch_run(url, out, manifest, run):
+    """
+    用一個 Range 請求下載 run = [first, last] 這一段區塊，邊收邊驗證每個區塊的雜湊。
+    每驗證完一個區塊就把 run[0] 往後推，重試時只從還沒完成的區塊接著抓。
+    伺服器不支援 Range (回 200) 時，整檔收下並驗證全部區塊，回傳 True 表示已經全部寫完。
+    """
+    size, chunk_size, chunks = manifest['size'], manifest['chunk_size'], manifest['chunks']
+    first, last = run
+    start = first * chunk_size
+    end = min(size, (last + 1) * chunk_size) - 1
+    with _open(url, start, end) as resp:
+        full = resp.status == 200
+        if full:
+            first, start = 0, 0
+            last = len(chunks) - 1
+        out.seek(start)
+        for i in range(first, last + 1):
+            expected_len = min(chunk_size, size - i * chunk_size)
+            block = resp.read(expected_len)
+            if len(block) != expected_len or _sha256(block) != chunks[i]:
+                raise ChecksumError(f"區塊 {i} 校驗失敗")
+            out.write(block)
+            if not full:
+                run[0] = i + 1
+    return full
+
+def _missing_runs(missing, max_chunks=MAX_RANGE_CHUNKS):
+    """把缺少的區塊編號切成連續區段 [(first, last), ...]"""
+    runs = []
+    for i in missing:
+        if runs and runs[-1][1] == i - 1 and i - runs[-1][0] < max_chunks:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return runs
+
+def sync_file(url, dest, manifest=None):
+    """
+    🔄 依校驗清單把 dest 同步成伺服器上的版本，回傳實際下載的位元組數。
+    - 本機舊檔中雜湊相同的區塊直接沿用 (差異傳輸)
+    - 上次中斷留下的 .part 檔中已驗證的區塊不重抓 (續傳)
+    - 最後比對整檔 sha256，通過才取代 dest
+    伺服器沒有校驗清單時，退回可續傳的完整下載。
+    """
+    manifest = manifest or fetch_manifest(url)
+    if manifest is None:
+        print("   ⚠️ 找不到校驗清單，改用可續傳的完整下載 (無法驗證 checksum)")
+        # 逐區塊下載的 .part 已被撐到完整大小，不能拿來續傳
+        _remove(dest + PART_SUFFIX)
+        return resume_download(url, dest)
+
+    size, chunk_size, chunks = manifest['size'], manifest['chunk_size'], manifest['chunks']
+    local = file_chunk_hashes(dest, chunk_size)
+    if local == chunks and os.path.getsize(dest) == size:
+        print("   ✅ 本機資料庫已是最新版本 (校驗一致)")
+        return 0
+
+    part = dest + PART_SUFFIX
+    have = file_chunk_hashes(part, chunk_size)
+    missing, reused, resumed = [], 0, 0
+    with open(part, 'r+b' if os.path.exists(part) else 'w+b') as out, \
+         (open(dest, 'rb') if local else nullcontext()) as src:
+        out.truncate(size)
+        for i, digest in enumerate(chunks):
+            if i < len(have) and have[i] == digest:
+                resumed += 1
+            elif i < len(local) and local[i] == digest:
+                src.seek(i * chunk_size)
+                out.seek(i * chunk_size)
+                out.write(src.read(chunk_size))
+                reused += 1
+            else:
+                missing.append(i)
+
+        total_bytes = sum(min(chunk_size, size - i * chunk_size) for i in missing)
+        print(f"   📦 共 {len(chunks)} 個區塊：沿用本機 {reused}、續傳 {resumed}、"
+              f"需下載 {len(missing)} ({total_bytes / 1024 / 1024:.1f} MB)")
+        for run in _missing_runs(missing):
+            full = _with_retries(lambda: _fetch_run(url, out, manifest, run), f"下載區塊 {run[0]}-{run[1]}")
+            if full:
+                total_bytes = size   # 伺服器不支援 Range，已經整檔重抓
+                break
+
+    if file_sha256(part) != manifest['sha256']:
+        os.remove(part)
+        raise ChecksumError("整檔 sha256 與校驗清單不符，已刪除暫存檔")
+    os.replace(part, dest)
+    _remove(dest + STREAM_PART_SUFFIX)   # 之前沒有清單時留下的完整下載暫存檔已用不到
+    return total_bytes
+
+def _remove(path):
+    try: os.remove(path)
+    except FileNotFoundError: pass
+
+def _content_range(resp_or_error):
+    """解析 Content-Range，回傳 (起點, 總大小)；416 的 "bytes */總大小" 起點為 None，沒有標頭回傳 None"""
+    match = CONTENT_RANGE_RE.fullmatch((resp_or_error.headers.get('Content-Range') or '').strip())
+    if not match:
+        return None
+    start, total = match.groups()
+    return (None if start is None else int(start)), int(total)
+
+def resume_download(url, dest):
+    """
+    沒有校驗清單時的完整下載：寫進 .stream.part，中斷後用 Range 從已下載的位置接著抓。
+    無法驗證 checksum，至少要確認檔案大小跟伺服器回報的總大小一致才取代 dest。
+    """
+    part = dest + STREAM_PART_SUFFIX
+    downloaded = 0
+    total = None   # 伺服器回報的檔案總大小 (Content-Length / Content-Range)
+
+    def attempt():
+        nonlocal downloaded, total
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        try:
+            resp = _open(url, offset) if offset else _open(url)
+        except urllib.error.HTTPError as e:
+            if e.code != 416:
+                raise
+            # 續傳起點超過檔尾：只有伺服器回報的總大小正好等於暫存檔大小才算下載完成
+            reported = _content_range(e)
+            if reported is not None and reported[1] == offset:
+                total = offset
+                return
+            _remove(part)
+            raise OSError(f"續傳位置 {offset} 超出伺服器檔案大小 ({e.headers.get('Content-Range')})，已刪除暫存檔重新下載")
+        with resp:
+            expected = resp.headers.get('Content-Length')
+            if resp.status == 200:
+                offset = 0   # 伺服器不支援 Range，從頭來過
+                if expected is not None:
+                    total = int(expected)
+            else:
+                reported = _content_range(resp)
+                if reported is None or reported[0] != offset:
+                    _remove(part)
+                    raise OSError(f"伺服器回傳的區段與續傳位置 {offset} 不符 ({resp.headers.get('Content-Range')})，已刪除暫存檔重新下載")
+                total = reported[1]
+            received = 0
+            with open(part, 'r+b' if offset else 'wb') as f:
+                f.seek(offset)
+                f.truncate()
+                while block := resp.read(READ_BLOCK):
+                    f.write(block)
+                    received += len(block)
+                    downloaded += len(block)
+            if expected is not None and received != int(expected):
+                raise OSError(f"連線中斷 ({received}/{expected} bytes)")
+
+    _with_retries(attempt, "下載歷史資料庫")
+    size = os.path.getsize(part)
+    if total is not None and size != total:
+        _remove(part)
+        raise ChecksumError(f"下載大小 {size} 與伺服器回報的 {total} bytes 不符，已刪除暫存檔")
+    os.replace(part, dest)
+    return downloaded
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == 'manifest':
+        # python src/db_sync.py manifest data/nba_raw.db  → 產生 data/nba_raw.db.manifest.json (跟資料庫一起上傳)
+        db_path = sys.argv[2]
+        with open(db_path + MANIFEST_SUFFIX, 'w', encoding='utf-8') as f:
+            json.dump(build_manifest(db_path), f)
+        print(f"✅ 已產生 {db_path + MANIFEST_SUFFIX}")
+    else:
+        # python src/db_sync.py  → 把本機歷史資料庫同步到最新發布的版本
+        from prepare_data import HISTORICAL_DB_URL, HISTORICAL_DB_PATH
+        os.makedirs(os.path.dirname(HISTORICAL_DB_PATH), exist_ok=True)
+        n = sync_file(HISTORICAL_DB_URL, HISTORICAL_DB_PATH)
+        print(f"✅ 同步完成，本次下載 {n / 1024 / 1024:.1f} MB")
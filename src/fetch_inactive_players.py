@@ -1,12 +1,16 @@
 import pandas as pd
-import sqlite3
-import time
-import random
-import concurrent.futures
+import asyncio
+import datetime
 import warnings
 import os
-from requests.exceptions import ReadTimeout, ConnectTimeout, ConnectionError
-from urllib3.exceptions import ProtocolError
+from tqdm import tqdm
+
+# 🌐 與其他 stats.nba.com 爬蟲共用的非同步客戶端 (限流器、快取、重試都在裡面)
+from nba_http import NBAStatsClient, result_set_to_frame
+from game_calendar import parse_game_id, season_code, SEASON_TYPE_CODES
+from nba_db import get_connection, close_connection, WriteBehindBuffer
+# 🗓️ 新比賽優先的排程 + 進度公告 (generate_injury 可在關鍵比賽入庫後先開工)
+from fetch_scheduler import fetch_priority, is_critical, ProgressPublisher, TIER_BACKFILL
 
 # 嘗試匯入 V3
 try:
@@ -23,12 +27,20 @@ warnings.filterwarnings("ignore")
 # ===========================
 # ⚙️ 雲端自動化設定區
 # ===========================
-DB_PATH = 'data/nba_current.db'  # 👈 改為讀寫輕量級的新資料庫
-
 # === 防鎖定設定 ===
-MAX_WORKERS = 2         # 雲端 Proxy 建議稍微調降並行數，避免連線被 Webshare 視為惡意攻擊
-BASE_DELAY = (0.6, 1.5) 
-ERROR_DELAY = 10      
+MIN_IN_FLIGHT = 2       # 並行數下限 (相當於舊版的 2 個 worker)
+MAX_IN_FLIGHT = 8       # 並行數上限：延遲穩定時才會慢慢加上去，避免連線被 Webshare 視為惡意攻擊
+
+# V2 從 2025/04/10 之後就沒有傷兵資料：2024-25 季後賽 / 附加賽與 2025-26 以後直接打 V3
+V3_FIRST_SEASON = 2025
+V3_FIRST_POSTSEASON = 2024
+POSTSEASON_CODES = {code for code, name in SEASON_TYPE_CODES.items() if name in ('Playoffs', 'PlayIn')}
+
+# 「無傷兵」標記的有效天數：近兩季的比賽過期後重新確認一次 (資料可能晚上架)，更早的賽季永久有效
+EMPTY_TTL_DAYS = 3
+
+PROGRESS_STAGE = 'inactive_players'
+PROGRESS_EVERY = 100    # 每處理這麼多場就把緩衝寫入並公告一次進度
 
 # ===========================
 # 🛡️ Proxy 代理伺服器設定
@@ -43,33 +55,9 @@ def setup_proxy():
     else:
         print("⚠️ 警告：未偵測到 PROXY_URL 環境變數，將使用 GitHub 預設 IP 連線（極可能被擋）。")
 
-# === 🔥 終極防護：真實瀏覽器偽裝 ===
-USER_AGENTS = [
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0.3 Safari/605.1.15',
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0',
-    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
-]
-
-def get_headers():
-    return {
-        'Host': 'stats.nba.com',
-        'User-Agent': random.choice(USER_AGENTS),
-        'Accept': 'application/json, text/plain, */*',
-        'Accept-Language': 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
-        'Referer': 'https://www.nba.com/',
-        'Origin': 'https://www.nba.com',
-        'x-nba-stats-origin': 'stats',
-        'x-nba-stats-token': 'true',
-        'Connection': 'keep-alive',
-        'Sec-Fetch-Dest': 'empty',
-        'Sec-Fetch-Mode': 'cors',
-        'Sec-Fetch-Site': 'same-site',
-    }
-
 def init_db():
-    if not os.path.exists('data'): os.makedirs('data')
-    conn = sqlite3.connect(DB_PATH)
+    # 🔌 共用的 WAL 連線 (整個行程只有這一條)
+    conn = get_connection()
     c = conn.cursor()
     c.execute('''
         CREATE TABLE IF NOT EXISTS inactive_players (
@@ -83,151 +71,146 @@ def init_db():
     ''')
     c.execute('''
         CREATE TABLE IF NOT EXISTS empty_inactive_games (
-            game_id TEXT PRIMARY KEY
+            game_id TEXT PRIMARY KEY,
+            checked_at TEXT
         )
     ''')
+    # 舊版資料庫的標記表沒有 checked_at，補上欄位 (NULL 視為已過期，會重新確認)
+    c.execute("PRAGMA table_info(empty_inactive_games)")
+    if 'checked_at' not in [info[1] for info in c.fetchall()]:
+        c.execute("ALTER TABLE empty_inactive_games ADD COLUMN checked_at TEXT")
     conn.commit()
     return conn
 
-def clean_false_empty_games(conn):
-    """自動修復：刪除那些被錯誤標記為 '空' 的 2025-26 賽季比賽"""
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT game_id FROM empty_inactive_games WHERE game_id LIKE '%225%' OR game_id LIKE '%425%'")
-        suspicious_ids = [row[0] for row in cursor.fetchall()]
-        
-        if suspicious_ids:
-            print(f"🧹 發現 {len(suspicious_ids)} 場疑似誤判為空的比賽，正在清除重抓...")
-            cursor.execute("DELETE FROM empty_inactive_games WHERE game_id LIKE '%225%' OR game_id LIKE '%425%'")
-            conn.commit()
-    except Exception as e:
-        pass
-
 def get_missing_game_ids(conn):
+    """
+    🔍 用 SQL 集合差 (EXCEPT) 直接在資料庫裡算出還沒有傷兵名單的比賽，
+    三張表都靠 GAME_ID 開頭的索引/主鍵比對，不再把所有 ID 讀進 pandas。
+    「無傷兵」標記只有在還沒過期時才排除：
+    近兩季 (依 Game ID 第 4~5 碼判斷) 的標記超過 EMPTY_TTL_DAYS 天就會重新確認。
+    回傳 [(game_id, 比賽日期, 是否為重新確認), ...]，最新的比賽排在最前面。
+    """
+    this_year = datetime.date.today().year
+    recent_codes = (season_code(this_year - 1), season_code(this_year))
+    expire_before = (datetime.datetime.now() - datetime.timedelta(days=EMPTY_TTL_DAYS)).isoformat(timespec='seconds')
     try:
-        clean_false_empty_games(conn)
-
-        base_df = pd.read_sql("SELECT DISTINCT GAME_ID FROM boxscore_base", conn)
-        base_df.columns = [c.upper() for c in base_df.columns]
-        all_games = set(base_df['GAME_ID'].astype(str).tolist())
-        
-        inactive_df = pd.read_sql("SELECT DISTINCT game_id FROM inactive_players", conn)
-        inactive_df.columns = [c.upper() for c in inactive_df.columns]
-        existing_games = set(inactive_df['GAME_ID'].astype(str).tolist()) if not inactive_df.empty else set()
-        
-        try:
-            empty_df = pd.read_sql("SELECT DISTINCT game_id FROM empty_inactive_games", conn)
-            empty_df.columns = [c.upper() for c in empty_df.columns]
-            empty_games = set(empty_df['GAME_ID'].astype(str).tolist())
-        except:
-            empty_games = set()
-            
-        missing_games = sorted(list(all_games - existing_games - empty_games))
-        return missing_games
+        cursor = conn.execute('''
+            SELECT GAME_ID, MAX(substr(GAME_DATE, 1, 10)),
+                   EXISTS (SELECT 1 FROM empty_inactive_games e WHERE e.game_id = boxscore_base.GAME_ID)
+            FROM boxscore_base
+            WHERE GAME_ID IN (
+                SELECT GAME_ID FROM boxscore_base
+                EXCEPT
+                SELECT GAME_ID FROM inactive_players
+                EXCEPT
+                SELECT game_id FROM empty_inactive_games
+                WHERE substr(game_id, 4, 2) NOT IN (?, ?) OR checked_at >= ?
+            )
+            GROUP BY GAME_ID
+            ORDER BY 2 DESC, 1 DESC
+        ''', (*recent_codes, expire_before))
+        return [(str(game_id), game_date, bool(recheck)) for game_id, game_date, recheck in cursor.fetchall()]
     except Exception as e:
         print(f"❌ 讀取 Game ID 失敗: {e}")
         return []
 
-def fetch_from_v3(game_id):
-    """使用 V3 API 解析資料"""
-    if not HAS_V3: return pd.DataFrame()
+def summary_request(endpoint_cls, game_id):
+    """借用 nba_api 的端點類別產生 BoxScoreSummary 參數 (不實際發出請求)"""
+    ep = endpoint_cls(game_id=game_id, get_request=False)
+    return ep.endpoint, ep.parameters, game_id
+
+def uses_v3(game_id):
+    """依 Game ID 裡的賽季與賽事類型，直接決定該打哪個版本 (不再先打 V2 落空再補 V3)"""
+    if not HAS_V3: return False
+    gid = parse_game_id(game_id)
+    if gid.season_year >= V3_FIRST_SEASON: return True
+    return gid.season_year == V3_FIRST_POSTSEASON and gid.type_code in POSTSEASON_CODES
+
+def parse_v3(data, game_id):
+    """解析 V3 回應中的傷兵名單"""
+    summary = data.get('boxScoreSummary', {})
+    all_inactives = []
     
-    try:
-        data = boxscoresummaryv3.BoxScoreSummaryV3(
-            game_id=game_id, 
-            headers=get_headers(), 
-            timeout=20
-        ).get_dict()
+    for team_key in ['homeTeam', 'awayTeam']:
+        team_data = summary.get(team_key, {})
+        team_id = team_data.get('teamId')
+        inactives_list = team_data.get('inactives', [])
         
-        summary = data.get('boxScoreSummary', {})
-        all_inactives = []
+        for p in inactives_list:
+            entry = {
+                'GAME_ID': game_id,
+                'TEAM_ID': team_id,
+                'PLAYER_ID': p.get('personId'),  
+                'FIRST_NAME': p.get('firstName'), 
+                'LAST_NAME': p.get('familyName'), 
+                'JERSEY_NUM': p.get('jerseyNum')  
+            }
+            if entry['FIRST_NAME'] and entry['LAST_NAME']:
+                entry['PLAYER_NAME'] = f"{entry['FIRST_NAME']} {entry['LAST_NAME']}"
+            else:
+                entry['PLAYER_NAME'] = 'Unknown'
+                
+            all_inactives.append(entry)
         
-        for team_key in ['homeTeam', 'awayTeam']:
-            team_data = summary.get(team_key, {})
-            team_id = team_data.get('teamId')
-            inactives_list = team_data.get('inactives', [])
-            
-            for p in inactives_list:
-                entry = {
-                    'GAME_ID': game_id,
-                    'TEAM_ID': team_id,
-                    'PLAYER_ID': p.get('personId'),  
-                    'FIRST_NAME': p.get('firstName'), 
-                    'LAST_NAME': p.get('familyName'), 
-                    'JERSEY_NUM': p.get('jerseyNum')  
-                }
-                if entry['FIRST_NAME'] and entry['LAST_NAME']:
-                    entry['PLAYER_NAME'] = f"{entry['FIRST_NAME']} {entry['LAST_NAME']}"
-                else:
-                    entry['PLAYER_NAME'] = 'Unknown'
-                    
-                all_inactives.append(entry)
-            
-        if not all_inactives:
-            return pd.DataFrame() 
-            
-        return pd.DataFrame(all_inactives)
+    if not all_inactives:
+        return pd.DataFrame() 
         
-    except Exception as e:
-        raise e
+    return pd.DataFrame(all_inactives)
 
-def fetch_worker(game_id):
-    time.sleep(random.uniform(*BASE_DELAY))
+async def fetch_game(client, game_id, priority=None, recheck=False):
+    """recheck=True：之前標記過「無傷兵」的比賽，不讀快取，一定要問伺服器最新的名單"""
     game_id_str = str(game_id)
+    use_cache = not recheck
     
-    # 判斷是否為 2025-26 以後的賽季 (包含例行賽 225 與 季後賽 425)
-    is_new_season = "225" in game_id_str or "425" in game_id_str
+    if uses_v3(game_id_str):
+        data = await client.get_json(*summary_request(boxscoresummaryv3.BoxScoreSummaryV3, game_id_str), priority, use_cache)
+        if data is None:
+            return ('error', game_id_str, None)
+        df = parse_v3(data, game_id_str)
+    else:
+        data = await client.get_json(*summary_request(boxscoresummaryv2.BoxScoreSummaryV2, game_id_str), priority, use_cache)
+        if data is None:
+            return ('error', game_id_str, None)
+        df = result_set_to_frame(data, 'InactivePlayers')
+        # 舊賽季真的沒有傷兵的比賽很少見，V2 落空時才用 V3 再確認一次
+        if df.empty and HAS_V3:
+            data = await client.get_json(*summary_request(boxscoresummaryv3.BoxScoreSummaryV3, game_id_str), priority, use_cache)
+            if data is None:
+                return ('error', game_id_str, None)
+            df = parse_v3(data, game_id_str)
+
+    if df.empty:
+        return ('empty', game_id_str, None)
     
-    df = pd.DataFrame()
+    # 資料清洗與標準化
+    df['GAME_ID'] = game_id_str
     
-    try:
-        if is_new_season and HAS_V3:
-            df = fetch_from_v3(game_id_str)
+    if 'PLAYER_NAME' not in df.columns:
+        if 'FIRST_NAME' in df.columns:
+            df['PLAYER_NAME'] = df['FIRST_NAME'] + " " + df['LAST_NAME']
         else:
-            boxscore = boxscoresummaryv2.BoxScoreSummaryV2(
-                game_id=game_id_str, 
-                headers=get_headers(), 
-                timeout=20
-            )
-            df = boxscore.inactive_players.get_data_frame()
-            if df.empty and HAS_V3:
-                df = fetch_from_v3(game_id_str)
-
-        if df.empty:
-            return ('empty', game_id_str, None)
-        
-        # 資料清洗與標準化
-        df['GAME_ID'] = game_id_str
-        
-        if 'PLAYER_NAME' not in df.columns:
-            if 'FIRST_NAME' in df.columns:
-                df['PLAYER_NAME'] = df['FIRST_NAME'] + " " + df['LAST_NAME']
-            else:
-                df['PLAYER_NAME'] = 'Unknown'
-                
-        df.columns = [c.upper() for c in df.columns]
-        needed_cols = ['GAME_ID', 'TEAM_ID', 'PLAYER_ID', 'PLAYER_NAME', 'JERSEY_NUM']
-        
-        for col in needed_cols:
-            if col not in df.columns:
-                df[col] = None 
-                
-        clean_df = df[needed_cols].copy()
-        return ('success', game_id_str, clean_df)
-
-    except (ReadTimeout, ConnectTimeout, ConnectionError, ProtocolError):
-        time.sleep(ERROR_DELAY)
-        return ('error', game_id_str, "連線超時")
-    except Exception as e:
-        time.sleep(ERROR_DELAY)
-        return ('error', game_id_str, str(e))
+            df['PLAYER_NAME'] = 'Unknown'
+            
+    df.columns = [c.upper() for c in df.columns]
+    needed_cols = ['GAME_ID', 'TEAM_ID', 'PLAYER_ID', 'PLAYER_NAME', 'JERSEY_NUM']
+    
+    for col in needed_cols:
+        if col not in df.columns:
+            df[col] = None 
+            
+    clean_df = df[needed_cols].copy()
+    return ('success', game_id_str, clean_df)
 
-def fetch_inactive_players(conn):
-    missing_ids = get_missing_game_ids(conn)
-    total_tasks = len(missing_ids)
+async def _fetch_inactive_players(conn):
+    missing = get_missing_game_ids(conn)
+    total_tasks = len(missing)
     print(f"🚀 尚有 {total_tasks} 場比賽需要更新傷兵名單...")
+
+    critical_ids = {gid for gid, game_date, _ in missing if game_date and is_critical(game_date)}
+    progress = ProgressPublisher(conn, PROGRESS_STAGE, total_tasks, len(critical_ids))
     
     if total_tasks == 0:
+        progress.publish(finished=True)
         print("✅ 所有傷兵名單已是最新的。")
         return
 
@@ -235,32 +218,52 @@ def fetch_inactive_players(conn):
     empty_cnt = 0
     error_cnt = 0
     
-    print(f"開始多執行緒抓取 (Workers: {MAX_WORKERS})...")
+    print(f"開始非同步抓取 (並行數 {MIN_IN_FLIGHT} ~ {MAX_IN_FLIGHT}，依延遲自動調整)...")
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_game = {executor.submit(fetch_worker, gid): gid for gid in missing_ids}
-        
-        completed = 0
-        for future in concurrent.futures.as_completed(future_to_game):
-            completed += 1
-            status, game_id, result = future.result()
+    # ✍️ 結果先進寫入緩衝，累積成大批次才 commit；commit 在背景執行緒跑，不會卡住 event loop
+    with WriteBehindBuffer(conn, auto_flush=False) as writer:
+        async with NBAStatsClient(max_in_flight=MAX_IN_FLIGHT, min_in_flight=MIN_IN_FLIGHT, autoscale=True) as client:
+            # 今天/昨天的比賽最先送出，歷史補抓排在最後
+            # (依序 create_task，前幾個直接拿到名額的也會是最新的比賽)
+            tasks = [asyncio.create_task(fetch_game(client, gid, fetch_priority(game_date) if game_date else (TIER_BACKFILL, 0), recheck))
+                     for gid, game_date, recheck in missing]
             
-            if status == 'success':
-                try:
-                    result.to_sql('inactive_players', conn, if_exists='append', index=False)
+            completed = 0
+            for coro in asyncio.as_completed(tasks):
+                completed += 1
+                status, game_id, result = await coro
+                
+                if status == 'success':
+                    writer.add_frame('inactive_players', result)
+                    # 之前被標記為「無傷兵」的比賽這次抓到了，順便撤掉標記
+                    writer.add_row("DELETE FROM empty_inactive_games WHERE game_id = ?", (game_id,))
                     success_cnt += 1
-                except: pass
-            elif status == 'empty':
-                conn.execute("INSERT OR IGNORE INTO empty_inactive_games (game_id) VALUES (?)", (game_id,))
-                conn.commit()
-                empty_cnt += 1
-            else:
-                error_cnt += 1
-            
-            if completed % 5 == 0 or completed == total_tasks:
-                print(f"\r進度: {completed}/{total_tasks} | 成功: {success_cnt} | 空: {empty_cnt} | 失敗: {error_cnt}", end="")
+                elif status == 'empty':
+                    now = datetime.datetime.now().isoformat(timespec='seconds')
+                    writer.add_row("INSERT OR REPLACE INTO empty_inactive_games (game_id, checked_at) VALUES (?, ?)", (game_id, now))
+                    empty_cnt += 1
+                else:
+                    error_cnt += 1
+
+                # 📣 關鍵比賽全部處理完就立刻落地並公告，下游不必等整個補抓結束
+                was_complete = progress.critical_complete
+                progress.mark_done(game_id in critical_ids)
+                announce = (progress.critical_complete and not was_complete) or completed % PROGRESS_EVERY == 0
+                if announce or writer.due:
+                    await writer.flush_async()
+                if announce:
+                    progress.publish()
+                    if not was_complete and progress.critical_complete:
+                        tqdm.write(f"   📣 今天與昨天的 {len(critical_ids)} 場關鍵比賽已入庫，下游可以先開始。")
+                
+                if completed % 5 == 0 or completed == total_tasks:
+                    print(f"\r進度: {completed}/{total_tasks} | 成功: {success_cnt} | 空: {empty_cnt} | 失敗: {error_cnt}", end="")
+
+    progress.publish(finished=True)
+    print(f"\n傷兵名單更新完成！(成功: {success_cnt}, 無傷兵: {empty_cnt}, 失敗: {error_cnt}，共 {writer.commits} 次寫入)")
 
-    print(f"\n傷兵名單更新完成！(成功: {success_cnt}, 無傷兵: {empty_cnt}, 失敗: {error_cnt})")
+def fetch_inactive_players(conn):
+    asyncio.run(_fetch_inactive_players(conn))
 
 if __name__ == "__main__":
     print("🚀 啟動 NBA 傷兵名單爬蟲 (雲端全自動更新版)")
@@ -271,4 +274,4 @@ if __name__ == "__main__":
     try:
         fetch_inactive_players(conn)
     finally:
-        conn.close()
\ No newline at end of file
+        close_connection()
\ No newline at end of file
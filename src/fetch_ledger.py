@@ -0,0 +1,117 @@
+import datetime
+
+# ===========================
+# ⚙️ 抓取帳本設定區
+# ===========================
+LEDGER_TABLE = 'fetch_ledger'
+EMPTY_RECHECK_DAYS = 3   # 抓回 0 筆的日期，幾天內都會重抓 (比賽可能還沒打完或資料還沒上架)
+PARTIAL_RECHECK_DAYS = 14   # 場次比賽程表少的日期 (抓的時候還有比賽在打)，幾天內都會重抓
+# 帳本的 row_count 記的是「當天抓到幾場比賽」(不重複的 GAME_ID)，才能直接跟賽程表的場次比
+
+def init_ledger(conn):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {LEDGER_TABLE} (
+            table_name TEXT,
+            season TEXT,
+            season_type TEXT,
+            game_date TEXT,
+            status TEXT,
+            row_count INTEGER,
+            fetched_at TEXT,
+            PRIMARY KEY (table_name, season, season_type, game_date)
+        )
+    ''')
+    conn.commit()
+
+def seed_ledger(conn, table_name, season, season_type):
+    """
+    第一次使用帳本時，用資料表中已存在的 GAME_DATE 補登為 'ok' (row_count = 當天場次)，
+    避免整季重抓。已經有帳本紀錄的 (表, 賽季, 類型) 不會再補登。
+    """
+    init_ledger(conn)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT 1 FROM {LEDGER_TABLE} WHERE table_name = ? AND season = ? AND season_type = ? LIMIT 1",
+                   (table_name, season, season_type))
+    if cursor.fetchone():
+        return
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+    if not cursor.fetchone():
+        return
+
+    now = datetime.datetime.now().isoformat(timespec='seconds')
+    cursor.execute(f'''
+        INSERT OR IGNORE INTO {LEDGER_TABLE} (table_name, season, season_type, game_date, status, row_count, fetched_at)
+        SELECT ?, ?, ?, substr(GAME_DATE, 1, 10), 'ok', COUNT(DISTINCT GAME_ID), ?
+        FROM {table_name}
+        WHERE SEASON_YEAR = ? AND SEASON_TYPE = ?
+        GROUP BY substr(GAME_DATE, 1, 10)
+    ''', (table_name, season, season_type, now, season, season_type))
+    conn.commit()
+
+def pending_dates(conn, table_name, season, season_type, candidate_dates, expected_games=None):
+    """
+    回傳 candidate_dates 中還需要抓的日期：
+    沒有紀錄、上次失敗、或最近才抓回 0 筆的日期，
+    以及抓到的場次比賽程表少的日期 (抓的時候還有比賽沒打完)。
+    expected_games: {date: 當天場次}；沒有賽程表 (None) 時無法比對場次，
+    最近 EMPTY_RECHECK_DAYS 天內的 'ok' 日期一律重抓。
+    """
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT game_date, status, row_count FROM {LEDGER_TABLE}
+        WHERE table_name = ? AND season = ? AND season_type = ?
+    ''', (table_name, season, season_type))
+
+    today = datetime.date.today()
+    recheck_after = today - datetime.timedelta(days=EMPTY_RECHECK_DAYS)
+    partial_after = today - datetime.timedelta(days=PARTIAL_RECHECK_DAYS)
+    done = set()
+    for game_date, status, row_count in cursor.fetchall():
+        d = datetime.date.fromisoformat(game_date)
+        if status == 'ok':
+            if expected_games is None:
+                complete = d < recheck_after
+            else:
+                complete = (row_count or 0) >= expected_games.get(d, 0) or d < partial_after
+        else:
+            complete = status == 'empty' and d < recheck_after
+        if complete:
+            done.add(d)
+
+    return {d for d in candidate_dates if d not in done}
+
+def record_fetch(conn, table_name, season, season_type, dates, df, failed_ranges):
+    """
+    把一次抓取的結果逐日寫入帳本：
+    落在失敗區間內的日期記為 'failed'，其餘依當天抓到的場次記為 'ok' 或 'empty'。
+    dates 為 None 時 (整季請求) 只登記回應中出現的日期。
+    """
+    counts = {}
+    if not df.empty:
+        counts = df.groupby(df['GAME_DATE'].astype(str).str[:10])['GAME_ID'].nunique().to_dict()
+
+    if dates is None:
+        dates = {datetime.date.fromisoformat(d) for d in counts}
+
+    now = datetime.datetime.now().isoformat(timespec='seconds')
+    rows = []
+    for d in dates:
+        if any(d_from <= d <= d_to for d_from, d_to in failed_ranges if d_from is not None):
+            status, row_count = 'failed', 0
+        else:
+            row_count = counts.get(d.isoformat(), 0)
+            status = 'ok' if row_count > 0 else 'empty'
+        rows.append((table_name, season, season_type, d.isoformat(), status, row_count, now))
+
+    conn.executemany(f'''
+        INSERT OR REPLACE INTO {LEDGER_TABLE} (table_name, season, season_type, game_date, status, row_count, fetched_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    return sum(1 for r in rows if r[4] == 'failed')
+
+def season_days(season, until):
+    """沒有賽程日曆時的退路：從開季 (10/15) 到 until 的每一天"""
+    season_start = datetime.date(int(season.split('-')[0]), 10, 15)
+    return {season_start + datetime.timedelta(days=i) for i in range((until - season_start).days + 1)}
@@ -1,24 +1,71 @@
-import requests
+import asyncio
+import concurrent.futures
+import aiohttp
 from bs4 import BeautifulSoup
-import sqlite3
-import time
-import random
 import datetime
 from datetime import timedelta
-import re
 import os
+import sys
+
+# 🔌 所有階段共用的 WAL 資料庫連線
+from nba_db import DB_PATH, get_connection, close_connection, transaction
+# 🚦 PlaySport 專用的 AIMD 限流器 (取代每頁固定 sleep 1~2 秒)
+from rate_limiter import get_limiter, CircuitOpenError, THROTTLE_STATUS, SERVER_ERROR_STATUS
+# 🗄️ 原始賽果頁壓縮封存 (修正解析邏輯後可用 --reparse 離線重建賠率)
+import odds_archive
+# 🔥 預編譯 + 快取的運彩欄位解析引擎 (結果由 fixtures/odds_cells_golden.json 把關)
+from odds_parser import parse_cell, parse_total, parse_cells, parse_totals
+
+# 優先使用 C 實作的 lxml 解析 HTML；沒裝時退回 BeautifulSoup
+try:
+    from lxml import etree, html as lxml_html
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+    print("⚠️ 警告: 未安裝 lxml，改用較慢的 BeautifulSoup 解析。")
 
 # ===========================
 # ⚙️ 雲端自動化設定區
 # ===========================
-DB_PATH = 'data/nba_current.db'    # 👈 改為讀寫輕量級的新資料庫
 DEFAULT_START_DATE = "2025-10-15"  # 👈 雲端版只負責 2025-26 當前賽季
 DEFAULT_END_DATE   = "2026-06-30"
 
+# === 缺口偵測設定 ===
+GAP_COLUMNS = ['tw_spread_score', 'tw_total_score']  # 任一欄為 NULL 就算缺賠率
+MATCH_WINDOW_DAYS = [1, 0, 2]   # 台灣日期 = 美國比賽日 +1 (最常見)、+0、+2
+ODDS_SETTLE_DAYS = 3            # 賽後這麼多天之後抓到的頁面視為定稿，還是對不到就不再重爬
+# 每一頁最後一次成功下載的時間記在資料庫裡 (不看封存檔的 mtime：checkout / 複製都會重設 mtime，
+# CI 也不會保留 data/odds_archive)
+PAGE_LEDGER_TABLE = 'odds_page_ledger'
+
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
 }
 
+# === 併發爬取設定 ===
+RESULT_URL = "https://www.playsport.cc/gamesData/result?allianceid=3&gametime={gametime}"  # 🔥 使用更穩定的歷史賽果網址
+PAGE_CONCURRENCY = 4     # 同時下載的頁面數
+PARSER_WORKERS = 2       # 解析執行緒數 (lxml 解析時會釋放 GIL)
+PAGE_TIMEOUT = 15
+PAGE_ENCODING = 'utf-8'  # 賽果頁不一定有 <meta charset>，lxml 收到 bytes 會當成 Latin-1，隊名全變亂碼
+LIMITER = get_limiter('playsport.cc')
+
+# 每場比賽要讀的三種運彩欄位
+BET_CELLS = {
+    'spread': 'td-bank-bet01',
+    'total': 'td-bank-bet02',
+    'moneyline': 'td-bank-bet03',
+}
+
+def _has_class(cls):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')"
+
+# 預先編譯好的 XPath 選擇器 (每頁、每列重複使用)
+if HAS_LXML:
+    ROW_XPATH = etree.XPath("//tr[@gameid]")
+    TEAM_LINK_XPATH = etree.XPath(f"(.//td[{_has_class('td-teaminfo')}])[1]//a[contains(@href, 'teamid=')]")
+    BET_XPATHS = {key: etree.XPath(f"(.//td[{_has_class(cls)}])[1]") for key, cls in BET_CELLS.items()}
+
 # ===========================
 # 🛡️ Proxy 代理伺服器設定
 # ===========================
@@ -49,6 +96,17 @@ TEAM_MAPPING = {
     "黃蜂": "CHA", "夏洛特黃蜂": "CHA", "山貓": "CHA", "夏洛特山貓": "CHA", 
 }
 
+# 運彩賠率欄位 (批次 UPDATE 固定使用這個順序)
+ODDS_COLUMNS = [
+    'tw_spread_score', 'tw_total_score',
+    'tw_moneyline_home', 'tw_moneyline_away',
+    'tw_spread_home_odds', 'tw_spread_away_odds',
+    'tw_total_over_odds', 'tw_total_under_odds',
+]
+# COALESCE：這次沒解析到的欄位保留舊值，不會被 NULL 蓋掉
+UPDATE_ODDS_SQL = f"UPDATE games SET {', '.join(f'{c} = COALESCE(?, {c})' for c in ODDS_COLUMNS)} WHERE game_id = ?"
+CLEAR_ODDS_SQL = f"UPDATE games SET {', '.join(f'{c} = NULL' for c in ODDS_COLUMNS)} WHERE game_id = ?"
+
 # 隊名別名，用於容錯匹配
 CODE_ALIASES = {
     "BKN": ["BRK", "NJN"], "BRK": ["BKN"], "NJN": ["BKN"],
@@ -57,270 +115,390 @@ CODE_ALIASES = {
 }
 
 def get_db_connection():
-    return sqlite3.connect(DB_PATH, timeout=30.0)
+    # 不再每場比賽開一次新連線，整個行程共用同一條
+    return get_connection()
 
-def date_range(start, end):
-    """產生日期序列，並處理 T00:00:00 問題"""
-    if 'T' in start: start = start.split('T')[0]
-    if 'T' in end: end = end.split('T')[0]
-    
-    s = datetime.datetime.strptime(start, "%Y-%m-%d")
-    e = datetime.datetime.strptime(end, "%Y-%m-%d")
-    for i in range((e - s).days + 1):
-        yield s + timedelta(days=i)
+def _alias_groups():
+    """把 CODE_ALIASES 展開成連通的同義群組，每個代碼都對應到群組內固定的代表代碼"""
+    canonical = {}
+    for code, aliases in CODE_ALIASES.items():
+        group = {code, *aliases}
+        for c in list(group):
+            group |= canonical.get(c, {c})
+        for c in group:
+            canonical[c] = group
+    return {c: min(group) for c, group in canonical.items()}
+
+CANONICAL_CODES = _alias_groups()
+
+def canonical_code(code):
+    return CANONICAL_CODES.get(code, code)
+
+class GameIndex:
+    """
+    🗂️ games 表的記憶體索引：(比賽日期, 主隊代表代碼, 客隊代表代碼) -> game_id
+    整個爬蟲只讀一次 games 表，之後每場比對都是幾次 dict 查詢，不再對資料庫做 LIKE 掃描。
+    """
+
+    def __init__(self, conn):
+        self.index = {}
+        for game_id, date, home, away in conn.execute("SELECT game_id, date, home_team, away_team FROM games"):
+            if not date: continue
+            self.index[(str(date)[:10], canonical_code(home), canonical_code(away))] = game_id
+
+    def find(self, date_str, h_code, a_code):
+        dt = datetime.datetime.strptime(date_str, "%Y%m%d")
+        h, a = canonical_code(h_code), canonical_code(a_code)
+        # 搜尋視窗：T-1 (最常見), T (同天), T-2 (極少見)
+        for diff in MATCH_WINDOW_DAYS:
+            t_date = (dt - timedelta(days=diff)).strftime("%Y-%m-%d")
+            game_id = self.index.get((t_date, h, a))
+            if game_id:
+                return game_id
+        return None
+
+_GAME_INDEX = None
+
+def get_game_index():
+    global _GAME_INDEX
+    if _GAME_INDEX is None:
+        _GAME_INDEX = GameIndex(get_db_connection())
+    return _GAME_INDEX
 
 def find_game_in_db(date_str, h_code, a_code):
     """
     在資料庫中尋找對應的 game_id
     date_str: YYYYMMDD (台灣時間)
     考慮時差，嘗試 台灣日期 -1, 0, -2 天 (NBA 比賽通常是台灣時間的昨天或當天)
+    球隊改名或縮寫不同 (BKN/NJN、NOP/NOH...) 都會先正規化成同一個代碼再比對
+    """
+    return get_game_index().find(date_str, h_code, a_code)
+
+# 舊名稱保留給既有呼叫端；實作移到預編譯的 odds_parser
+parse_cell_robust = parse_cell
+parse_tot_smart = parse_total
+
+def odds_row(game_id, data):
+    """把解析出的賠率 dict 轉成 UPDATE_ODDS_SQL 的參數 (欄位順序固定)"""
+    return tuple(data.get(c) for c in ODDS_COLUMNS) + (game_id,)
+
+def init_page_ledger(conn):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {PAGE_LEDGER_TABLE} (
+            gametime TEXT PRIMARY KEY,
+            fetched_at TEXT
+        )
+    ''')
+    conn.commit()
+
+def load_page_ledger(conn):
+    """回傳 {gametime: 最後一次成功下載的日期 (date)}"""
+    init_page_ledger(conn)
+    rows = conn.execute(f"SELECT gametime, fetched_at FROM {PAGE_LEDGER_TABLE}").fetchall()
+    return {gametime: datetime.date.fromisoformat(fetched_at[:10]) for gametime, fetched_at in rows}
+
+def update_db(rows, gametime=None, fetched_at=None):
+    """
+    整批更新資料庫：一個 executemany + 一次 commit (rows 來自 odds_row)。
+    有給 gametime 時，同一個交易裡順便登記這一頁的下載時間。
     """
-    conn = get_db_connection(); c = conn.cursor()
-    dt = datetime.datetime.strptime(date_str, "%Y%m%d")
+    if not rows and gametime is None: return 0
+    try:
+        with transaction(get_db_connection()) as conn:
+            conn.executemany(UPDATE_ODDS_SQL, rows)
+            if gametime is not None:
+                conn.execute(f"INSERT OR REPLACE INTO {PAGE_LEDGER_TABLE} (gametime, fetched_at) VALUES (?, ?)",
+                             (gametime, fetched_at))
+        return len(rows)
+    except Exception as e:
+        print(f"寫入錯誤: {e}")
+        return 0
+
+def find_odds_gaps():
+    """
+    🕳️ 找出本季已經打完、但賠率欄位 (GAP_COLUMNS) 還是 NULL 的比賽，
+    取代「從最後一筆有賠率的日期往後爬」的水位線：中間漏掉的比賽也會被找回來。
+    回傳 [(game_id, 比賽日期 date), ...]
+    """
+    conn = get_db_connection()
+    today = datetime.date.today().isoformat()
+    missing = ' OR '.join(f"{c} IS NULL" for c in GAP_COLUMNS)
+    try:
+        rows = conn.execute(f'''
+            SELECT game_id, substr(date, 1, 10) FROM games
+            WHERE ({missing}) AND substr(date, 1, 10) BETWEEN ? AND ?
+            ORDER BY date
+        ''', (DEFAULT_START_DATE, min(today, DEFAULT_END_DATE))).fetchall()
+    except Exception as e:
+        print(f"   ⚠️ 讀取缺賠率比賽錯誤: {e}")
+        return []
+    return [(game_id, datetime.date.fromisoformat(d)) for game_id, d in rows]
+
+def is_final_page(page_day, game_day, fetched):
+    """這一頁是否在賽後 ODDS_SETTLE_DAYS 天之後才抓到 (內容已經定稿)；fetched 來自 load_page_ledger"""
+    fetched_on = fetched.get(page_day.strftime("%Y%m%d"))
+    if fetched_on is None:
+        return False
+    return fetched_on >= game_day + timedelta(days=ODDS_SETTLE_DAYS)
+
+def plan_gap_pages(gaps):
+    """
+    把缺賠率的比賽換算成需要重爬的賽果頁 (台灣日期)：
+    每場只看對應視窗內的頁面，已經定稿過的頁面不再重爬。
+    回傳 (要爬的日期列表, 所有頁面都定稿仍對不到的比賽)
+    """
+    latest_page = datetime.date.today() + timedelta(days=1)
+    fetched = load_page_ledger(get_db_connection())
+    pages = set()
+    unresolved = []
+    for game_id, game_day in gaps:
+        todo = [game_day + timedelta(days=diff) for diff in MATCH_WINDOW_DAYS]
+        todo = [p for p in todo if p <= latest_page and not is_final_page(p, game_day, fetched)]
+        if todo:
+            pages.update(todo)
+        else:
+            unresolved.append((game_id, game_day))
+    return sorted(pages), unresolved
+
+def page_text(content):
+    """下載 / 封存的原始頁面是 bytes，先用 PAGE_ENCODING 解碼再交給解析器"""
+    if isinstance(content, bytes):
+        return content.decode(PAGE_ENCODING, errors='replace')
+    return content
+
+def extract_games_lxml(content):
+    """用 lxml + 預編譯 XPath 取出每場比賽的 (客隊, 主隊, {欄位: (客隊格, 主隊格)})"""
+    rows = ROW_XPATH(lxml_html.fromstring(page_text(content)))
+    games = []
+    i = 0
+    while i < len(rows) - 1:
+        r_away, r_home = rows[i], rows[i+1]
+        if r_away.get('gameid') != r_home.get('gameid'):
+            i += 1; continue
+
+        teams = [a.text_content().strip() for a in TEAM_LINK_XPATH(r_away)]
+        if len(teams) < 2: i += 2; continue
+
+        cells = {}
+        for key, xpath in BET_XPATHS.items():
+            td_a, td_h = xpath(r_away), xpath(r_home)
+            if td_a and td_h:
+                cells[key] = (','.join(td_a[0].itertext()).strip(), ','.join(td_h[0].itertext()).strip())
+        games.append((teams[0], teams[1], cells))
+        i += 2
+    return games
+
+def extract_games_bs4(content):
+    """沒有 lxml 時的退路 (結果與 extract_games_lxml 相同)"""
+    soup = BeautifulSoup(page_text(content), 'html.parser')
+    rows = soup.find_all('tr', attrs={'gameid': True})
+    games = []
+    i = 0
+    while i < len(rows) - 1:
+        r_away, r_home = rows[i], rows[i+1]
+        if r_away.get('gameid') != r_home.get('gameid'):
+            i += 1; continue
+
+        td_info = r_away.find('td', class_='td-teaminfo')
+        if not td_info: i += 2; continue
+        teams = [l.text.strip() for l in td_info.find_all('a') if 'teamid=' in l.get('href', '')]
+        if len(teams) < 2: i += 2; continue
+
+        cells = {}
+        for key, cls in BET_CELLS.items():
+            td_a, td_h = r_away.find('td', cls), r_home.find('td', cls)
+            if td_a and td_h:
+                cells[key] = (td_a.get_text(separator=',').strip(), td_h.get_text(separator=',').strip())
+        games.append((teams[0], teams[1], cells))
+        i += 2
+    return games
+
+def extract_games(content):
+    return extract_games_lxml(content) if HAS_LXML else extract_games_bs4(content)
+
+def game_odds(cells, parsed, totals):
+    """
+    把一場比賽的三種運彩欄位文字解析成 tw_* 欄位 dict。
+    parsed / totals：整頁批次解析的查表結果 (見 page_odds)
+    """
+    data = {}
     
-    # 擴展主客隊代碼 (處理球隊改名或縮寫不同)
-    h_list = [h_code] + CODE_ALIASES.get(h_code, [])
-    a_list = [a_code] + CODE_ALIASES.get(a_code, [])
+    # 1. 運彩讓分 (Spread)
+    try:
+        (_, o_spr_a), (s_spr, o_spr_h) = (parsed[t] for t in cells['spread'])
+        
+        if s_spr is not None: data['tw_spread_score'] = s_spr
+        if o_spr_h: data['tw_spread_home_odds'] = o_spr_h
+        if o_spr_a: data['tw_spread_away_odds'] = o_spr_a
+    except: pass
     
-    # 搜尋視窗：T-1 (最常見), T (同天), T-2 (極少見)
-    for diff in [1, 0, 2]: 
-        t_date = (dt - timedelta(days=diff)).strftime("%Y-%m-%d")
+    # 2. 運彩大小 (Total)
+    try:
+        (v1, o1, is_ov1), (v2, o2, is_ov2) = (totals[t] for t in cells['total'])
         
-        # 模糊搜尋日期 (忽略時間部分)
-        date_pattern = f"{t_date}%"
+        final_tot = v1 if v1 and v1 > 100 else (v2 if v2 and v2 > 100 else None)
+        if final_tot: data['tw_total_score'] = final_tot
         
-        for h in h_list:
-            for a in a_list:
-                c.execute('SELECT game_id FROM games WHERE home_team=? AND away_team=? AND date LIKE ?', (h, a, date_pattern))
-                res = c.fetchone()
-                if res: 
-                    conn.close()
-                    return res[0]
-                    
-    conn.close()
-    return None
-
-def parse_cell_robust(text):
+        if o1: data['tw_total_over_odds' if is_ov1 else 'tw_total_under_odds'] = o1
+        if o2: data['tw_total_over_odds' if is_ov2 else 'tw_total_under_odds'] = o2
+    except: pass
+
+    # 3. 運彩獨贏 (Moneyline)
+    try:
+        (_, o_ml_a), (_, o_ml_h) = (parsed[t] for t in cells['moneyline'])
+        if o_ml_a: data['tw_moneyline_away'] = o_ml_a
+        if o_ml_h: data['tw_moneyline_home'] = o_ml_h
+    except: pass
+
+    return data
+
+def match_games(content, date_str, index):
+    """取出頁面中的每場比賽並對應到 game_id，回傳 [(game_id, 運彩欄位), ...] (對不到的比賽略過)"""
+    matched = []
+    for c_away, c_home, cells in extract_games(content):
+        code_away = TEAM_MAPPING.get(c_away)
+        code_home = TEAM_MAPPING.get(c_home)
+        if not code_away or not code_home: continue
+
+        gid = index.find(date_str, code_home, code_away)
+        if gid:
+            matched.append((gid, cells))
+    return matched
+
+def page_odds(matched):
     """
-    🔥 核心引擎 V5 (修復版)：
-    解決完賽後「賠率黏著輸贏字眼」(如 "1.75贏50%") 導致抓不到資料的問題。
+    整頁批次解析：先把這一頁所有比賽的欄位文字一次丟給解析引擎 (重複的文字只解析一次)，
+    再逐場查表組成 tw_* 欄位。回傳 [(game_id, 賠率 dict), ...]，順序同 matched。
     """
-    if not text or text == '-' or '未開' in text: return None, None
-    
-    # 1. 預處理：檢查 PK
-    is_pk = 'PK' in text.upper()
-        
-    # 2. 清洗資料：移除括號內的詳情，以及「贏/輸」後面的百分比
-    text = re.sub(r'\(.*?\)', '', text).replace('&nbsp;', '').strip()
-    
-    # 3. 使用 Regex 強制提取所有數字 (支援負號與小數點)
-    nums = re.findall(r'[-+]?\d+\.\d+|[-+]?\d+', text)
-    
-    final_val = None
-    final_odds = None
-    
-    if not nums:
-        if is_pk: return 0.0, None
-        return None, None
-
-    # 轉成 float 列表
-    nums_float = []
-    for n in nums:
-        try: nums_float.append(float(n))
-        except: pass
-
-    if not nums_float: return None, None
-
-    # 4. 智慧分配邏輯
-    if len(nums_float) == 1:
-        val = nums_float[0]
-        if val > 50 or val == 0: # 大小分分數或PK
-            final_val = val
-        else:
-            final_odds = val # 賠率
-            
-    elif len(nums_float) >= 2:
-        final_odds = nums_float[-1] # 最後一個是賠率
-        final_val = nums_float[-2]  # 倒數第二個是分數
-
-    if is_pk: final_val = 0.0
-
-    return final_val, final_odds
-
-def parse_tot_smart(txt):
-    """解析大小分"""
-    if not txt: return None, None, False
-    is_ov = '大' in txt
-    v, o = parse_cell_robust(txt)
-    if v is not None: v = abs(v) # 大小分一定是正數
-    return v, o, is_ov
-
-def update_db(game_id, data):
-    """更新資料庫"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    cols = []
-    vals = []
-    for k, v in data.items():
-        cols.append(f"{k}=?")
-        vals.append(v)
-    vals.append(game_id)
-    if cols:
-        sql = f"UPDATE games SET {', '.join(cols)} WHERE game_id=?"
-        try: c.execute(sql, vals); conn.commit()
-        except: pass
-    conn.close()
-
-def get_db_date_range():
-    """找出資料庫中最晚的賠率日期，作為下次爬蟲的起點"""
-    if not os.path.exists(DB_PATH):
-        return DEFAULT_START_DATE, DEFAULT_END_DATE
+    parsed = parse_cells(t for _, cells in matched for key in ('spread', 'moneyline') for t in cells.get(key, ()))
+    totals = parse_totals(t for _, cells in matched for t in cells.get('total', ()))
+    return [(gid, game_odds(cells, parsed, totals)) for gid, cells in matched]
 
-    conn = get_db_connection()
-    c = conn.cursor()
-    
+def parse_page(content, date_str, index):
+    """解析一整頁賽果並對應到 game_id，回傳 odds_row 列表 (純運算，在解析執行緒中執行)"""
+    return [odds_row(gid, data) for gid, data in page_odds(match_games(content, date_str, index)) if data]
+
+def archive_and_parse(content, date_str, index):
+    """先把原始頁面壓縮封存，再解析 (兩者都在解析執行緒中進行，不卡住下載)"""
+    odds_archive.save(date_str, content)
+    return parse_page(content, date_str, index)
+
+async def fetch_page(session, date_str):
+    """下載一天的賽果頁，失敗回傳 None"""
     try:
-        # 檢查是否已有賠率數據
-        c.execute("SELECT MAX(date) FROM games WHERE tw_spread_score IS NOT NULL")
-        last_odds_date = c.fetchone()[0]
-        
-        # 今天的日期
-        today = datetime.datetime.now().strftime("%Y-%m-%d")
-
-        if last_odds_date:
-            print(f"   ℹ️ 資料庫已有賠率至 {last_odds_date}，將從隔天開始爬取。")
-            if 'T' in last_odds_date: last_odds_date = last_odds_date.split('T')[0]
-            
-            last_dt = datetime.datetime.strptime(last_odds_date, "%Y-%m-%d")
-            next_day = (last_dt + timedelta(days=1)).strftime("%Y-%m-%d")
-            return next_day, DEFAULT_END_DATE
-        else:
-            # 如果沒賠率，找最早的比賽日期
-            c.execute("SELECT MIN(date) FROM games")
-            first_game_date = c.fetchone()[0]
-            if first_game_date:
-                if 'T' in first_game_date: first_game_date = first_game_date.split('T')[0]
-                print(f"   ℹ️ 尚未有任何賠率資料。將從資料庫最早日期 {first_game_date} 開始爬取。")
-                return first_game_date, DEFAULT_END_DATE
-            else:
-                return DEFAULT_START_DATE, DEFAULT_END_DATE
-            
-    except Exception as e:
-        print(f"   ⚠️ 讀取日期範圍錯誤: {e}")
-        return DEFAULT_START_DATE, DEFAULT_END_DATE
-    finally:
-        conn.close()
+        await LIMITER.acquire_async()
+        # trust_env=True：沿用 setup_proxy() 寫進環境變數的 HTTPS_PROXY (Webshare 代理)
+        async with session.get(RESULT_URL.format(gametime=date_str)) as resp:
+            if resp.status != 200:
+                if resp.status in THROTTLE_STATUS or resp.status in SERVER_ERROR_STATUS:
+                    # 403/429 是被擋、5xx 是上游撐不住，都要降速 (同 nba_http)
+                    LIMITER.on_throttle(f"HTTP {resp.status}")
+                return None, f"失敗 ({resp.status})"
+            content = await resp.read()
+        LIMITER.on_success()
+        return content, None
+    except CircuitOpenError as e:
+        return None, f"放棄 ({e})"
+    except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+        LIMITER.on_throttle((str(e) or type(e).__name__)[:30])
+        return None, f"錯誤: {e}"
+
+async def crawl_dates(dates):
+    """
+    🚀 併發爬取：最多 PAGE_CONCURRENCY 頁同時下載，下載完交給解析執行緒池，
+    主流程依完成順序把每天的賠率整批寫入資料庫。
+    """
+    index = get_game_index()
+    init_page_ledger(get_db_connection())
+    semaphore = asyncio.Semaphore(PAGE_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+
+    async def process(curr, session, executor):
+        date_str = curr.strftime("%Y%m%d") # 網址用 YYYYMMDD
+        async with semaphore:
+            content, error = await fetch_page(session, date_str)
+        if content is None:
+            return curr, None, None, error
+        fetched_at = datetime.datetime.now().isoformat(timespec='seconds')
+        try:
+            updates = await loop.run_in_executor(executor, archive_and_parse, content, date_str, index)
+        except Exception as e:
+            return curr, None, None, f"解析錯誤: {e}"
+        return curr, updates, fetched_at, None
+
+    timeout = aiohttp.ClientTimeout(total=PAGE_TIMEOUT)
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=timeout, trust_env=True) as session:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=PARSER_WORKERS) as executor:
+            tasks = [asyncio.create_task(process(curr, session, executor)) for curr in dates]
+            for coro in asyncio.as_completed(tasks):
+                curr, updates, fetched_at, error = await coro
+                display = curr.strftime("%Y-%m-%d")
+                if updates is None:
+                    print(f"   📥 {display} {error}")
+                    continue
+                # 一天的比賽 + 這一頁的下載時間一次寫入
+                count = update_db(updates, curr.strftime("%Y%m%d"), fetched_at)
+                print(f"   📥 {display} 更新 {count} 場")
 
 def crawl_odds_incremental():
-    print("🔍 正在檢查資料庫進度...")
-    start_date, end_date = get_db_date_range()
-    
-    # 防止爬取未來 (PlaySport 最多只會有未來幾天的盤)
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    limit_date = (datetime.datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d") # 最多爬到未來一週
-    
-    if start_date > limit_date:
+    print("🔍 正在檢查資料庫中缺賠率的比賽...")
+    gaps = find_odds_gaps()
+    pages, unresolved = plan_gap_pages(gaps)
+
+    if unresolved:
+        # 頁面都已定稿還對不到：多半是解析或隊名對照的問題，修正後用 --reparse 重建即可
+        days = sorted({d.isoformat() for _, d in unresolved})
+        print(f"   ⚠️ {len(unresolved)} 場比賽在定稿頁面中仍找不到賠率 (訓練資料會少這些場)，"
+              f"日期: {', '.join(days[:10])}{' ...' if len(days) > 10 else ''}")
+
+    if not pages:
         print("✅ 賠率資料已是最新，無需更新。")
         return
 
     print(f"🚀 PlaySport 運彩盤爬蟲 (雲端自動化版) 啟動...")
-    print(f"📅 範圍: {start_date} ~ {min(end_date, limit_date)}")
-    
-    for curr in date_range(start_date, min(end_date, limit_date)):
-        date_str = curr.strftime("%Y%m%d") # 網址用 YYYYMMDD
-        display = curr.strftime("%Y-%m-%d")
-        
-        # 🔥 使用更穩定的歷史賽果網址
-        url = f"https://www.playsport.cc/gamesData/result?allianceid=3&gametime={date_str}"
-        print(f"   📥 正在爬取 {display} ... ", end="")
-        
-        try:
-            # 由於已設定 os.environ['HTTPS_PROXY']，這裡的 requests 會自動走 Webshare 代理
-            resp = requests.get(url, headers=HEADERS, timeout=15)
-            if resp.status_code != 200: 
-                print(f"失敗 ({resp.status_code})")
-                continue
-            
-            soup = BeautifulSoup(resp.content, 'html.parser')
-            rows = soup.find_all('tr', attrs={'gameid': True})
-            
-            count = 0
-            i = 0
-            while i < len(rows) - 1:
-                r_away = rows[i]
-                r_home = rows[i+1]
-                
-                if r_away.get('gameid') != r_home.get('gameid'):
-                    i += 1; continue
-                    
-                td_info = r_away.find('td', class_='td-teaminfo')
-                if not td_info: i += 2; continue
-                
-                teams = [l.text.strip() for l in td_info.find_all('a') if 'teamid=' in l.get('href', '')]
-                if len(teams) < 2: i += 2; continue
-                
-                c_away, c_home = teams[0], teams[1]
-                code_away = TEAM_MAPPING.get(c_away)
-                code_home = TEAM_MAPPING.get(c_home)
-                
-                if not code_away or not code_home: i += 2; continue
-                
-                gid = find_game_in_db(date_str, code_home, code_away)
-                if not gid: 
-                    i += 2; continue
-                
-                data = {}
-                
-                # 1. 運彩讓分 (Spread)
-                try:
-                    t_spr_a = r_away.find('td', 'td-bank-bet01').get_text(separator=',').strip()
-                    t_spr_h = r_home.find('td', 'td-bank-bet01').get_text(separator=',').strip()
-                    _, o_spr_a = parse_cell_robust(t_spr_a)
-                    s_spr, o_spr_h = parse_cell_robust(t_spr_h)
-                    
-                    if s_spr is not None: data['tw_spread_score'] = s_spr
-                    if o_spr_h: data['tw_spread_home_odds'] = o_spr_h
-                    if o_spr_a: data['tw_spread_away_odds'] = o_spr_a
-                except: pass
-                
-                # 2. 運彩大小 (Total)
-                try:
-                    t_tot_a = r_away.find('td', 'td-bank-bet02').get_text(separator=',').strip()
-                    t_tot_h = r_home.find('td', 'td-bank-bet02').get_text(separator=',').strip()
-                    v1, o1, is_ov1 = parse_tot_smart(t_tot_a)
-                    v2, o2, is_ov2 = parse_tot_smart(t_tot_h)
-                    
-                    final_tot = v1 if v1 and v1 > 100 else (v2 if v2 and v2 > 100 else None)
-                    if final_tot: data['tw_total_score'] = final_tot
-                    
-                    if o1: data['tw_total_over_odds' if is_ov1 else 'tw_total_under_odds'] = o1
-                    if o2: data['tw_total_over_odds' if is_ov2 else 'tw_total_under_odds'] = o2
-                except: pass
-
-                # 3. 運彩獨贏 (Moneyline)
-                try:
-                    t_ml_a = r_away.find('td', 'td-bank-bet03').get_text(separator=',').strip()
-                    t_ml_h = r_home.find('td', 'td-bank-bet03').get_text(separator=',').strip()
-                    _, o_ml_a = parse_cell_robust(t_ml_a)
-                    _, o_ml_h = parse_cell_robust(t_ml_h)
-                    if o_ml_a: data['tw_moneyline_away'] = o_ml_a
-                    if o_ml_h: data['tw_moneyline_home'] = o_ml_h
-                except: pass
-                
-                if data:
-                    update_db(gid, data)
-                    count += 1
-                i += 2
-            
-            print(f"更新 {count} 場")
-            # 禮貌性延遲
-            time.sleep(random.uniform(1.0, 2.0))
-            
-        except Exception as e:
-            print(f"錯誤: {e}")
-            pass
+    print(f"🕳️ {len(gaps)} 場比賽缺賠率，只重爬相關的 {len(pages)} 天頁面 ({pages[0]} ~ {pages[-1]})")
+    asyncio.run(crawl_dates(pages))
+
+def reparse_archive():
+    """
+    🔁 從封存的原始頁面重建 games 表所有 tw_* 欄位 (完全不連網)：
+    封存頁面中對應得到的比賽一律先清空賠率 (包含現在解析不出賠率的)，再依日期順序套用解析結果，
+    結果等同用目前的解析邏輯重新爬一次整段歷史。
+    """
+    gametimes = odds_archive.list_gametimes()
+    if not gametimes:
+        print(f"⚠️ 封存資料夾 {odds_archive.ARCHIVE_DIR} 裡沒有任何頁面。")
+        return
+
+    print(f"🔁 從封存重新解析 {len(gametimes)} 天的賽果頁 ({gametimes[0]} ~ {gametimes[-1]})...")
+    index = get_game_index()
+
+    def load_and_parse(gametime):
+        content = odds_archive.load(gametime)
+        if not content:
+            return [], []
+        odds = page_odds(match_games(content, gametime, index))
+        return [gid for gid, _ in odds], [odds_row(gid, data) for gid, data in odds if data]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PARSER_WORKERS) as executor:
+        pages = list(executor.map(load_and_parse, gametimes))
+
+    game_ids = {gid for page_ids, _ in pages for gid in page_ids}
+    rows = [row for _, page_rows in pages for row in page_rows]
+    with transaction(get_db_connection()) as conn:
+        conn.executemany(CLEAR_ODDS_SQL, [(gid,) for gid in game_ids])
+        conn.executemany(UPDATE_ODDS_SQL, rows)
+    print(f"✅ 已重建 {len(game_ids)} 場比賽的賠率 (其中 {len(game_ids) - len({row[-1] for row in rows})} 場解析不出賠率，已清空)。")
 
 if __name__ == "__main__":
+    # python src/fetch_odds.py --reparse：只從封存重新解析，不爬網站
+    if '--reparse' in sys.argv[1:]:
+        try:
+            reparse_archive()
+        finally:
+            close_connection()
+        sys.exit(0)
+
     print(f"🚀 啟動 NBA 運彩賠率爬蟲 (雲端全自動更新版)")
     # 初始化 Proxy
     setup_proxy()
@@ -328,4 +506,7 @@ if __name__ == "__main__":
     if not os.path.exists(DB_PATH):
         print(f"❌ 找不到資料庫 {DB_PATH}，請先執行 init_games_table.py")
     else:
-        crawl_odds_incremental()
\ No newline at end of file
+        try:
+            crawl_odds_incremental()
+        finally:
+            close_connection()
\ No newline at end of file
@@ -0,0 +1,86 @@
+import asyncio
+import datetime
+
+import pandas as pd
+from tqdm import tqdm
+
+from nba_http import result_set_to_frame, FAIL_RETRY_EXHAUSTED, FAIL_BAD_JSON
+from fetch_scheduler import fetch_priority
+
+# ===========================
+# ⚙️ 區間規劃設定區
+# ===========================
+MAX_RANGE_DAYS = 31     # 單一請求最多涵蓋的天數 (一個月的 game log 回應仍然很小)
+DATE_FMT = "%m/%d/%Y"   # nba_api 的 DateFrom / DateTo 格式
+# 只有這些失敗值得把區間切小重抓；不可重試的狀態碼、斷路中、重播模式缺快取，切小也一樣會失敗
+SPLIT_ON_FAILURES = {FAIL_RETRY_EXHAUSTED, FAIL_BAD_JSON}
+
+def plan_date_ranges(start_dt, end_dt, game_dates=None, skip_dates=None, max_days=MAX_RANGE_DAYS):
+    """
+    把 [start_dt, end_dt] 的缺口合併成最少數量的連續區間 (date_from, date_to)，
+    取代過去「一天一個請求」的逐日切割法。
+    game_dates: 需要抓的日期 (賽程日曆或帳本中待補的日期)；
+    提供時只保留這些日期，整段沒有比賽的缺口不會產生任何請求。
+    skip_dates: 已經抓好的日期，區間不會跨過它們，避免重複下載。
+    """
+    start = start_dt.date() if isinstance(start_dt, datetime.datetime) else start_dt
+    end = end_dt.date() if isinstance(end_dt, datetime.datetime) else end_dt
+
+    ranges = []
+    if game_dates is None:
+        curr = start
+        while curr <= end:
+            range_end = min(curr + datetime.timedelta(days=max_days - 1), end)
+            ranges.append((curr, range_end))
+            curr = range_end + datetime.timedelta(days=1)
+        return ranges
+
+    # 區間頭尾都對齊到比賽日，休兵日與明星週不會單獨發請求
+    skip_dates = sorted(skip_dates or [])
+    for d in sorted(d for d in game_dates if start <= d <= end):
+        if (ranges and (d - ranges[-1][0]).days < max_days
+                and not any(ranges[-1][1] < s < d for s in skip_dates)):
+            ranges[-1] = (ranges[-1][0], d)
+        else:
+            ranges.append((d, d))
+    return ranges
+
+async def fetch_ranges(client, build_request, ranges):
+    """
+    並行抓取每個區間，回傳 (合併後的 DataFrame, 最終仍失敗的區間列表)。
+    build_request(date_from, date_to) 需回傳 (endpoint, params, label)。
+    區間重試用盡 (逾時 / 5xx / 被擋) 或回應不是完整 JSON 時，才對半切開重抓，直到單日為止；
+    其他失敗 (不可重試的狀態碼、斷路中、重播模式缺快取) 直接把整個區間記為失敗。
+    (None, None) 代表整季請求，無法再切割。
+    區間依結束日排優先序：越新的區間越先送出，補抓的舊區間排在後面。
+    """
+    failed = []
+
+    async def fetch_one(d_from, d_to):
+        if d_from is None:
+            endpoint, params, label = build_request()
+        else:
+            endpoint, params, label = build_request(d_from.strftime(DATE_FMT), d_to.strftime(DATE_FMT))
+
+        priority = fetch_priority(d_to) if d_to is not None else None
+        data, failure = await client.fetch_json(endpoint, params, label, priority)
+        if data is not None:
+            return [result_set_to_frame(data)]
+        if d_from is None or d_from == d_to or failure not in SPLIT_ON_FAILURES:
+            failed.append((d_from, d_to))
+            return []
+
+        mid = d_from + (d_to - d_from) // 2
+        tqdm.write(f"   ✂️ 區間 {d_from} ~ {d_to} 抓取失敗，切成兩段重抓...")
+        left, right = await asyncio.gather(
+            fetch_one(d_from, mid),
+            fetch_one(mid + datetime.timedelta(days=1), d_to)
+        )
+        return left + right
+
+    newest_first = sorted(ranges, key=lambda r: r[1] or datetime.date.max, reverse=True)
+    parts = await asyncio.gather(*[fetch_one(d_from, d_to) for d_from, d_to in newest_first])
+    frames = [df for part in parts for df in part if not df.empty]
+    if not frames:
+        return pd.DataFrame(), failed
+    return pd.concat(frames, ignore_index=True), failed
@@ -1,31 +1,29 @@
-import pandas as pd
-import sqlite3
-import time
-import random
+import asyncio
 import os
 import datetime
+import functools
 import warnings
 from nba_api.stats.endpoints import playergamelogs
-from requests.exceptions import ReadTimeout, ConnectTimeout, ConnectionError
-from urllib3.exceptions import ProtocolError
 from tqdm import tqdm
 
+# 🌐 共用非同步抓取客戶端 (連線池、並行上限、重試策略都在這裡)
+from nba_http import NBAStatsClient, game_logs_request
+from fetch_planner import plan_date_ranges, fetch_ranges
+from game_calendar import refresh_calendar, get_game_dates, get_game_counts
+from nba_db import get_connection, close_connection, save_incremental
+from fetch_ledger import init_ledger, seed_ledger, season_days, pending_dates, record_fetch
+
 # 忽略警告
 warnings.filterwarnings("ignore", category=UserWarning, module="nba_api")
 
 # ===========================
 # ⚙️ 雲端自動化設定區
 # ===========================
-DB_PATH = 'data/nba_current.db'  # 👈 改為讀寫輕量級的新資料庫
 START_YEAR = 2025                # 👈 雲端只負責當前賽季
 END_YEAR = 2026
 SEASON_TYPES = ['Regular Season', 'Playoffs']
 MEASURE_TYPES = ['Base', 'Advanced', 'Misc', 'Scoring', 'Usage']
 
-TIMEOUT_SECONDS = 30             # 使用私人 Proxy，速度快，超時可以縮短
-MAX_RETRIES = 5
-RETRY_DELAY = 3
-
 # ===========================
 # 🛡️ Proxy 代理伺服器設定
 # ===========================
@@ -39,34 +37,9 @@ def setup_proxy():
     else:
         print("⚠️ 警告：未偵測到 PROXY_URL 環境變數，將使用 GitHub 預設 IP 連線（極可能被擋）。")
 
-# === 🔥 終極防護：真實瀏覽器偽裝 ===
-USER_AGENTS = [
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0.3 Safari/605.1.15',
-    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0',
-    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
-]
-
-def get_headers():
-    """每次請求隨機產生一組正常的瀏覽器標頭"""
-    return {
-        'Host': 'stats.nba.com',
-        'User-Agent': random.choice(USER_AGENTS),
-        'Accept': 'application/json, text/plain, */*',
-        'Accept-Language': 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
-        'Referer': 'https://www.nba.com/',
-        'Origin': 'https://www.nba.com',
-        'x-nba-stats-origin': 'stats',
-        'x-nba-stats-token': 'true',
-        'Connection': 'keep-alive',
-        'Sec-Fetch-Dest': 'empty',
-        'Sec-Fetch-Mode': 'cors',
-        'Sec-Fetch-Site': 'same-site',
-    }
-
 def init_db():
-    if not os.path.exists('data'): os.makedirs('data')
-    return sqlite3.connect(DB_PATH)
+    # 🔌 共用的 WAL 連線 (整個行程只有這一條)
+    return get_connection()
 
 def is_current_season(season_str):
     start_year = int(season_str.split('-')[0])
@@ -94,150 +67,106 @@ def check_season_status(conn, table_name, season, season_type):
     except:
         return 'EMPTY'
 
-def get_latest_date(conn, table_name, season, season_type):
-    try:
-        cursor = conn.cursor()
-        query = f"SELECT MAX(GAME_DATE) FROM {table_name} WHERE SEASON_YEAR = ? AND SEASON_TYPE = ?"
-        cursor.execute(query, (season, season_type))
-        res = cursor.fetchone()
-        if res and res[0]:
-            y, m, d = res[0][:10].split('-')
-            return f"{m}/{d}/{y}"
-    except:
-        pass
-    return ""
-
 def save_to_db_incremental(conn, df, table_name):
-    if df.empty: return
-    try:
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns_info = cursor.fetchall()
-        
-        if columns_info: 
-            existing_cols = [info[1] for info in columns_info]
-            for col in df.columns:
-                if col not in existing_cols:
-                    cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {col} TEXT")
-            conn.commit()
-
-        df.head(0).to_sql(table_name, conn, if_exists='append', index=False)
-        try:
-            existing = pd.read_sql(f"SELECT GAME_ID, PLAYER_ID FROM {table_name}", conn)
-            existing_keys = set(existing['GAME_ID'].astype(str) + '_' + existing['PLAYER_ID'].astype(str))
-        except:
-            existing_keys = set()
-        
-        df_keys = df['GAME_ID'].astype(str) + '_' + df['PLAYER_ID'].astype(str)
-        new_data = df[~df_keys.isin(existing_keys)].copy()
-        
-        if not new_data.empty:
-            new_data.to_sql(table_name, conn, if_exists='append', index=False)
-    except Exception as e:
-        tqdm.write(f"   ❌ 寫入資料庫錯誤: {e}")
-
-def fetch_with_retry(season, season_type, measure_type, date_from=None, date_to=None):
-    for attempt in range(MAX_RETRIES):
-        try:
-            # 🔥 將偽裝的 Headers 帶入請求中
-            logs = playergamelogs.PlayerGameLogs(
-                season_nullable=season,
-                season_type_nullable=season_type,
-                measure_type_player_game_logs_nullable=measure_type,
-                date_from_nullable=date_from,
-                date_to_nullable=date_to,
-                headers=get_headers(),  
-                timeout=TIMEOUT_SECONDS
-            )
-            return logs.get_data_frames()[0]
-            
-        except (ReadTimeout, ConnectTimeout, ConnectionError, ProtocolError) as e:
-            wait_time = RETRY_DELAY + (attempt * 3) + random.uniform(2, 4)
-            error_brief = str(e).split("',")[-1].strip(" )\"'")[:30]
-            tqdm.write(f"   ⚠️ 伺服器無回應，等 {wait_time:.1f} 秒重試... [{error_brief}]")
-            time.sleep(wait_time)
-            
-        except Exception as e:
-            if "no data" in str(e).lower() or "timeout" in str(e).lower():
-                break
-            tqdm.write(f"   ⚠️ API 未知錯誤: {e}")
-            break
-            
-    return pd.DataFrame()
+    # 唯一索引 + INSERT OR IGNORE 批次寫入，成本只跟這批資料大小有關
+    return save_incremental(conn, df, table_name, ['GAME_ID', 'PLAYER_ID'])
 
-def fetch_player_stats(conn):
+async def _fetch_player_stats(conn):
     seasons = [f"{y}-{str(y+1)[-2:]}" for y in range(START_YEAR, END_YEAR)]
     total_steps = len(seasons) * len(SEASON_TYPES) * len(MEASURE_TYPES)
     pbar = tqdm(total=total_steps, desc="下載球員全賽季數據")
 
-    for season in seasons:
-        for s_type in SEASON_TYPES:
-            if s_type == 'Playoffs' and is_future_playoffs(season):
-                tqdm.write(f"   ⏭️ [跳過] {season} 季後賽尚未開打。")
-                pbar.update(len(MEASURE_TYPES)) 
-                continue
-
-            for m_type in MEASURE_TYPES:
-                safe_name = m_type.lower().replace(' ', '_')
-                table_name = f"player_stats_{safe_name}"
-                
-                status = check_season_status(conn, table_name, season, s_type)
-                if status == 'SKIP':
-                    pbar.update(1)
+    init_ledger(conn)
+
+    async with NBAStatsClient() as client:
+        for season in seasons:
+            # 📅 一次賽程表抓取 (有快取)，讓每個抓取迴圈都能略過沒有比賽的日期
+            await refresh_calendar(conn, client, season)
+
+            for s_type in SEASON_TYPES:
+                if s_type == 'Playoffs' and is_future_playoffs(season):
+                    tqdm.write(f"   ⏭️ [跳過] {season} 季後賽尚未開打。")
+                    pbar.update(len(MEASURE_TYPES)) 
                     continue
-                
-                # ==========================================
-                # 🔥 逐日切割法更新雲端最新進度
-                # ==========================================
-                if status == 'UPDATE' and is_current_season(season):
-                    last_date_str = get_latest_date(conn, table_name, season, s_type)
+
+                game_dates = get_game_dates(conn, season, s_type)
+                game_counts = get_game_counts(conn, season, s_type)
+
+                # 1. 先替每個數據類別規劃好要送出的請求
+                jobs = []
+                for m_type in MEASURE_TYPES:
+                    safe_name = m_type.lower().replace(' ', '_')
+                    table_name = f"player_stats_{safe_name}"
                     
-                    if not last_date_str:
-                        last_date_str = f"10/15/{season.split('-')[0]}"
+                    status = check_season_status(conn, table_name, season, s_type)
+                    if status == 'SKIP':
+                        pbar.update(1)
+                        continue
                     
-                    start_dt = datetime.datetime.strptime(last_date_str, "%m/%d/%Y")
-                    start_dt -= datetime.timedelta(days=1) 
-                    end_dt = datetime.datetime.now()
-
-                    date_list = []
-                    curr = start_dt
-                    while curr <= end_dt:
-                        date_list.append(curr.strftime("%m/%d/%Y"))
-                        curr += datetime.timedelta(days=1)
+                    # ==========================================
+                    # 🔥 區間合併法更新雲端最新進度
+                    # ==========================================
+                    if status == 'UPDATE' and is_current_season(season):
+                        # 📒 依帳本精準續抓：只抓從未成功過的日期，不靠 MAX(GAME_DATE) 推算
+                        seed_ledger(conn, table_name, season, s_type)
+                        today = datetime.date.today()
+                        if game_dates is not None:
+                            candidates = {d for d in game_dates if d <= today}
+                        else:
+                            candidates = season_days(season, today)
+                        pending = pending_dates(conn, table_name, season, s_type, candidates, game_counts)
+
+                        # 🔥 把待補日期合併成少數幾個 date_from/date_to 區間請求 (不跨過已抓好的日期)
+                        ranges = plan_date_ranges(min(pending, default=today), today, pending, candidates - pending)
+
+                        if m_type == 'Base': 
+                            tqdm.write(f"   📅 [{season} {s_type}] 帳本待補 {len(pending)} 天，合併為 {len(ranges)} 個區間請求...")
+                    elif game_dates is not None and not any(d <= datetime.date.today() for d in game_dates):
+                        ranges, pending = [], None
+                    else:
+                        tqdm.write(f"   ⏳ [{table_name}] 請求 {season} 完整資料...")
+                        ranges, pending = [(None, None)], None
+
+                    if not ranges:
+                        tqdm.write(f"   ⏭️ [{table_name}] {season} {s_type} 沒有需要抓取的比賽日，略過請求。")
+                        pbar.update(1)
+                        continue
+
+                    build = functools.partial(game_logs_request, playergamelogs.PlayerGameLogs, season, s_type, m_type)
+                    jobs.append((m_type, table_name, build, ranges, pending))
+
+                if not jobs:
+                    continue
 
-                    if m_type == 'Base': 
-                        tqdm.write(f"   📅 [{season} {s_type}] 啟動逐日抓取模式，補齊 {len(date_list)} 天的資料...")
+                # 2. 所有區間交給共用客戶端並行抓取
+                results = await asyncio.gather(*[fetch_ranges(client, build, ranges) for _, _, build, ranges, _ in jobs])
 
+                # 3. 依原順序寫回資料庫
+                for (m_type, table_name, _, _, pending), (df, failed) in zip(jobs, results):
                     success_days = 0
-                    for d in date_list:
-                        df = fetch_with_retry(season, s_type, m_type, date_from=d, date_to=d)
-                        if not df.empty:
-                            df['SEASON_YEAR'] = season
-                            df['SEASON_TYPE'] = s_type
-                            df['MEASURE_TYPE'] = m_type
-                            save_to_db_incremental(conn, df, table_name)
-                            success_days += 1
-                        
-                        # 🔥 加上隨機微小延遲，模仿人類行為
-                        time.sleep(random.uniform(0.6, 1.5))
-                        
-                    tqdm.write(f"   ✅ [{table_name}] 成功補齊 {success_days} 天有比賽的數據。")
-                        
-                else:
-                    tqdm.write(f"   ⏳ [{table_name}] 請求 {season} 完整資料...")
-                    df = fetch_with_retry(season, s_type, m_type)
+                    saved = True
                     if not df.empty:
                         df['SEASON_YEAR'] = season
                         df['SEASON_TYPE'] = s_type
                         df['MEASURE_TYPE'] = m_type
-                        save_to_db_incremental(conn, df, table_name)
-                    time.sleep(random.uniform(1.5, 3.0))
+                        saved = save_to_db_incremental(conn, df, table_name)
+                        success_days = df['GAME_DATE'].nunique()
 
-                pbar.update(1)
+                    # 📒 寫入成功才記帳，寫入失敗的日期下次會自動重抓
+                    if saved:
+                        failed_days = record_fetch(conn, table_name, season, s_type, pending, df, failed)
+                        if failed_days:
+                            tqdm.write(f"   ⚠️ [{table_name}] {failed_days} 天抓取失敗，已記入帳本，下次會重抓。")
+
+                    tqdm.write(f"   ✅ [{table_name}] 成功補齊 {success_days} 天有比賽的數據。")
+                    pbar.update(1)
 
     pbar.close()
     print("球員數據下載完成！")
 
+def fetch_player_stats(conn):
+    asyncio.run(_fetch_player_stats(conn))
+
 if __name__ == "__main__":
     print(f"🚀 啟動 NBA 球員數據爬蟲 (雲端全自動更新版)")
     # 初始化 Proxy
@@ -247,4 +176,4 @@ if __name__ == "__main__":
     try:
         fetch_player_stats(conn)
     finally:
-        conn.close()
\ No newline at end of file
+        close_connection()
\ No newline at end of file
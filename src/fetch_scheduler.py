@@ -0,0 +1,129 @@
+import datetime
+import time
+
+# ===========================
+# ⚙️ 抓取排程設定區
+# ===========================
+# 優先等級：數字越小越先抓；同一等級內一律「越新的比賽越先抓」
+TIER_CRITICAL = 0   # 今天、昨天的比賽 (今晚預測直接要用)
+TIER_RECENT = 1     # 最近一週 (滾動特徵會用到)
+TIER_BACKFILL = 2   # 其餘的歷史補抓
+CRITICAL_DAYS = 1
+RECENT_DAYS = 7
+
+PROGRESS_TABLE = 'fetch_progress'
+PROGRESS_POLL_SECONDS = 5
+
+def _as_date(game_date):
+    if isinstance(game_date, datetime.datetime):
+        return game_date.date()
+    if isinstance(game_date, datetime.date):
+        return game_date
+    return datetime.date.fromisoformat(str(game_date)[:10])
+
+def fetch_priority(game_date, today=None):
+    """
+    回傳可排序的優先序 (tier, -日期序號)：
+    下游越快需要的越小，交給 NBAStatsClient 的並行閘門決定誰先送出。
+    """
+    d = _as_date(game_date)
+    age = ((today or datetime.date.today()) - d).days
+    if age <= CRITICAL_DAYS:
+        tier = TIER_CRITICAL
+    elif age <= RECENT_DAYS:
+        tier = TIER_RECENT
+    else:
+        tier = TIER_BACKFILL
+    return (tier, -d.toordinal())
+
+def is_critical(game_date, today=None):
+    return fetch_priority(game_date, today)[0] == TIER_CRITICAL
+
+# ===========================
+# 📣 階段進度公告 (給下游提早開工)
+# ===========================
+def init_progress(conn):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} (
+            stage TEXT PRIMARY KEY,
+            started_at REAL,
+            total INTEGER,
+            done INTEGER,
+            critical_total INTEGER,
+            critical_done INTEGER,
+            finished INTEGER,
+            updated_at REAL
+        )
+    ''')
+    conn.commit()
+
+class ProgressPublisher:
+    """
+    把某個抓取階段的進度寫進 fetch_progress，讓其他行程 (run_pipeline / generate_injury)
+    知道「今晚要用的關鍵比賽」是否已經入庫。
+    只在呼叫 publish() 時寫入；呼叫端要先把對應的資料 flush 進資料庫再公告。
+    """
+
+    def __init__(self, conn, stage, total, critical_total):
+        self.conn = conn
+        self.stage = stage
+        self.started_at = time.time()
+        self.total = total
+        self.critical_total = critical_total
+        self.done = 0
+        self.critical_done = 0
+        init_progress(conn)
+        self.publish()
+
+    def mark_done(self, critical=False):
+        self.done += 1
+        if critical:
+            self.critical_done += 1
+
+    @property
+    def critical_complete(self):
+        return self.critical_done >= self.critical_total
+
+    def publish(self, finished=False):
+        self.conn.execute(f'''
+            INSERT OR REPLACE INTO {PROGRESS_TABLE}
+            (stage, started_at, total, done, critical_total, critical_done, finished, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (self.stage, self.started_at, self.total, self.done,
+              self.critical_total, self.critical_done, int(finished), time.time()))
+        self.conn.commit()
+
+def read_progress(conn, stage):
+    """回傳該階段最新一次的進度 dict，從未公告過則回傳 None"""
+    try:
+        row = conn.execute(f'''
+            SELECT started_at, total, done, critical_total, critical_done, finished
+            FROM {PROGRESS_TABLE} WHERE stage = ?
+        ''', (stage,)).fetchone()
+    except Exception:
+        return None
+    if not row:
+        return None
+    keys = ['started_at', 'total', 'done', 'critical_total', 'critical_done', 'finished']
+    return dict(zip(keys, row))
+
+def critical_ready(conn, stage, since=None):
+    """該階段 (since 之後開始的那一輪) 的關鍵比賽是否已經全部入庫"""
+    progress = read_progress(conn, stage)
+    if progress is None or (since is not None and progress['started_at'] < since):
+        return False
+    return bool(progress['finished']) or progress['critical_done'] >= progress['critical_total']
+
+def wait_for_critical(conn, stage, since=None, timeout=None, is_alive=None):
+    """
+    ⏳ 等到 stage 公告關鍵比賽已入庫才返回 True。
+    is_alive: 回傳該階段行程是否還在跑的函式；行程已結束就不再等 (回傳 False)。
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not critical_ready(conn, stage, since):
+        if is_alive is not None and not is_alive():
+            return critical_ready(conn, stage, since)
+        if deadline is not None and time.monotonic() > deadline:
+            return False
+        time.sleep(PROGRESS_POLL_SECONDS)
+    return True
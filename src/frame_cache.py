@@ -0,0 +1,123 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# ===========================
+# ⚙️ 合併資料表快取設定區
+# ===========================
+# 同一份資料 (兩個資料庫都沒變) 的同一張表、同樣的欄位與篩選條件，只解碼一次。
+MAX_MEMORY_MB = int(os.environ.get('NBA_FRAME_CACHE_MB', '256'))   # 記憶體快取上限 (LRU 淘汰)
+# 磁碟快取 (選用)：設定 NBA_FRAME_SPILL_DIR=data/frame_cache 才會寫 pickle 給同一條 pipeline 的其他行程讀。
+# 預設關閉：CI 每次跑最新資料庫都會變，寫出去的 pickle 下次一定用不到。
+SPILL_DIR = os.environ.get('NBA_FRAME_SPILL_DIR', '')
+HEADER_BYTES = 100   # SQLite 檔頭 (含 file change counter)
+
+def db_fingerprint(db_path):
+    """
+    資料庫版本指紋：大小 + 修改時間 + 檔頭雜湊，再加上 -wal 檔的大小與修改時間
+    (WAL 模式下 commit 只寫進 -wal，主檔要等 checkpoint 才會變；空的 -wal 視同不存在，
+    只開連線讀取不會讓指紋改變)。檔案不存在回傳 None。
+    """
+    if not os.path.exists(db_path):
+        return None
+    st = os.stat(db_path)
+    with open(db_path, 'rb') as f:
+        header = hashlib.sha1(f.read(HEADER_BYTES)).hexdigest()
+    wal_path = f"{db_path}-wal"
+    wal = None
+    if os.path.exists(wal_path) and os.path.getsize(wal_path) > 0:
+        wal_st = os.stat(wal_path)
+        wal = [wal_st.st_size, wal_st.st_mtime_ns]
+    return [st.st_size, st.st_mtime_ns, header, wal]
+
+def _digest(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+class FrameCache:
+    """
+    🧠 行程內的 LRU DataFrame 快取，可選擇同時寫到磁碟。
+    key 分成「查詢內容」(表名 + 欄位 + 篩選) 與「資料版本」(各資料庫指紋)：
+    版本一變，舊的快取自然失效，磁碟上同一個查詢的舊版本檔案也會一併清掉。
+    ⚠️ 為了不讓每張表在記憶體裡存兩份，存入與取出都不複製：
+    拿到的 DataFrame 是唯讀的，要加欄位或改值請先取子集或 .copy() (現有呼叫端都是這樣用)。
+    """
+
+    def __init__(self, max_bytes=MAX_MEMORY_MB * 1024 * 1024, spill_dir=SPILL_DIR):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.frames = OrderedDict()   # (query_id, version_id) -> (DataFrame, bytes)
+        self.bytes = 0
+        self.stats = {'memory': 0, 'disk': 0, 'miss': 0}
+        self._lock = threading.Lock()
+
+    def _spill_path(self, table_name, query_id, version_id):
+        return os.path.join(self.spill_dir, f"{table_name}-{query_id}-{version_id}.pkl")
+
+    def get(self, table_name, query, versions):
+        query_id, version_id = _digest(query), _digest(versions)
+        key = (query_id, version_id)
+        with self._lock:
+            if key in self.frames:
+                self.frames.move_to_end(key)
+                self.stats['memory'] += 1
+                return self.frames[key][0]
+
+        if self.spill_dir:
+            path = self._spill_path(table_name, query_id, version_id)
+            if os.path.exists(path):
+                try:
+                    df = pd.read_pickle(path)
+                except Exception:
+                    df = None   # 檔案損毀就當作沒有快取
+                if df is not None:
+                    self.stats['disk'] += 1
+                    self._remember(key, df)
+                    return df
+
+        self.stats['miss'] += 1
+        return None
+
+    def put(self, table_name, query, versions, df):
+        query_id, version_id = _digest(query), _digest(versions)
+        self._remember((query_id, version_id), df)
+        if self.spill_dir:
+            self._spill(table_name, query_id, version_id, df)
+
+    def _remember(self, key, df):
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return   # 比整個快取還大的表不留在記憶體 (有開磁碟快取時磁碟上仍有一份)
+        with self._lock:
+            if key in self.frames:
+                self.bytes -= self.frames.pop(key)[1]
+            self.frames[key] = (df, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, old_size) = self.frames.popitem(last=False)
+                self.bytes -= old_size
+
+    def _spill(self, table_name, query_id, version_id, df):
+        """先寫暫存檔再 rename；同一個查詢的舊版本檔案直接刪掉，磁碟不會越堆越多"""
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = self._spill_path(table_name, query_id, version_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            df.to_pickle(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"   ⚠️ 快取寫入磁碟失敗 ({table_name}): {e}")
+            return
+        for old in glob.glob(os.path.join(self.spill_dir, f"{table_name}-{query_id}-*.pkl")):
+            if old != path:
+                try: os.remove(old)
+                except OSError: pass
+
+    def clear(self):
+        with self._lock:
+            self.frames.clear()
+            self.bytes = 0
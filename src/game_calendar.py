@@ -0,0 +1,152 @@
+import datetime
+from collections import namedtuple
+
+from tqdm import tqdm
+
+# ===========================
+# ⚙️ 聯盟賽程日曆設定區
+# ===========================
+CALENDAR_TABLE = 'league_calendar'
+CALENDAR_TTL_HOURS = 12          # 賽程表快取多久後重新抓一次 (一次 pipeline 只會抓一次)
+SCHEDULE_ENDPOINT = 'scheduleleaguev2'
+
+# Game ID 第 3 碼代表賽事類型 (例: 0022500001 -> 2 = 例行賽)
+SEASON_TYPE_CODES = {
+    '1': 'Pre Season',
+    '2': 'Regular Season',
+    '3': 'All Star',
+    '4': 'Playoffs',
+    '5': 'PlayIn',
+}
+
+# Game ID 結構: 00 (聯盟) + 2 (賽事類型) + 25 (賽季起始年末兩碼) + 00001 (場次序號)
+GameId = namedtuple('GameId', ['league', 'type_code', 'season_type', 'season_year', 'number'])
+
+# 同一個 process 內的記憶體快取：(season, season_type) -> 賽程表上的日期 set(str)
+# 只快取賽程表那一半；games 表在 pipeline 執行中會一直新增比賽，每次都重新查
+_DATES_CACHE = {}
+
+def init_calendar_table(conn):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {CALENDAR_TABLE} (
+            game_id TEXT PRIMARY KEY,
+            game_date TEXT,
+            season TEXT,
+            season_type TEXT,
+            fetched_at TEXT
+        )
+    ''')
+    conn.commit()
+
+def parse_game_id(game_id):
+    """把 Game ID 拆成結構化欄位 (例: 0042400101 -> 季後賽、2024-25 賽季、第 101 場)"""
+    game_id = str(game_id).zfill(10)
+    year = int(game_id[3:5])
+    return GameId(
+        league=game_id[:2],
+        type_code=game_id[2],
+        season_type=SEASON_TYPE_CODES.get(game_id[2], 'Unknown'),
+        # 兩碼年份：46 以後是 1900 年代 (聯盟 1946 年成立)
+        season_year=(1900 if year >= 46 else 2000) + year,
+        number=int(game_id[5:]),
+    )
+
+def season_type_from_game_id(game_id):
+    return parse_game_id(game_id).season_type
+
+def season_start_year(game_id):
+    """Game ID 第 4~5 碼是賽季起始年 (例: 0022500001 -> 2025，代表 2025-26 賽季)"""
+    return parse_game_id(game_id).season_year
+
+def season_code(season_year):
+    """賽季起始年 -> Game ID 第 4~5 碼 (2025 -> '25')，給 SQL 用 substr(game_id, 4, 2) 比對"""
+    return f"{season_year % 100:02d}"
+
+def is_calendar_fresh(conn, season):
+    """檢查該賽季的賽程表快取是否還在有效期限內"""
+    try:
+        row = conn.execute(f"SELECT MAX(fetched_at) FROM {CALENDAR_TABLE} WHERE season = ?", (season,)).fetchone()
+    except Exception:
+        return False
+    if not row or not row[0]:
+        return False
+    fetched_at = datetime.datetime.fromisoformat(row[0])
+    return datetime.datetime.now() - fetched_at < datetime.timedelta(hours=CALENDAR_TTL_HOURS)
+
+async def refresh_calendar(conn, client, season):
+    """
+    📅 確保該賽季的聯盟賽程日曆可用：快取過期才打一次 ScheduleLeagueV2。
+    抓取失敗時保留舊資料，呼叫端會退回「不略過任何日期」的安全模式。
+    """
+    init_calendar_table(conn)
+    if is_calendar_fresh(conn, season):
+        return
+
+    data = await client.get_json(SCHEDULE_ENDPOINT, {'LeagueID': '00', 'Season': season}, 'Schedule')
+    if not data:
+        tqdm.write(f"   ⚠️ [{season}] 賽程表抓取失敗，本次不略過任何日期。")
+        return
+
+    now = datetime.datetime.now().isoformat(timespec='seconds')
+    rows = []
+    for day in data.get('leagueSchedule', {}).get('gameDates', []):
+        # gameDate 格式為 "10/21/2025 00:00:00"
+        game_date = datetime.datetime.strptime(day['gameDate'][:10], "%m/%d/%Y").strftime("%Y-%m-%d")
+        for game in day.get('games', []):
+            game_id = str(game.get('gameId', '')).zfill(10)
+            rows.append((game_id, game_date, season, season_type_from_game_id(game_id), now))
+
+    if rows:
+        conn.executemany(f'''
+            INSERT OR REPLACE INTO {CALENDAR_TABLE} (game_id, game_date, season, season_type, fetched_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+        _DATES_CACHE.clear()
+        tqdm.write(f"   📅 [{season}] 已更新聯盟賽程日曆 ({len(rows)} 場比賽)。")
+
+def get_game_dates(conn, season, season_type):
+    """
+    回傳該賽季/賽事類型「有比賽」的日期集合 (datetime.date)。
+    來源 = 賽程表快取 ∪ games 表已入庫的比賽；
+    若從未成功抓過賽程表則回傳 None，代表日曆未知、不可據此略過日期。
+    """
+    key = (season, season_type)
+    cursor = conn.cursor()
+    if key not in _DATES_CACHE:
+        try:
+            cursor.execute(f"SELECT COUNT(*) FROM {CALENDAR_TABLE} WHERE season = ?", (season,))
+            if cursor.fetchone()[0] == 0:
+                return None
+            cursor.execute(f"SELECT DISTINCT game_date FROM {CALENDAR_TABLE} WHERE season = ? AND season_type = ?", (season, season_type))
+            _DATES_CACHE[key] = {row[0][:10] for row in cursor.fetchall()}
+        except Exception:
+            return None
+    dates = set(_DATES_CACHE[key])
+
+    try:
+        cursor.execute("SELECT DISTINCT date FROM games WHERE season = ? AND game_type = ?", (season, season_type))
+        dates |= {row[0][:10] for row in cursor.fetchall() if row[0]}
+    except Exception:
+        pass  # games 表尚未建立 (init_games_table 還沒跑過)
+
+    return {datetime.datetime.strptime(d, "%Y-%m-%d").date() for d in dates}
+
+def get_game_counts(conn, season, season_type):
+    """
+    回傳該賽季/賽事類型每個比賽日的場次 {datetime.date: 場次}，給抓取帳本判斷「當天是否抓齊」。
+    只看賽程表快取；從未成功抓過賽程表則回傳 None。
+    """
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT substr(game_date, 1, 10), COUNT(*) FROM {CALENDAR_TABLE}
+            WHERE season = ? AND season_type = ?
+            GROUP BY substr(game_date, 1, 10)
+        ''', (season, season_type))
+        rows = cursor.fetchall()
+    except Exception:
+        return None
+    if not rows:
+        return None
+    return {datetime.date.fromisoformat(d): n for d, n in rows}
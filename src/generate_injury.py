@@ -5,6 +5,9 @@ import os
 
 # 🔥 引入我們剛剛寫好的神級模組：自動下載並在記憶體中合併歷史與最新資料
 from prepare_data import get_merged_dataframe
+# 📣 傷兵名單爬蟲的進度公告 (run_pipeline 會在今日關鍵比賽入庫後就啟動本程式)
+from nba_db import get_connection
+from fetch_scheduler import read_progress
 
 # ==========================================
 # ⚙️ 參數設定
@@ -31,20 +34,28 @@ def get_rust_factor(days_gap):
 def generate_features():
     print("🚀 [Injury & Rust] 開始生成進階傷病特徵 (雲端 MLOps 合體版)...")
 
+    progress = read_progress(get_connection(), 'inactive_players')
+    if progress and not progress['finished']:
+        print(f"   ℹ️ 傷兵名單仍在背景補抓 ({progress['done']}/{progress['total']} 場)，本次先使用已入庫的資料。")
+
     # ==========================================
     # 1. 讀取球員數據 (Advanced + Base)
     # ==========================================
     print("   -> 1. 從雲端與本機載入並合併完整球員逐場數據...")
     
     # 透過模組獲取合體後的 Advanced Stats
-    df_adv_full = get_merged_dataframe("player_stats_advanced")
+    df_adv_full = get_merged_dataframe("player_stats_advanced", columns=[
+        'GAME_ID', 'TEAM_ID', 'PLAYER_ID', 'GAME_DATE', 'MIN',
+        'PIE', 'NET_RATING', 'USG_PCT', 'OFF_RATING', 'DEF_RATING'])
     df_adv = df_adv_full[df_adv_full['MIN'] > 0][
         ['GAME_ID', 'TEAM_ID', 'PLAYER_ID', 'GAME_DATE', 'MIN',
          'PIE', 'NET_RATING', 'USG_PCT', 'OFF_RATING', 'DEF_RATING']
     ].copy()
     
     # 透過模組獲取合體後的 Base Stats
-    df_base_full = get_merged_dataframe("player_stats_base")
+    # TEAM_ID / TEAM_ABBREVIATION 最後對照球隊縮寫時還會用到
+    df_base_full = get_merged_dataframe("player_stats_base", columns=[
+        'GAME_ID', 'PLAYER_ID', 'TEAM_ID', 'TEAM_ABBREVIATION', 'MIN', 'PLUS_MINUS', 'NBA_FANTASY_PTS'])
     df_base = df_base_full[df_base_full['MIN'] > 0][
         ['GAME_ID', 'PLAYER_ID', 'PLUS_MINUS', 'NBA_FANTASY_PTS']
     ].copy()
@@ -119,7 +130,7 @@ def generate_features():
     lookup_df = lookup_df.sort_values('GAME_DATE')
     
     # 讀取缺席表 (從合體模組)
-    inactive_full = get_merged_dataframe("inactive_players")
+    inactive_full = get_merged_dataframe("inactive_players", columns=['game_id', 'team_id', 'player_id'])
     
     # 🔥 關鍵修復：因為 inactive_players 表的欄位是小寫，所以這裡要用小寫讀取！
     inactive = inactive_full[['game_id', 'team_id', 'player_id']].copy()
@@ -128,7 +139,7 @@ def generate_features():
     inactive = inactive.rename(columns={'player_id': 'PLAYER_ID'})
     
     # 讀取比賽日期 (從合體模組)
-    games_full = get_merged_dataframe("games")
+    games_full = get_merged_dataframe("games", columns=['game_id', 'home_team', 'away_team', 'date'])
     games = games_full[['game_id', 'date']].copy()
     games = games.rename(columns={'date': 'GAME_DATE'})
     games['GAME_DATE'] = pd.to_datetime(games['GAME_DATE'])
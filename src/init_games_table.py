@@ -1,11 +1,8 @@
-import sqlite3
 import pandas as pd
 import os
 
-# ===========================
-# ⚙️ 雲端自動化設定區
-# ===========================
-DB_PATH = 'data/nba_current.db'  # 👈 改為讀寫輕量級的新資料庫
+# 🔌 所有階段共用的 WAL 資料庫連線
+from nba_db import DB_PATH, get_connection, close_connection
 
 def init_games_table():
     print("🚀 正在同步賽程表 (Games Table - 雲端版)...")
@@ -14,7 +11,7 @@ def init_games_table():
         print(f"❌ 找不到資料庫 {DB_PATH}")
         return
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     c = conn.cursor()
 
     # 1. 建立 games 表格
@@ -83,7 +80,6 @@ def init_games_table():
     
     if new_games.empty:
         print("✅ Games 表已是最新，無需更新。")
-        conn.close()
         return
 
     print(f"🚀 發現 {len(new_games)} 場新比賽，準備寫入...")
@@ -103,7 +99,9 @@ def init_games_table():
     
     conn.commit()
     print(f"✅ 成功寫入 {len(new_games)} 場新比賽！")
-    conn.close()
 
 if __name__ == "__main__":
-    init_games_table()
\ No newline at end of file
+    try:
+        init_games_table()
+    finally:
+        close_connection()
\ No newline at end of file
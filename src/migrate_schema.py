@@ -0,0 +1,90 @@
+import os
+import sys
+
+from schema_registry import GAME_LOG_TABLES, is_registered, column_type, create_table_sql
+# 🔌 資料庫路徑、連線與交易都用共用模組的，不再自己 sqlite3.connect()
+from nba_db import DB_PATH, get_connection, close_connection, transaction, ensure_unique_index
+
+def get_columns(conn, table_name):
+    """回傳 [(欄位名稱, 宣告型別)]，依原本的欄位順序"""
+    return [(info[1], (info[2] or '').upper()) for info in conn.execute(f"PRAGMA table_info({table_name})")]
+
+def needs_migration(conn, table_name):
+    """只要有任何欄位的宣告型別和登記處不同，就需要改寫"""
+    return any(decl != column_type(table_name, col) for col, decl in get_columns(conn, table_name))
+
+def cast_expr(table_name, col):
+    """
+    搬資料時的轉換式：
+    - GAME_ID 若曾被存成整數，補回 10 碼前導 0
+    - 數值欄位的空字串轉成 NULL，其餘交給欄位型別 (affinity) 自動轉成數字
+    """
+    col_type = column_type(table_name, col)
+    if col.upper() == 'GAME_ID':
+        return f"CASE WHEN {col} IS NOT NULL AND length({col}) < 10 THEN printf('%010d', CAST({col} AS INTEGER)) ELSE {col} END"
+    if col_type in ('INTEGER', 'REAL'):
+        return f"CASE WHEN typeof({col}) = 'text' THEN NULLIF(TRIM({col}), '') ELSE {col} END"
+    return col
+
+def migrate_table(conn, table_name):
+    cols = [col for col, _ in get_columns(conn, table_name)]
+    tmp_name = f"{table_name}__typed"
+
+    # 寬表順便去重：同一組唯一鍵只保留最早寫入的那筆
+    where = ''
+    if table_name in GAME_LOG_TABLES:
+        keys = ', '.join(GAME_LOG_TABLES[table_name])
+        where = f"WHERE rowid IN (SELECT MIN(rowid) FROM {table_name} GROUP BY {keys})"
+
+    with transaction(conn):
+        conn.execute(f"DROP TABLE IF EXISTS {tmp_name}")
+        conn.execute(create_table_sql(table_name, cols, name=tmp_name))
+        conn.execute(f'''
+            INSERT OR IGNORE INTO {tmp_name} ({', '.join(cols)})
+            SELECT {', '.join(cast_expr(table_name, c) for c in cols)} FROM {table_name} {where} ORDER BY rowid
+        ''')
+        before = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        after = conn.execute(f"SELECT COUNT(*) FROM {tmp_name}").fetchone()[0]
+        conn.execute(f"DROP TABLE {table_name}")
+        conn.execute(f"ALTER TABLE {tmp_name} RENAME TO {table_name}")
+
+    if table_name in GAME_LOG_TABLES:
+        ensure_unique_index(conn, table_name, GAME_LOG_TABLES[table_name])
+
+    dropped = before - after
+    print(f"   ✅ [{table_name}] 已改寫為型別化結構 ({after} 筆{f'，移除 {dropped} 筆重複' if dropped else ''})")
+
+def migrate_db(db_path=DB_PATH):
+    """🗂️ 一次性遷移：把既有資料表改寫成 schema_registry 宣告的型別，並建立唯一索引"""
+    if not os.path.exists(db_path):
+        print(f"❌ 找不到資料庫 {db_path}")
+        return
+
+    size_before = os.path.getsize(db_path)
+    conn = get_connection(db_path)
+    try:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")]
+        targets = [t for t in tables if is_registered(t)]
+        print(f"🔍 {db_path} 共有 {len(targets)} 張已登記的資料表")
+
+        migrated = 0
+        for table_name in targets:
+            if needs_migration(conn, table_name):
+                migrate_table(conn, table_name)
+                migrated += 1
+            elif table_name in GAME_LOG_TABLES:
+                ensure_unique_index(conn, table_name, GAME_LOG_TABLES[table_name])
+
+        if migrated:
+            print("🧹 重整資料庫檔案 (VACUUM)...")
+            conn.execute("VACUUM")
+    finally:
+        # 關閉時會把 WAL 寫回主檔，下面量到的才是實際大小
+        close_connection(db_path)
+
+    size_after = os.path.getsize(db_path)
+    print(f"🎉 遷移完成！改寫 {migrated} 張表，檔案大小 {size_before / 1e6:.1f}MB -> {size_after / 1e6:.1f}MB")
+
+if __name__ == "__main__":
+    print("🚀 啟動資料表型別遷移工具")
+    migrate_db(sys.argv[1] if len(sys.argv) > 1 else DB_PATH)
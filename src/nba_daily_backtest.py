@@ -51,7 +51,7 @@ def load_prepared_data():
     print("⏳ [MLOps] 啟動自動數據合體，讀取歷史比賽與數據庫...")
     
     # 透過模組無縫獲取合體後的完整歷史資料
-    games_full = get_merged_dataframe("games")
+    games_full = get_merged_dataframe("games", columns=['game_id', 'date', 'season', 'home_team', 'away_team', 'home_score', 'away_score', 'tw_spread_score'])
     games = games_full[['game_id', 'date', 'season', 'home_team', 'away_team', 'home_score', 'away_score', 'tw_spread_score']].copy()
     games = games.dropna(subset=['date']).sort_values('date')
     
@@ -70,10 +70,10 @@ def load_prepared_data():
     games['elo_diff'] = games['home_elo'] + HOME_ADV_ELO - games['away_elo']
     
     print("⏳ 讀取並計算球隊滾動特徵...")
-    base_stats_full = get_merged_dataframe("boxscore_base")
+    base_stats_full = get_merged_dataframe("boxscore_base", columns=['GAME_ID', 'TEAM_ABBREVIATION', 'FGA', 'FTA', 'TOV', 'OREB', 'REB', 'PTS'])
     base_stats = base_stats_full[['GAME_ID', 'TEAM_ABBREVIATION', 'FGA', 'FTA', 'TOV', 'OREB', 'REB', 'PTS']].rename(columns={'TEAM_ABBREVIATION': 'team'})
     
-    adv_stats_full = get_merged_dataframe("boxscore_advanced")
+    adv_stats_full = get_merged_dataframe("boxscore_advanced", columns=['GAME_ID', 'TEAM_ABBREVIATION', 'OFF_RATING', 'DEF_RATING', 'PACE'])
     adv_stats = adv_stats_full[['GAME_ID', 'TEAM_ABBREVIATION', 'OFF_RATING', 'DEF_RATING', 'PACE']].rename(columns={'TEAM_ABBREVIATION': 'team'})
     
     stats = pd.merge(base_stats, adv_stats, on=['GAME_ID', 'team'], how='inner')
@@ -116,6 +116,9 @@ def load_prepared_data():
     games['vegas_line_h'] = -1 * games['tw_spread_score']
     games['target_residual'] = games['real_diff'] - games['vegas_line_h']
     
+    missing_odds = games['tw_spread_score'].isna().sum()
+    if missing_odds:
+        print(f"   ⚠️ {missing_odds} 場比賽缺少運彩讓分，不會進入訓練 (fetch_odds.py 會自動補抓這些缺口)")
     return games.dropna(subset=['tw_spread_score', 'home_elo']).reset_index(drop=True)
 
 # ==========================================
@@ -0,0 +1,247 @@
+import asyncio
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+from tqdm import tqdm
+
+# 🗂️ 每張表的欄位型別與唯一鍵都由登記處決定
+from schema_registry import is_registered, key_columns, column_type, create_table_sql, has_primary_key
+
+# ===========================
+# ⚙️ 共用資料庫連線設定區
+# ===========================
+DB_PATH = 'data/nba_current.db'  # 👈 所有爬蟲讀寫的輕量級資料庫
+
+# WAL：讀寫互不阻塞；synchronous=NORMAL 下每次 commit 只寫 WAL 不做 fsync (checkpoint 時才同步)
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,        # 負數代表 KiB，約 64 MB 頁面快取
+    'mmap_size': 268435456,      # 256 MB 記憶體映射讀取
+    'temp_store': 'MEMORY',
+    'busy_timeout': 30000,       # 毫秒
+}
+CACHED_STATEMENTS = 256          # sqlite3 依 SQL 字串快取已編譯的語句，固定 SQL + ? 參數就能重複使用
+
+# 寫入緩衝 (WriteBehindBuffer)：累積到這麼多筆或這麼久沒寫，就整批用一個交易寫入
+FLUSH_ROWS = 500
+FLUSH_SECONDS = 30
+
+# 每個行程只開一條連線：db_path -> (pid, connection)
+_CONNECTIONS = {}
+
+def get_connection(db_path=DB_PATH):
+    """
+    🔌 取得本行程共用的資料庫連線 (第一次呼叫時才建立並套用 PRAGMA)。
+    各爬蟲不要再自己 sqlite3.connect()，也不要 close()，結束時統一呼叫 close_connection()。
+    """
+    entry = _CONNECTIONS.get(db_path)
+    if entry is not None and entry[0] == os.getpid():
+        return entry[1]
+
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    # check_same_thread=False：WriteBehindBuffer.flush_async 會在背景執行緒寫入，
+    # 呼叫端保證同一時間只有一個執行緒在用這條連線 (await 完才會再碰它)
+    conn = sqlite3.connect(db_path, timeout=30.0, cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    _CONNECTIONS[db_path] = (os.getpid(), conn)
+    return conn
+
+def close_connection(db_path=DB_PATH):
+    """提交並關閉共用連線 (順便把 WAL 寫回主檔，讓 git / artifact 只需要帶 .db 一個檔案)"""
+    entry = _CONNECTIONS.pop(db_path, None)
+    if entry is None or entry[0] != os.getpid():
+        return
+    conn = entry[1]
+    try:
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+        for key in [k for k in _READY_TABLES if k[0] == id(conn)]:
+            del _READY_TABLES[key]
+
+@contextmanager
+def transaction(conn=None):
+    """
+    明確的交易區塊：with transaction() as conn: ...
+    區塊內的所有寫入只在結束時 commit 一次 (例外時整批 rollback)。
+    巢狀使用時改用 SAVEPOINT，外層的交易不會被提前提交。
+    """
+    conn = conn or get_connection()
+    if conn.in_transaction:
+        conn.execute("SAVEPOINT nested_tx")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK TO nested_tx")
+            conn.execute("RELEASE nested_tx")
+            raise
+        conn.execute("RELEASE nested_tx")
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+# 已經確認過結構 (欄位 + 唯一索引) 的資料表：(id(conn), table_name) -> set(欄位)
+_READY_TABLES = {}
+
+def ensure_unique_index(conn, table_name, key_cols):
+    """
+    替資料表建立 (GAME_ID, TEAM_ID) / (GAME_ID, PLAYER_ID) 之類的唯一索引。
+    舊資料若已經有重複鍵，先保留最早寫入的那筆再建索引。
+    固定結構表 (games、inactive_players...) 已經有 PRIMARY KEY，不重複建。
+    """
+    if has_primary_key(table_name):
+        return
+    index_name = f"ux_{table_name}_{'_'.join(c.lower() for c in key_cols)}"
+    cols = ', '.join(key_cols)
+    try:
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table_name} ({cols})")
+    except sqlite3.IntegrityError:
+        tqdm.write(f"   🧹 [{table_name}] 發現重複資料，清理後建立唯一索引...")
+        conn.execute(f"DELETE FROM {table_name} WHERE rowid NOT IN (SELECT MIN(rowid) FROM {table_name} GROUP BY {cols})")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table_name} ({cols})")
+    conn.commit()
+
+def prepare_table(conn, df, table_name, key_cols):
+    """確保資料表、新欄位與唯一索引都存在；同一個連線對同一張表只檢查一次"""
+    key = (id(conn), table_name)
+    known_cols = _READY_TABLES.get(key)
+    if known_cols is not None and set(df.columns) <= known_cols:
+        return
+
+    cursor = conn.cursor()
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    existing_cols = [info[1] for info in cursor.fetchall()]
+
+    if not existing_cols:
+        if is_registered(table_name):
+            cursor.execute(create_table_sql(table_name, list(df.columns)))
+        else:
+            df.head(0).to_sql(table_name, conn, if_exists='append', index=False)
+        existing_cols = list(df.columns)
+    else:
+        for col in df.columns:
+            if col not in existing_cols:
+                cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {col} {column_type(table_name, col)}")
+                existing_cols.append(col)
+    conn.commit()
+
+    ensure_unique_index(conn, table_name, key_cols)
+    _READY_TABLES[key] = set(existing_cols)
+
+def insert_frame(conn, df, table_name):
+    """把 DataFrame 以 INSERT OR IGNORE 寫入 (不 commit，由呼叫端的交易決定何時落地)"""
+    cols = list(df.columns)
+    placeholders = ', '.join(['?'] * len(cols))
+    sql = f"INSERT OR IGNORE INTO {table_name} ({', '.join(cols)}) VALUES ({placeholders})"
+
+    # 轉成 sqlite3 能直接綁定的 Python 原生型別 (NaN -> NULL)
+    values = df.astype(object).where(df.notna(), None)
+    conn.executemany(sql, values.itertuples(index=False, name=None))
+
+def save_incremental(conn, df, table_name, key_cols=None):
+    """
+    🔥 索引式增量寫入：靠唯一索引 + INSERT OR IGNORE 去重，
+    成本只跟這批新資料的大小有關，不再每次讀回整張表建 Python set。
+    key_cols 省略時使用 schema_registry 登記的唯一鍵。
+    回傳 True 表示寫入成功 (包含沒有新資料的情況)。
+    """
+    if df.empty: return True
+    key_cols = key_cols or key_columns(table_name)
+    try:
+        prepare_table(conn, df, table_name, key_cols)
+        with transaction(conn):
+            insert_frame(conn, df, table_name)
+        return True
+    except Exception as e:
+        tqdm.write(f"   ❌ 寫入資料庫錯誤: {e}")
+        return False
+
+class WriteBehindBuffer:
+    """
+    ✍️ 寫入緩衝：抓取端只負責 add，資料先堆在記憶體，
+    累積到 flush_rows 筆或超過 flush_seconds 秒才用「一個交易」整批寫入。
+    離開 with 區塊時 (包含發生例外) 會把剩下的資料寫完。
+    在 asyncio 裡使用時傳 auto_flush=False，改由呼叫端檢查 due 後 await flush_async()，
+    commit 在背景執行緒進行，event loop 上的請求不會被磁碟寫入卡住。
+    用法:
+        with WriteBehindBuffer(conn) as writer:
+            writer.add_frame('inactive_players', df)
+            writer.add_row("INSERT OR REPLACE INTO empty_inactive_games (game_id, checked_at) VALUES (?, ?)", (gid, now))
+    """
+
+    def __init__(self, conn=None, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS, auto_flush=True):
+        self.conn = conn or get_connection()
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.auto_flush = auto_flush
+        self.frames = {}       # table_name -> [DataFrame, ...]
+        self.statements = {}   # sql -> [params, ...]
+        self.pending = 0
+        self.commits = 0
+        self.last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def add_frame(self, table_name, df):
+        if df is None or df.empty: return
+        self.frames.setdefault(table_name, []).append(df)
+        self.pending += len(df)
+        self.maybe_flush()
+
+    def add_row(self, sql, params):
+        self.statements.setdefault(sql, []).append(params)
+        self.pending += 1
+        self.maybe_flush()
+
+    @property
+    def due(self):
+        """累積的筆數或等待時間是否已經到了該寫入的時候"""
+        return self.pending >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_seconds
+
+    def maybe_flush(self):
+        if self.auto_flush and self.due:
+            self.flush()
+
+    async def flush_async(self):
+        """在背景執行緒執行 flush()；寫入期間 event loop 照常處理其他請求"""
+        return await asyncio.to_thread(self.flush)
+
+    def flush(self):
+        """把緩衝區一次寫入；失敗時整批 rollback (那些比賽下次執行會再被找出來重抓)"""
+        self.last_flush = time.monotonic()
+        if not self.pending: return True
+
+        frames, statements = self.frames, self.statements
+        self.frames, self.statements, self.pending = {}, {}, 0
+        try:
+            merged = {table: pd.concat(dfs, ignore_index=True) for table, dfs in frames.items()}
+            for table, df in merged.items():
+                prepare_table(self.conn, df, table, key_columns(table))
+            with transaction(self.conn):
+                for table, df in merged.items():
+                    insert_frame(self.conn, df, table)
+                for sql, rows in statements.items():
+                    self.conn.executemany(sql, rows)
+            self.commits += 1
+            return True
+        except Exception as e:
+            tqdm.write(f"   ❌ 批次寫入資料庫錯誤: {e}")
+            return False
@@ -0,0 +1,303 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+import warnings
+
+import aiohttp
+import pandas as pd
+from tqdm import tqdm
+
+# 🚦 所有 stats.nba.com 請求共用的 AIMD 限流器 (取代固定的隨機 sleep)
+from rate_limiter import get_limiter, CircuitOpenError, THROTTLE_STATUS, SERVER_ERROR_STATUS
+# 💾 原始回應的壓縮磁碟快取 (NBA_REPLAY=1 時只讀快取、完全不連網)
+import response_cache
+
+# 忽略 NBA API 的警告訊息
+warnings.filterwarnings("ignore", category=UserWarning, module="nba_api")
+
+# ===========================
+# ⚙️ 共用連線設定區
+# ===========================
+STATS_BASE_URL = "https://stats.nba.com/stats/{endpoint}"
+
+TIMEOUT_SECONDS = 30             # 使用私人 Proxy，速度快，超時可以縮短
+MAX_RETRIES = 5
+BACKOFF_BASE = 2                 # 重試前的指數退避：2、4、8... 秒 (再乘上 0.5~1.5 的隨機抖動)
+BACKOFF_MAX = 30
+MAX_IN_FLIGHT = 4                # 同時在路上的請求上限 (避免被 Webshare 視為攻擊)
+KEEPALIVE_SECONDS = 60           # 連線池中閒置連線保留秒數
+
+# === 並行數自動調整 (autoscale=True 時啟用) ===
+AUTOSCALE_WINDOW = 20            # 每累積這麼多筆回應評估一次
+AUTOSCALE_MAX_ERROR_RATE = 0.1   # 視窗內錯誤率超過 10% 就把並行數減半
+AUTOSCALE_SLOW_FACTOR = 2.0      # 平均延遲超過最佳延遲的 2 倍也減半 (伺服器開始排隊了)
+AUTOSCALE_FAST_FACTOR = 1.3      # 平均延遲在最佳延遲 1.3 倍以內才加 1
+
+# 沒有指定優先序的請求 (賽程表、整季請求) 排在所有比賽日請求之前；其餘見 fetch_scheduler.fetch_priority
+URGENT_PRIORITY = (-1, 0)
+
+# 這些狀態碼代表「伺服器暫時不想理你」，值得重試 (一律觸發限流器降速 + 指數退避)
+RETRY_STATUS = SERVER_ERROR_STATUS | THROTTLE_STATUS
+
+RETRY_EXCEPTIONS = (
+    asyncio.TimeoutError,
+    aiohttp.ClientConnectionError,
+    aiohttp.ClientPayloadError,
+)
+
+# fetch_json 放棄時回傳的失敗原因
+FAIL_RETRY_EXHAUSTED = 'retry_exhausted'   # 逾時 / 5xx / 被擋，重試用盡 (請求太大時縮小範圍可能就會過)
+FAIL_BAD_JSON = 'bad_json'                 # 回應不是完整的 JSON (大回應被截斷時常見)
+FAIL_REJECTED = 'rejected'                 # 不可重試的 HTTP 狀態碼或未知錯誤 (換個範圍也一樣)
+FAIL_CIRCUIT_OPEN = 'circuit_open'         # 限流器斷路中
+FAIL_REPLAY_MISS = 'replay_miss'           # 重播模式下快取沒有這個請求
+
+# === 真實瀏覽器偽裝 ===
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0.3 Safari/605.1.15',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
+]
+
+def get_headers():
+    """每次請求隨機產生一組正常的瀏覽器標頭，避免被防火牆阻擋"""
+    return {
+        'User-Agent': random.choice(USER_AGENTS),
+        'Accept': 'application/json, text/plain, */*',
+        'Accept-Language': 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
+        'Accept-Encoding': 'gzip, deflate',
+        'Referer': 'https://www.nba.com/',
+        'Origin': 'https://www.nba.com',
+        'x-nba-stats-origin': 'stats',
+        'x-nba-stats-token': 'true',
+        'Connection': 'keep-alive',
+        'Sec-Fetch-Dest': 'empty',
+        'Sec-Fetch-Mode': 'cors',
+        'Sec-Fetch-Site': 'same-site',
+    }
+
+def game_logs_request(endpoint_cls, season, season_type, measure_type, date_from=None, date_to=None):
+    """
+    借用 nba_api 的端點類別產生參數 (不實際發出請求)，
+    回傳 (endpoint 名稱, 參數 dict, 顯示用標籤)，交給 NBAStatsClient 非同步送出。
+    endpoint_cls: teamgamelogs.TeamGameLogs 或 playergamelogs.PlayerGameLogs
+    """
+    ep = endpoint_cls(
+        season_nullable=season,
+        season_type_nullable=season_type,
+        measure_type_player_game_logs_nullable=measure_type,
+        date_from_nullable=date_from or '',
+        date_to_nullable=date_to or '',
+        get_request=False
+    )
+    label = f"{measure_type} {date_from}" if date_from else measure_type
+    return ep.endpoint, ep.parameters, label
+
+def result_set_to_frame(data, index=0):
+    """
+    把 stats.nba.com 的 resultSets 轉成 DataFrame (等同 get_data_frames()[index])。
+    index 也可以給名稱 (例如 'InactivePlayers')，找不到時回傳空 DataFrame。
+    """
+    if not data: return pd.DataFrame()
+    results = data.get('resultSets', data.get('resultSet'))
+    if isinstance(results, dict): results = [results]
+    if not results: return pd.DataFrame()
+    if isinstance(index, str):
+        results = [r for r in results if r.get('name') == index]
+        index = 0
+    if len(results) <= index: return pd.DataFrame()
+    result = results[index]
+    return pd.DataFrame(result.get('rowSet', []), columns=result.get('headers', []))
+
+class AdaptiveConcurrency:
+    """
+    📈 依觀察到的延遲與錯誤率自動調整「同時在路上的請求數」(取代固定的 Semaphore)：
+    每 AUTOSCALE_WINDOW 筆回應評估一次，又快又穩就 +1，變慢或出錯就減半。
+    minimum == maximum 時就是一般的固定上限。
+    排隊中的請求依優先序 (越小越先) 放行，而不是先到先贏，最新的比賽可以插隊到補抓前面。
+    用法: async with gate.slot(priority): ...  (回應後呼叫 gate.record(latency, ok))
+    """
+
+    def __init__(self, start, minimum, maximum):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(start, maximum))
+        self.in_flight = 0
+        self.best_latency = None
+        self.window = []
+        self.waiters = []              # heap: (priority, 序號, future)
+        self.counter = itertools.count()
+
+    @asynccontextmanager
+    async def slot(self, priority=None):
+        await self.acquire(priority)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    async def acquire(self, priority=None):
+        if self.in_flight < self.limit and not self.waiters:
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority or URGENT_PRIORITY, next(self.counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 已經拿到名額才被取消，要把名額還回去
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self.waiters and self.in_flight < self.limit:
+            _, _, future = heapq.heappop(self.waiters)
+            if future.cancelled(): continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def record(self, latency, ok):
+        if self.minimum == self.maximum: return
+        self.window.append((latency, ok))
+        if len(self.window) < AUTOSCALE_WINDOW: return
+
+        oks = [lat for lat, success in self.window if success]
+        error_rate = 1 - len(oks) / len(self.window)
+        avg_latency = sum(oks) / len(oks) if oks else float('inf')
+        self.window = []
+        if oks:
+            self.best_latency = min(self.best_latency or avg_latency, avg_latency)
+
+        old_limit = self.limit
+        if error_rate > AUTOSCALE_MAX_ERROR_RATE or avg_latency > self.best_latency * AUTOSCALE_SLOW_FACTOR:
+            self.limit = max(self.minimum, self.limit // 2)
+        elif avg_latency <= self.best_latency * AUTOSCALE_FAST_FACTOR:
+            self.limit = min(self.maximum, self.limit + 1)
+
+        if self.limit != old_limit:
+            self._wake()
+            tqdm.write(f"   📈 並行數 {old_limit} -> {self.limit} (平均延遲 {avg_latency:.2f}s, 錯誤率 {error_rate:.0%})")
+
+class NBAStatsClient:
+    """
+    🌐 所有 stats.nba.com 爬蟲共用的非同步抓取客戶端：
+    - 單一 aiohttp Session，保留 keep-alive 連線池
+    - 限制同時在路上的請求數 (autoscale=True 時依延遲與錯誤率在 min_in_flight ~ max_in_flight 間自動調整)
+    - 協商 gzip 壓縮傳輸
+    - 統一的重試策略，節奏交給共用的 AIMD 限流器
+    - 先查磁碟快取，命中就不佔用任何連線與限流額度
+    用法: async with NBAStatsClient() as client: data = await client.get_json(endpoint, params, label)
+         再用 result_set_to_frame(data) 轉成 DataFrame；需要知道失敗原因時改用 fetch_json
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, timeout=TIMEOUT_SECONDS, max_retries=MAX_RETRIES,
+                 autoscale=False, min_in_flight=1):
+        self.max_in_flight = max_in_flight
+        self.min_in_flight = min_in_flight if autoscale else max_in_flight
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = None
+        self.semaphore = None
+        self.limiter = get_limiter()
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.max_in_flight,
+            keepalive_timeout=KEEPALIVE_SECONDS,
+            ttl_dns_cache=300
+        )
+        # trust_env=True：沿用 setup_proxy() 寫進環境變數的 HTTP(S)_PROXY
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trust_env=True
+        )
+        # 自動調整時從保守的 MAX_IN_FLIGHT 起步，再依實際表現往上加
+        self.semaphore = AdaptiveConcurrency(min(MAX_IN_FLIGHT, self.max_in_flight),
+                                             self.min_in_flight, self.max_in_flight)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        tqdm.write(f"   💾 {response_cache.summary()}")
+
+    async def get_json(self, endpoint, params, label='', priority=None, use_cache=True):
+        """
+        帶有重試的 GET，成功回傳 JSON dict，放棄時回傳 None。
+        priority: fetch_scheduler.fetch_priority() 的結果，排隊時越小越先送出
+        use_cache=False：不讀快取、一定連網 (回應仍會寫回快取)；重播模式下無效
+        """
+        data, _ = await self.fetch_json(endpoint, params, label, priority, use_cache)
+        return data
+
+    async def fetch_json(self, endpoint, params, label='', priority=None, use_cache=True):
+        """同 get_json，但回傳 (JSON dict 或 None, 失敗原因 FAIL_* 或 None)"""
+        url = STATS_BASE_URL.format(endpoint=endpoint)
+        # requests 會自動略過 None 參數，aiohttp 不會，這裡先清掉
+        params = {k: v for k, v in params.items() if v is not None}
+
+        if use_cache or response_cache.REPLAY_MODE:
+            cached = response_cache.get(endpoint, params)
+            if cached is not None:
+                return cached, None
+        if response_cache.REPLAY_MODE:
+            tqdm.write(f"   📼 [重播模式] 快取中沒有這個請求 ({label})，略過。")
+            return None, FAIL_REPLAY_MISS
+
+        for attempt in range(self.max_retries):
+            async with self.semaphore.slot(priority):
+                started = time.monotonic()
+                try:
+                    # 限流器決定什麼時候可以送出；被擋過之後會自動放慢
+                    await self.limiter.acquire_async()
+                    started = time.monotonic()
+                    async with self.session.get(url, params=params, headers=get_headers()) as resp:
+                        if resp.status == 200:
+                            try:
+                                data = await resp.json(content_type=None)
+                            except ValueError as e:
+                                self.semaphore.record(time.monotonic() - started, False)
+                                tqdm.write(f"   ⚠️ API 回應不是合法 JSON ({label}): {str(e)[:50]}")
+                                return None, FAIL_BAD_JSON
+                            self.limiter.on_success()
+                            self.semaphore.record(time.monotonic() - started, True)
+                            response_cache.put(endpoint, params, data)
+                            return data, None
+                        self.semaphore.record(time.monotonic() - started, False)
+                        if resp.status not in RETRY_STATUS:
+                            tqdm.write(f"   ⚠️ API 回應錯誤 ({label}): HTTP {resp.status}")
+                            return None, FAIL_REJECTED
+                        error_brief = f"HTTP {resp.status}"
+                        # 403/429 是被擋、5xx 是上游撐不住，都要降速
+                        self.limiter.on_throttle(error_brief)
+                except CircuitOpenError as e:
+                    tqdm.write(f"   🛑 放棄請求 ({label}): {e}")
+                    return None, FAIL_CIRCUIT_OPEN
+                except RETRY_EXCEPTIONS as e:
+                    error_brief = (str(e) or type(e).__name__)[:30]
+                    self.semaphore.record(self.timeout, False)
+                    self.limiter.on_throttle(error_brief)
+                except Exception as e:
+                    self.semaphore.record(time.monotonic() - started, False)
+                    if "no data" not in str(e).lower():
+                        tqdm.write(f"   ⚠️ API 未知錯誤 ({label}): {e}")
+                    return None, FAIL_REJECTED
+
+            if attempt == self.max_retries - 1:
+                break
+            # 退避時不佔用並行名額，讓其他請求照常進行
+            backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+            tqdm.write(f"   ⚠️ 伺服器無回應 ({label})，降速至 {self.limiter.rate:.2f} req/s，{backoff:.1f} 秒後重試... [{error_brief}]")
+            await asyncio.sleep(backoff)
+
+        tqdm.write(f"   ❌ 重試 {self.max_retries} 次仍失敗，放棄請求 ({label})")
+        return None, FAIL_RETRY_EXHAUSTED
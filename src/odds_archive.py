@@ -0,0 +1,45 @@
+import gzip
+import os
+import threading
+
+# ===========================
+# ⚙️ 原始賽果頁封存設定區
+# ===========================
+# 每一天的 PlaySport 賽果頁都以 gametime (YYYYMMDD) 為鍵壓縮保存，
+# 解析邏輯修正後可以直接從這裡重新解析，不必再爬一次網站。
+ARCHIVE_DIR = os.environ.get('NBA_ODDS_ARCHIVE_DIR', 'data/odds_archive')
+
+def archive_path(gametime):
+    # 依年份分資料夾，避免單一資料夾檔案過多
+    return os.path.join(ARCHIVE_DIR, gametime[:4], f"{gametime}.html.gz")
+
+def save(gametime, content):
+    """壓縮保存原始 HTML (bytes)；先寫暫存檔再 rename，避免崩潰時留下半個檔案"""
+    path = archive_path(gametime)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with gzip.open(tmp_path, 'wb', compresslevel=9) as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def load(gametime):
+    """讀回原始 HTML (bytes)，沒有封存或檔案損毀時回傳 None"""
+    path = archive_path(gametime)
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, 'rb') as f:
+            return f.read()
+    except (OSError, EOFError):
+        return None
+
+def list_gametimes():
+    """列出所有已封存的 gametime，依日期排序 (重新解析時照爬取的時間順序套用)"""
+    gametimes = []
+    if not os.path.isdir(ARCHIVE_DIR):
+        return gametimes
+    for year in os.listdir(ARCHIVE_DIR):
+        year_dir = os.path.join(ARCHIVE_DIR, year)
+        if not os.path.isdir(year_dir): continue
+        gametimes += [name[:-len('.html.gz')] for name in os.listdir(year_dir) if name.endswith('.html.gz')]
+    return sorted(gametimes)
@@ -0,0 +1,68 @@
+import re
+from functools import lru_cache
+
+# ===========================
+# ⚙️ 運彩欄位解析引擎 (預編譯版)
+# ===========================
+# 與舊版 parse_cell_robust (V5 修復版) 結果完全相同，
+# 由 src/fixtures/odds_cells_golden.json + src/bench_odds_parser.py 把關。
+PAREN_RE = re.compile(r'\(.*?\)')                     # 括號內的詳情 (例: "(半)"、"(贏)")
+NUMBER_RE = re.compile(r'[-+]?\d+\.\d+|[-+]?\d+')     # 所有數字 (支援負號與小數點)
+
+CACHE_SIZE = 8192   # 一季的欄位文字重複率很高 ("-"、"1.75"...)，解析結果直接快取
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_cell(text):
+    """
+    🔥 核心引擎：解析單一運彩欄位，回傳 (分數, 賠率)。
+    可處理完賽後「賠率黏著輸贏字眼」(如 "1.75贏50%")、PK、未開 等格式。
+    """
+    if not text or text == '-' or '未開' in text: return None, None
+
+    # 1. 預處理：檢查 PK
+    is_pk = 'PK' in text.upper()
+
+    # 2. 清洗資料：移除括號內的詳情與 &nbsp; (沒有這些字元時直接略過)
+    if '(' in text:
+        text = PAREN_RE.sub('', text)
+    if '&' in text:
+        text = text.replace('&nbsp;', '')
+
+    # 3. 一次取出所有數字；Regex 保證格式正確，float() 不會失敗
+    nums = [float(n) for n in NUMBER_RE.findall(text)]
+
+    if not nums:
+        return (0.0, None) if is_pk else (None, None)
+
+    # 4. 智慧分配邏輯
+    if len(nums) == 1:
+        val = nums[0]
+        if val > 50 or val == 0: # 大小分分數或PK
+            final_val, final_odds = val, None
+        else:
+            final_val, final_odds = None, val # 賠率
+    else:
+        final_val, final_odds = nums[-2], nums[-1] # 倒數第二個是分數，最後一個是賠率
+
+    if is_pk: final_val = 0.0
+
+    return final_val, final_odds
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_total(text):
+    """解析大小分欄位，回傳 (分數, 賠率, 是否為「大」)"""
+    if not text: return None, None, False
+    v, o = parse_cell(text)
+    if v is not None: v = abs(v) # 大小分一定是正數
+    return v, o, '大' in text
+
+def parse_cells(texts):
+    """
+    整頁批次解析：收集一整頁所有比賽的欄位文字，去重後每種文字只解析一次，
+    回傳 {文字: (分數, 賠率)}，呼叫端再依文字查表。
+    """
+    return {t: parse_cell(t) for t in dict.fromkeys(texts)}
+
+def parse_totals(texts):
+    """同 parse_cells，回傳 {文字: (分數, 賠率, 是否為「大」)}"""
+    return {t: parse_total(t) for t in dict.fromkeys(texts)}
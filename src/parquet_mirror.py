@@ -0,0 +1,206 @@
+import json
+import os
+import shutil
+import sqlite3
+
+import pandas as pd
+
+# pyarrow 是選用套件：沒裝時 prepare_data 直接退回讀 SQLite
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# ===========================
+# ⚙️ 歷史資料庫 Parquet 鏡像設定區
+# ===========================
+# 663MB 的歷史資料庫只會在發新版時變動，第一次讀某張表時就把它轉成
+# 「一張表一個資料夾、一個賽季一個 Parquet 檔」，之後直接用記憶體映射讀欄式檔案。
+MIRROR_DIR = os.environ.get('NBA_PARQUET_DIR', 'data/historical_parquet')
+MANIFEST_NAME = '_manifest.json'
+SEASON_COLUMNS = ['SEASON_YEAR', 'season']   # 資料庫中 SEASON_YEAR 與 season 混用
+COMPRESSION = 'zstd'
+
+def season_column(columns):
+    """回傳這張表的賽季欄位名稱，沒有賽季欄位則回傳 None"""
+    for col in SEASON_COLUMNS:
+        if col in columns:
+            return col
+    return None
+
+def _plain(value):
+    """numpy 純量 / NaN 轉回 Python 型別，manifest 才能存成 JSON"""
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+def source_fingerprint(db_path):
+    """用檔案大小 + 修改時間判斷歷史資料庫是否換過版本"""
+    st = os.stat(db_path)
+    return {'size': st.st_size, 'mtime': st.st_mtime}
+
+def _manifest_path():
+    return os.path.join(MIRROR_DIR, MANIFEST_NAME)
+
+def load_manifest():
+    try:
+        with open(_manifest_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(manifest):
+    os.makedirs(MIRROR_DIR, exist_ok=True)
+    tmp_path = f"{_manifest_path()}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, _manifest_path())
+
+def integer_columns(conn, table_name, df):
+    """
+    找出「因為有 NULL 才被 pandas 讀成 float64」的整數欄位 (SQLite 中沒有任何 real 值)。
+    整張表一起讀時只要某一季有 NULL 就會變 float，所以要回頭問 SQLite 真正的儲存型別。
+    """
+    float_cols = [c for c in df.columns if df[c].dtype == 'float64' and df[c].notna().any()]
+    if not float_cols:
+        return set()
+    checks = ', '.join(f"MAX(typeof(\"{c}\") = 'real')" for c in float_cols)
+    has_real = conn.execute(f"SELECT {checks} FROM {table_name}").fetchone()
+    return {c for c, real in zip(float_cols, has_real) if not real}
+
+def mirror_table(db_path, table_name):
+    """
+    🔄 把歷史資料庫的一張表轉成 Parquet (依賽季切檔)，回傳 manifest 中的該表資訊。
+    欄位型別直接沿用 pd.read_sql 的推斷結果，讀回來的 DataFrame 與直接查 SQLite 相同。
+    無法轉換的表 (例如同一欄混了數字與文字) 會記錄為 unsupported，之後都改讀 SQLite。
+    """
+    manifest = load_manifest()
+    entry = {'source': source_fingerprint(db_path)}
+
+    conn = sqlite3.connect(db_path)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,)).fetchone():
+            return None
+        df = pd.read_sql(f"SELECT * FROM {table_name}", conn)
+        int_cols = integer_columns(conn, table_name, df)
+    finally:
+        conn.close()
+
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # 整數欄位存成可為 NULL 的 int64：讀回時跟 read_sql 一樣，選到的賽季沒有 NULL 就是 int64
+        schema = pa.schema([f.with_type(pa.int64()) if f.name in int_cols else f for f in table.schema])
+        table = table.cast(schema)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        print(f"   ⚠️ [{table_name}] 無法轉成 Parquet，改讀 SQLite: {e}")
+        entry['unsupported'] = True
+        manifest[table_name] = entry
+        _save_manifest(manifest)
+        return entry
+
+    season_col = season_column(df.columns)
+    if season_col and len(df):
+        groups = df.groupby(season_col, dropna=False, sort=True).indices.items()
+        parts = [(_plain(season), table.take(idx)) for season, idx in groups]
+    else:
+        parts = [(None, table)]
+
+    # 先寫到暫存資料夾再整個換上去，轉到一半中斷也不會留下殘缺的鏡像
+    table_dir = os.path.join(MIRROR_DIR, table_name)
+    tmp_dir = f"{table_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    partitions = []
+    for i, (season, part) in enumerate(parts):
+        filename = f"part-{i:03d}.parquet"
+        pq.write_table(part, os.path.join(tmp_dir, filename), compression=COMPRESSION)
+        partitions.append([season, filename])
+    shutil.rmtree(table_dir, ignore_errors=True)
+    os.replace(tmp_dir, table_dir)
+
+    entry.update({'season_column': season_col, 'columns': list(df.columns), 'partitions': partitions})
+    manifest[table_name] = entry
+    _save_manifest(manifest)
+    print(f"   🗜️ [{table_name}] 已轉成 Parquet 鏡像 ({len(partitions)} 個分區, {len(df)} 筆)")
+    return entry
+
+def ensure_table(db_path, table_name):
+    """鏡像不存在或歷史資料庫換過版本時重新轉換；回傳可用的 manifest 資訊或 None"""
+    entry = load_manifest().get(table_name)
+    if entry is None or entry.get('source') != source_fingerprint(db_path):
+        entry = mirror_table(db_path, table_name)
+    if entry is None or entry.get('unsupported'):
+        return None
+    return entry
+
+def filter_mask(table, filters):
+    """把 (欄位, 運算, 值) 條件轉成 pyarrow 布林遮罩 (語意同 prepare_data.select_sql，NULL 一律不選)"""
+    mask = None
+    for col, op, value in filters:
+        if op == 'in':
+            cond = pc.is_in(table[col], value_set=pa.array(value))
+        else:
+            day = pc.utf8_slice_codeunits(table[col], 0, 10)   # 只比 YYYY-MM-DD
+            cond = pc.greater_equal(day, value) if op == '>=' else pc.less_equal(day, value)
+        mask = cond if mask is None else pc.and_(mask, cond)
+    return mask
+
+def read_table(db_path, table_name, columns=None, exclude_seasons=(), filters=()):
+    """
+    ⚡ 從 Parquet 鏡像讀取歷史資料 (記憶體映射 + 只讀需要的欄位與賽季分區)。
+    exclude_seasons 比照 SQL 的 `!=`：排除指定賽季，賽季為 NULL 的列也不會回傳。
+    filters: (欄位, 'in' / '>=' / '<=', 值) 清單；賽季欄位的 'in' 直接用來略過整個分區。
+    回傳 None 代表鏡像不可用，呼叫端應改讀 SQLite。
+    """
+    if not HAS_PYARROW or not os.path.exists(db_path):
+        return None
+    entry = ensure_table(db_path, table_name)
+    if entry is None:
+        return None
+
+    season_col = entry['season_column']
+    keep_seasons = None
+    for col, op, value in filters:
+        if col == season_col and op == 'in':
+            keep_seasons = set(value) if keep_seasons is None else keep_seasons & set(value)
+
+    # 只讀需要的欄位 (加上篩選要用的欄位，篩完再丟掉)；一個都沒有時讀全部，列數才對得上
+    if columns is not None:
+        columns = [c for c in columns if c in entry['columns']] or None
+    read_cols = columns
+    if columns is not None and filters:
+        read_cols = columns + [c for c in dict.fromkeys(c for c, _, _ in filters) if c not in columns]
+
+    table_dir = os.path.join(MIRROR_DIR, table_name)
+    filtering = season_col is not None and exclude_seasons
+    tables = []
+    for season, filename in entry['partitions']:
+        if filtering and (season is None or season in exclude_seasons):
+            continue
+        if keep_seasons is not None and season not in keep_seasons:
+            continue
+        tables.append(pq.read_table(os.path.join(table_dir, filename), columns=read_cols, memory_map=True))
+
+    if not tables:
+        # 全部分區都被排除時，仍回傳欄位型別正確的空表
+        first = os.path.join(table_dir, entry['partitions'][0][1])
+        tables = [pq.read_table(first, columns=read_cols, memory_map=True).slice(0, 0)]
+    table = pa.concat_tables(tables)
+    if filters:
+        table = table.filter(filter_mask(table, filters))
+    if read_cols is not columns:
+        table = table.select(columns)
+    return table.to_pandas()
+
+if __name__ == "__main__":
+    # 一次把整個歷史資料庫轉完 (平常不需要，第一次讀取時會自動轉換)
+    from prepare_data import HISTORICAL_DB_PATH, download_historical_db
+    download_historical_db()
+    conn = sqlite3.connect(HISTORICAL_DB_PATH)
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")]
+    conn.close()
+    for name in tables:
+        mirror_table(HISTORICAL_DB_PATH, name)
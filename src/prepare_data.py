@@ -1,8 +1,16 @@
 import os
 import sqlite3
-import urllib.request
 import pandas as pd
 
+# 🔌 與爬蟲共用的 WAL 資料庫連線
+from nba_db import DB_PATH, get_connection
+# 🗜️ 歷史資料庫的 Parquet 鏡像 (沒裝 pyarrow 時自動退回讀 SQLite)
+import parquet_mirror
+# 🧠 合併結果快取 (以兩個資料庫的版本指紋失效)
+from frame_cache import FrameCache, db_fingerprint
+# 🔄 可續傳、逐區塊校驗、只抓差異的歷史資料庫同步
+import db_sync
+
 # ===========================
 # ⚙️ 設定區
 # ===========================
@@ -10,70 +18,371 @@ import pandas as pd
 HISTORICAL_DB_URL = "https://github.com/Ricky0627/nba-api/releases/download/v1.0-data/nba_raw.db"
 # 為了避免跟原本的檔名搞混，我們在雲端下載時幫它換個名字
 HISTORICAL_DB_PATH = "data/nba_raw_historical.db"
+# NBA_SYNC_HISTORICAL=1：本機已有歷史資料庫時，仍比對校驗清單、只下載有變動的區塊
+SYNC_HISTORICAL = os.environ.get('NBA_SYNC_HISTORICAL', '') == '1'
 # 這是 GitHub Actions 每天會抓取的最新賽季小資料庫
-CURRENT_DB_PATH = "data/nba_current.db"
+CURRENT_DB_PATH = DB_PATH
+# 最新賽季由 CURRENT_DB_PATH 提供，歷史資料庫中的這一季一律排除
+CURRENT_SEASON = '2025-26'
+# 合併引擎：parquet (預設，歷史表讀 Parquet 鏡像再跟最新資料 concat，重複讀取最快)
+#          sqlite  (兩個資料庫 ATTACH 後在 SQLite 內合併，峰值記憶體最低；沒裝 pyarrow 時自動使用)
+# 兩種引擎回傳的列順序與欄位型別完全相同 (tests/test_merge_engines.py)
+MERGE_ENGINE = os.environ.get('NBA_MERGE_ENGINE', 'parquet')
+# SQLite 內合併時，每次從游標取回的列數
+MERGE_CHUNK_ROWS = 10000
+# iter_merged 每一批大約的列數
+ITER_CHUNK_ROWS = 50000
+
+# 同一個行程內共用的合併結果快取 (設定 NBA_FRAME_SPILL_DIR 時，pipeline 的其他行程也能讀磁碟那一份)
+MERGED_CACHE = FrameCache()
+_historical_checked = False
 
 def download_historical_db():
-    """自動從 GitHub Releases 下載歷史資料庫"""
+    """自動從 GitHub Releases 下載歷史資料庫 (每個行程只檢查一次)"""
+    global _historical_checked
+    if _historical_checked and os.path.exists(HISTORICAL_DB_PATH):
+        return
+    _historical_checked = True
+
     if not os.path.exists("data"):
         os.makedirs("data")
         
-    if not os.path.exists(HISTORICAL_DB_PATH):
-        print(f"⬇️ 正在從 GitHub Releases 下載歷史資料庫 (約 663MB)...")
-        # GitHub Actions 的網速極快，通常幾十秒內就能載完
-        urllib.request.urlretrieve(HISTORICAL_DB_URL, HISTORICAL_DB_PATH)
-        print("✅ 歷史資料庫下載完成！")
+    if not os.path.exists(HISTORICAL_DB_PATH) or SYNC_HISTORICAL:
+        print(f"⬇️ 正在從 GitHub Releases 同步歷史資料庫 (約 663MB，中斷後會續傳)...")
+        downloaded = db_sync.sync_file(HISTORICAL_DB_URL, HISTORICAL_DB_PATH)
+        print(f"✅ 歷史資料庫同步完成！(本次下載 {downloaded / 1024 / 1024:.1f} MB)")
     else:
         print("✅ 歷史資料庫已存在本機，跳過下載。")
 
-def get_merged_dataframe(table_name):
+# 篩選條件會用到的欄位 (不同資料表命名不一，依序找第一個存在的)
+DATE_COLUMNS = ['GAME_DATE', 'date']
+SEASON_TYPE_COLUMNS = ['SEASON_TYPE', 'game_type']
+
+def table_columns(conn, table_name):
+    return [info[1] for info in conn.execute(f"PRAGMA table_info({table_name})").fetchall()]
+
+def _pick_column(columns, candidates, table_name, arg):
+    for col in candidates:
+        if col in columns:
+            return col
+    raise ValueError(f"資料表 {table_name} 沒有可用於 {arg}= 篩選的欄位 ({' / '.join(candidates)})")
+
+def _as_list(value):
+    return [value] if isinstance(value, str) else list(value)
+
+def row_filters(table_name, columns, seasons=None, date_from=None, date_to=None, season_type=None):
+    """
+    把篩選參數轉成 (欄位, 運算, 值) 清單，SQLite 與 Parquet 兩邊共用同一份條件。
+    日期只比較前 10 碼 (YYYY-MM-DD)，GAME_DATE 帶不帶 T00:00:00 都能比。
+    """
+    filters = []
+    if seasons is not None:
+        col = parquet_mirror.season_column(columns)
+        if col is None:
+            raise ValueError(f"資料表 {table_name} 沒有賽季欄位，無法用 seasons= 篩選")
+        filters.append((col, 'in', _as_list(seasons)))
+    if season_type is not None:
+        filters.append((_pick_column(columns, SEASON_TYPE_COLUMNS, table_name, 'season_type'), 'in', _as_list(season_type)))
+    if date_from is not None:
+        filters.append((_pick_column(columns, DATE_COLUMNS, table_name, 'date_from'), '>=', str(pd.Timestamp(date_from).date())))
+    if date_to is not None:
+        filters.append((_pick_column(columns, DATE_COLUMNS, table_name, 'date_to'), '<=', str(pd.Timestamp(date_to).date())))
+    return filters
+
+def _quote(columns):
+    return ', '.join(f'"{c}"' for c in columns)
+
+def where_sql(filters, exclude_season_col=None):
+    """把篩選條件轉成 WHERE 子句與參數 (沒有條件時回傳空字串)"""
+    where, params = [], []
+    if exclude_season_col:
+        # 排除最新賽季，避免與新資料庫重複
+        where.append(f"{exclude_season_col} != ?")
+        params.append(CURRENT_SEASON)
+    for col, op, value in filters:
+        if op == 'in':
+            where.append(f"{col} IN ({', '.join(['?'] * len(value))})")
+            params += value
+        else:
+            where.append(f"substr({col}, 1, 10) {op} ?")
+            params.append(value)
+    return (" WHERE " + " AND ".join(where) if where else ""), params
+
+def select_sql(table_name, columns, filters, exclude_season_col=None):
+    """
+    組出 SELECT 語法：只選需要的欄位，篩選條件全部交給 SQLite 處理。
+    固定依 rowid (寫入順序) 排序：走索引時 SQLite 會改用索引順序，兩種合併引擎的列順序就會對不上。
+    """
+    cols = _quote(columns) if columns is not None else '*'
+    where, params = where_sql(filters, exclude_season_col)
+    return f"SELECT {cols} FROM {table_name}{where} ORDER BY rowid", params
+
+def _projection(available, columns):
+    """
+    只保留這個資料來源真的有的欄位 (大小寫需完全相同，缺的欄位合併後會是 NaN)。
+    一個都沒有時退回讀全部欄位，列數才會跟著合併 (多的欄位最後會被丟掉)。
+    """
+    if columns is None: return None
+    return [c for c in columns if c in available] or None
+
+def merged_sql(table_name, hist_columns, curr_columns, columns, filters, dedup, order_by=None):
+    """
+    組出 ATTACH 之後的合併查詢：main (歷史) 與 curr (最新) 兩邊對齊欄位後 UNION ALL。
+    欄位比照 pd.concat：名稱大小寫完全相同才算同一欄，某一邊沒有的欄位補 NULL。
+    列順序比照 Parquet 引擎：歷史資料依賽季分區 (賽季排序、區內依 rowid)，接著是最新資料 (依 rowid)。
+    dedup 時先對「全部欄位」去重 (同 drop_duplicates，保留第一次出現的位置)，再挑欄位。
+    order_by 有給時優先依它排序，同值的列維持上面的順序。
+    """
+    all_cols = list(dict.fromkeys(hist_columns + (curr_columns or [])))
+    missing = [c for c in (columns or []) if c not in all_cols]
+    if missing:
+        raise KeyError(f"{missing} not in {table_name}")
+    side_cols = all_cols if dedup or columns is None else columns
+    # 子查詢的欄位一律改用 c0, c1... 命名：game_id 與 GAME_ID 在 SQLite 子查詢中會被視為同名
+    alias = {c: f"c{i}" for i, c in enumerate(side_cols)}
+    hist_season = parquet_mirror.season_column(hist_columns)
+
+    def side(schema, available, source, season_col):
+        cols = [f"{_quote([c]) if c in available else 'NULL'} AS {alias[c]}" for c in side_cols]
+        # 排序用的來源位置：_src (0 = 歷史, 1 = 最新)、_season (只有歷史依賽季分區)、_rid (寫入順序)
+        cols += [f"{source} AS _src", f"{_quote([season_col]) if season_col else 'NULL'} AS _season", "rowid AS _rid"]
+        where, params = where_sql(filters, season_col)
+        return f"SELECT {', '.join(cols)} FROM {schema}.{table_name}{where}", params
+
+    sql, params = side('main', hist_columns, 0, hist_season)
+    if curr_columns is not None:
+        curr_sql, curr_params = side('curr', curr_columns, 1, None)
+        sql, params = f"{sql} UNION ALL {curr_sql}", params + curr_params
+
+    inner_cols = ', '.join(alias.values())
+    if dedup:
+        # 每一種資料列只留一筆，位置取第一次出現的地方
+        sql = (f"SELECT {inner_cols}, MIN(_pos) AS _pos FROM ("
+               f"SELECT *, ROW_NUMBER() OVER (ORDER BY _src, _season, _rid) AS _pos FROM ({sql})"
+               f") GROUP BY {inner_cols}")
+        position = ['_pos']
+    else:
+        position = ['_src', '_season', '_rid']
+    out_cols = columns if columns is not None else side_cols
+    sort_keys = [alias[c] for c in (order_by or [])] + position
+    sql = f"SELECT {', '.join(f'{alias[c]} AS {_quote([c])}' for c in out_cols)} FROM ({sql}) ORDER BY {', '.join(sort_keys)}"
+    return sql, params
+
+def fetch_merged(table_name, hist_columns, columns=None, filters=(), dedup=False, order_by=None):
+    """
+    🗃️ 把最新資料庫 ATTACH 到歷史資料庫上，由 SQLite 一次串流合併，
+    每次產出 (欄位名稱, 最多 MERGE_CHUNK_ROWS 列) 的批次；排序交給 SQLite (資料量大時會用暫存檔)。
+    """
+    conn = sqlite3.connect(f"file:{HISTORICAL_DB_PATH}?mode=ro", uri=True)
+    try:
+        curr_columns = None
+        if os.path.exists(CURRENT_DB_PATH):
+            conn.execute("ATTACH DATABASE ? AS curr", (f"file:{CURRENT_DB_PATH}?mode=ro",))
+            curr_columns = [info[1] for info in conn.execute(f"PRAGMA curr.table_info({table_name})").fetchall()]
+        else:
+            print(f"⚠️ 找不到最新資料庫 {CURRENT_DB_PATH}，僅使用歷史資料。")
+
+        sql, params = merged_sql(table_name, hist_columns, curr_columns, columns, filters, dedup, order_by)
+        cursor = conn.execute(sql, params)
+        names = [d[0] for d in cursor.description]
+        while rows := cursor.fetchmany(MERGE_CHUNK_ROWS):
+            yield names, rows
+        yield names, []   # 沒有任何資料時，呼叫端仍拿得到欄位名稱
+    finally:
+        conn.close()
+
+def _records_frame(rows, names):
+    return pd.DataFrame.from_records(rows, columns=names, coerce_float=True)
+
+def storage_kinds(table_name, columns):
+    """
+    回傳歷史表每個欄位實際存放的型別 {欄位: 'text' / 'real' / 'integer' / None (全是 NULL)}，
+    判斷規則同 pd.read_sql 讀整張表 (也就是 Parquet 鏡像的欄位型別)：有文字算文字、有小數算 real。
+    """
+    if not columns:
+        return {}
+    checks = ', '.join(f"MAX(typeof({q}) IN ('text', 'blob')), MAX(typeof({q}) = 'real'), MAX(typeof({q}) = 'integer')"
+                       for q in (_quote([c]) for c in columns))
+    conn = sqlite3.connect(f"file:{HISTORICAL_DB_PATH}?mode=ro", uri=True)
+    try:
+        flags = conn.execute(f"SELECT {checks} FROM {table_name}").fetchone()
+    finally:
+        conn.close()
+    kinds = {}
+    for i, col in enumerate(columns):
+        text, real, integer = flags[3 * i:3 * i + 3]
+        kinds[col] = 'text' if text else 'real' if real else 'integer' if integer else None
+    return kinds
+
+def align_dtypes(df, table_name, hist_columns):
+    """
+    兩種引擎共用的收尾：結果缺少型別線索時 (沒有任何資料、或某欄全是 NULL)，一律改用歷史表的欄位型別，
+    讓 Parquet 與 SQLite 引擎回傳的 DataFrame 完全相同。只有最新資料庫才有的欄位是 object (值為 None)。
+    """
+    if df.empty:
+        targets = [c for c in df.columns if c in hist_columns]
+    else:
+        targets = [c for c in df.columns if df[c].isna().all()]
+    if not targets:
+        return df
+    kinds = storage_kinds(table_name, [c for c in targets if c in hist_columns])
+    if df.empty:
+        # 用一列代表值讓 pandas 走跟有資料時一樣的推斷，再切成 0 列
+        sample = {'text': 'x', 'real': 0.5, 'integer': 0}
+        row = tuple(sample.get(kinds.get(c)) for c in df.columns)
+        return _records_frame([row], list(df.columns)).iloc[:0]
+    text_dtype = _records_frame([('x',)], ['x'])['x'].dtype
+    for col in targets:
+        kind = kinds.get(col)
+        if kind == 'text':
+            df[col] = df[col].astype(text_dtype)
+        elif kind is not None:
+            df[col] = df[col].astype('float64')   # 整數欄位有 NULL 時 pandas 一律是 float64
+        else:
+            df[col] = pd.Series([None] * len(df), index=df.index, dtype=object)
+    return df
+
+def read_merged_sqlite(table_name, hist_columns, columns=None, filters=(), dedup=False):
+    """
+    SQLite 引擎：分批把 SQLite 合併結果組成 DataFrame，
+    不會同時存在「歷史表 + 最新表 + 合併表」三份資料，也不會一次把整張表的 Python tuple 堆在記憶體裡。
+    列順序與欄位型別與 Parquet 引擎相同。
+    """
+    chunks, names = [], []
+    for names, rows in fetch_merged(table_name, hist_columns, columns, filters, dedup):
+        if rows:
+            chunks.append(_records_frame(rows, names))
+
+    if not chunks:
+        df = pd.DataFrame(columns=names)
+    elif len(chunks) == 1:
+        df = chunks[0]
+    else:
+        # 各批次各自推斷型別 (例如某批全是 NULL 會變 object)，合併後再統一推斷一次
+        df = pd.concat(chunks, ignore_index=True).infer_objects()
+    return align_dtypes(df, table_name, hist_columns)
+
+def read_current(table_name, columns=None, filters=()):
+    """讀取最新賽季資料庫 (共用連線不關閉，同一個行程合併多張表時不必重複開檔)"""
+    conn = get_connection(CURRENT_DB_PATH)
+    sql, params = select_sql(table_name, _projection(table_columns(conn, table_name), columns), filters)
+    return pd.read_sql(sql, conn, params=params)
+
+def table_plan(table_name, seasons=None, date_from=None, date_to=None, season_type=None):
+    """讀取歷史表的欄位並整理篩選條件，回傳 (歷史欄位, 篩選條件, 是否需要去重)"""
+    conn_hist = sqlite3.connect(HISTORICAL_DB_PATH)
+    hist_columns = table_columns(conn_hist, table_name)
+    conn_hist.close()
+    filters = row_filters(table_name, hist_columns, seasons, date_from, date_to, season_type)
+    # 沒有賽季欄位的關聯表，要用「全部欄位」去重後再挑欄位
+    dedup = parquet_mirror.season_column(hist_columns) is None
+    return hist_columns, filters, dedup
+
+def get_merged_dataframe(table_name, columns=None, seasons=None, date_from=None, date_to=None, season_type=None):
     """
     獲取合併後的完整資料表 (Pandas DataFrame 格式)
     這可以直接餵給你的機器學習模型！
+    columns: 只讀取這些欄位 (依此順序回傳)，省略則讀全部
+    seasons / date_from / date_to / season_type: 篩選條件，直接在 SQLite / Parquet 端處理
+    兩個資料庫都沒變時，同樣的查詢直接回傳快取中的同一個 DataFrame (每個資料版本只解碼一次)；
+    回傳值請當作唯讀，要修改時先取子集或 .copy()。
     """
     download_historical_db()
-    
+
+    query = [table_name, columns, seasons, date_from, date_to, season_type]
+    versions = [db_fingerprint(HISTORICAL_DB_PATH), db_fingerprint(CURRENT_DB_PATH)]
+    df_cached = MERGED_CACHE.get(table_name, query, versions)
+    if df_cached is not None:
+        print(f"\n♻️ 使用快取的合併資料表: {table_name} ({len(df_cached)} 筆)")
+        return df_cached
+
+    df_merged = load_merged_dataframe(table_name, columns, seasons, date_from, date_to, season_type)
+    MERGED_CACHE.put(table_name, query, versions, df_merged)
+    return df_merged
+
+def load_merged_dataframe(table_name, columns=None, seasons=None, date_from=None, date_to=None, season_type=None):
+    """實際讀取並合併歷史 + 最新資料 (不經過快取)"""
     print(f"\n🔄 正在合併資料表: {table_name}")
+
+    hist_columns, filters, dedup = table_plan(table_name, seasons, date_from, date_to, season_type)
+    read_cols = None if dedup else columns
     
     # --- 1. 讀取歷史資料 (冷資料) ---
-    conn_hist = sqlite3.connect(HISTORICAL_DB_PATH)
-    
-    # 智慧判斷欄位名稱 (應對你資料庫中 SEASON_YEAR 與 season 混用的狀況)
-    cursor = conn_hist.cursor()
-    cursor.execute(f"PRAGMA table_info({table_name})")
-    columns = [info[1] for info in cursor.fetchall()]
-    
-    if 'SEASON_YEAR' in columns:
-        # 排除 2025-26，避免與新資料庫重複
-        query_hist = f"SELECT * FROM {table_name} WHERE SEASON_YEAR != '2025-26'"
-    elif 'season' in columns:
-        query_hist = f"SELECT * FROM {table_name} WHERE season != '2025-26'"
-    else:
-        # 如果是沒有賽季欄位的表 (如 inactive_players)，就全抓
-        query_hist = f"SELECT * FROM {table_name}"
-        
-    df_hist = pd.read_sql(query_hist, conn_hist)
-    conn_hist.close()
+    # 預設讀 Parquet 鏡像 (第一次讀取時自動轉換)
+    df_hist = None
+    if MERGE_ENGINE != 'sqlite':
+        df_hist = parquet_mirror.read_table(HISTORICAL_DB_PATH, table_name, columns=read_cols,
+                                            exclude_seasons=[CURRENT_SEASON], filters=filters)
+    if df_hist is None:
+        # SQLite 引擎 (指定使用或鏡像不可用)：兩個資料庫直接在 SQLite 裡合併 (去重與挑欄位也在 SQL 完成)
+        df_merged = read_merged_sqlite(table_name, hist_columns, columns, filters, dedup)
+        print(f"   🗃️ SQLite 內合併 (歷史 + 最新) | 🚀 總計: {len(df_merged)} 筆")
+        return df_merged
     
     # --- 2. 讀取最新資料 (熱資料) ---
     if os.path.exists(CURRENT_DB_PATH):
-        conn_curr = sqlite3.connect(CURRENT_DB_PATH)
-        df_curr = pd.read_sql(f"SELECT * FROM {table_name}", conn_curr)
-        conn_curr.close()
+        df_curr = read_current(table_name, read_cols, filters)
     else:
         print(f"⚠️ 找不到最新資料庫 {CURRENT_DB_PATH}，僅使用歷史資料。")
         df_curr = pd.DataFrame()
         
     # --- 3. 兩者合體 ---
-    df_merged = pd.concat([df_hist, df_curr], ignore_index=True)
+    # 篩完沒剩資料的一邊不參與合併，避免空表的 object 欄位把整欄型別拖成 object
+    frames = [df for df in (df_hist, df_curr) if not df.empty] or [df_hist]
+    df_merged = pd.concat(frames, ignore_index=True)
+    # 欄位順序比照 SQLite 引擎：歷史表的欄位在前，只有最新資料庫才有的欄位接在後面
+    all_cols = list(dict.fromkeys(list(df_hist.columns) + list(df_curr.columns)))
+    if list(df_merged.columns) != all_cols:
+        df_merged = df_merged.reindex(columns=all_cols)
     
     # 針對沒有賽季欄位的關聯表，進行去重保護
-    if 'SEASON_YEAR' not in columns and 'season' not in columns:
-        df_merged = df_merged.drop_duplicates()
+    if dedup:
+        df_merged = df_merged.drop_duplicates(ignore_index=True)
+    if columns is not None:
+        df_merged = df_merged[columns]
+    df_merged = align_dtypes(df_merged, table_name, hist_columns)
         
     print(f"   📊 歷史: {len(df_hist)} 筆 | 🆕 最新: {len(df_curr)} 筆 | 🚀 總計: {len(df_merged)} 筆")
     return df_merged
 
+def iter_merged(table_name, by, chunksize=ITER_CHUNK_ROWS, columns=None, order_by=None,
+                seasons=None, date_from=None, date_to=None, season_type=None):
+    """
+    🚰 依 by 排序、分批串流合併後的資料表 (歷史 + 最新)，記憶體只跟 chunksize 有關。
+    同一個 by 值的資料一定落在同一批 (所以一批可能略多於 chunksize 列)，
+    逐球員 / 逐賽季計算滾動特徵時可以直接對每一批各自運算。
+    by / order_by: 欄位名稱或列表；批內先依 by、再依 order_by 排序 (例如 order_by='GAME_DATE')。
+    columns 沒包含的 by / order_by 欄位會自動補上。其餘篩選參數同 get_merged_dataframe。
+    用法:
+        for chunk in iter_merged('player_stats_base', by='PLAYER_ID', order_by='GAME_DATE'):
+            ...
+    """
+    download_historical_db()
+    by = _as_list(by)
+    order_by = by + [c for c in _as_list(order_by or []) if c not in by]
+    if columns is not None:
+        columns = list(columns) + [c for c in order_by if c not in columns]
+
+    hist_columns, filters, dedup = table_plan(table_name, seasons, date_from, date_to, season_type)
+    pending, names = [], []
+    for names, rows in fetch_merged(table_name, hist_columns, columns, filters, dedup, order_by):
+        pending += rows
+        if len(pending) < chunksize:
+            continue
+        # 從最後一列往回找到 by 值改變的地方，最後一組 (可能還沒讀完) 留到下一批
+        key_idx = [names.index(c) for c in by]
+        group_key = lambda row: tuple(row[i] for i in key_idx)
+        cut = len(pending) - 1
+        last = group_key(pending[cut])
+        while cut > 0 and group_key(pending[cut - 1]) == last:
+            cut -= 1
+        if cut == 0:
+            continue   # 單一組就超過 chunksize，繼續累積到這組讀完
+        yield _records_frame(pending[:cut], names)
+        pending = pending[cut:]
+    if pending:
+        yield _records_frame(pending, names)
+
 # ===========================
 # 測試執行區
 # ===========================
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+
+from tqdm import tqdm
+
+# ===========================
+# ⚙️ 自適應限流設定區 (AIMD)
+# ===========================
+START_RATE = 1.0          # 起始速度 (每秒請求數)，約等於過去 0.5~1.5 秒的隨機延遲
+MIN_RATE = 0.1            # 最慢每 10 秒一個請求
+MAX_RATE = 8.0            # 最快每秒 8 個請求
+INCREASE_STEP = 0.1       # 加法增加：每次健康回應提高的速度
+DECREASE_FACTOR = 0.5     # 乘法減少：每次逾時 / 429 / 403 / 5xx 速度砍半
+
+BREAKER_THRESHOLD = 8     # 連續被擋幾次就判定 Proxy 已被封鎖
+BREAKER_COOLDOWN = 60     # 斷路器開啟後冷卻秒數 (每次重新跳脫會加倍)
+BREAKER_MAX_COOLDOWN = 600
+BREAKER_PROBE_TIMEOUT = 60  # 半開時的探測請求這麼久都沒回報結果 (例如回了 404)，就再放一個探測請求
+
+THROTTLE_STATUS = {403, 429}                 # 被擋
+SERVER_ERROR_STATUS = {500, 502, 503, 504}   # 上游撐不住，同樣要降速
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中：上游明顯在封鎖我們，直接放棄請求而不是繼續空等"""
+
+class AdaptiveRateLimiter:
+    """
+    🚦 AIMD 限流器 + 斷路器 (執行緒與 asyncio 皆可共用)：
+    - 回應健康時加法提高速度，逾時、429/403 或 5xx 時乘法降速
+    - 連續被擋達門檻時跳脫斷路器，冷卻期間所有請求立即失敗
+    - 冷卻結束後進入半開狀態：只放行一個探測請求，其餘照樣立即失敗；
+      探測成功就關閉斷路器，探測又被擋就立刻重新開啟 (冷卻時間加倍)
+    """
+
+    def __init__(self, name, start_rate=START_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE):
+        self.name = name
+        self.rate = start_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.next_slot = 0.0
+        self.consecutive_throttles = 0
+        self.open_until = 0.0
+        self.cooldown = BREAKER_COOLDOWN
+        self.tripped = False        # 跳脫後到探測成功之前都是 True (冷卻中或半開)
+        self.probe_started = None   # 半開時放行的探測請求送出時間
+        self.lock = threading.Lock()
+
+    def _reserve(self):
+        """預約下一個可發送的時間點，回傳需要等待的秒數"""
+        with self.lock:
+            now = time.monotonic()
+            if now < self.open_until:
+                raise CircuitOpenError(f"{self.name} 斷路器開啟中，剩 {self.open_until - now:.0f} 秒")
+            if self.tripped:
+                # 半開：同一時間只放一個探測請求出去
+                if self.probe_started is not None and now - self.probe_started < BREAKER_PROBE_TIMEOUT:
+                    raise CircuitOpenError(f"{self.name} 斷路器半開中，等待探測請求的結果")
+                self.probe_started = now
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + 1.0 / self.rate
+            return slot - now
+
+    def acquire(self):
+        """同步版 (給 ThreadPoolExecutor 的 worker 使用)"""
+        time.sleep(self._reserve())
+
+    async def acquire_async(self):
+        """非同步版 (給 NBAStatsClient 使用)"""
+        await asyncio.sleep(self._reserve())
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + INCREASE_STEP)
+            self.consecutive_throttles = 0
+            self.cooldown = BREAKER_COOLDOWN
+            if self.tripped:
+                self.tripped = False
+                self.probe_started = None
+                tqdm.write(f"   ✅ [{self.name}] 探測請求成功，斷路器關閉。")
+
+    def on_throttle(self, reason=''):
+        """逾時、429、403、5xx：乘法降速，必要時跳脫斷路器"""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+            self.consecutive_throttles += 1
+            # 降速後，已預約的下一個時段也要跟著往後延
+            self.next_slot = max(self.next_slot, time.monotonic() + 1.0 / self.rate)
+
+            half_open = self.tripped and time.monotonic() >= self.open_until
+            if half_open or self.consecutive_throttles >= BREAKER_THRESHOLD:
+                self.open_until = time.monotonic() + self.cooldown
+                cause = "探測請求被擋" if half_open else f"連續 {self.consecutive_throttles} 次被擋"
+                tqdm.write(f"   🛑 [{self.name}] {cause} ({reason})，斷路器開啟 {self.cooldown} 秒。")
+                self.cooldown = min(BREAKER_MAX_COOLDOWN, self.cooldown * 2)
+                self.consecutive_throttles = 0
+                self.tripped = True
+                self.probe_started = None
+
+    @property
+    def is_open(self):
+        return time.monotonic() < self.open_until
+
+# 同一個 process 內，同一個上游共用同一個限流器
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+def get_limiter(name='stats.nba.com'):
+    with _LIMITERS_LOCK:
+        if name not in _LIMITERS:
+            _LIMITERS[name] = AdaptiveRateLimiter(name)
+        return _LIMITERS[name]
@@ -0,0 +1,99 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+# ===========================
+# ⚙️ 原始回應快取設定區
+# ===========================
+CACHE_DIR = os.environ.get('NBA_CACHE_DIR', 'data/http_cache')
+
+# NBA_REPLAY=1：離線重播模式，只從快取讀取，完全不連網 (用來重跑 / 跑 benchmark)
+REPLAY_MODE = os.environ.get('NBA_REPLAY', '') == '1'
+
+# 各端點在「當前賽季」的快取有效時數；已結束的賽季資料不會再變，永不過期
+ENDPOINT_TTL_HOURS = {
+    'teamgamelogs': 6,
+    'playergamelogs': 6,
+    'scheduleleaguev2': 12,
+    # 傷兵名單可能晚上架：要比 fetch_inactive_players.EMPTY_TTL_DAYS 短，重新確認時才不會拿到同一份舊回應
+    'boxscoresummaryv2': 24,
+    'boxscoresummaryv3': 24,
+}
+DEFAULT_TTL_HOURS = 6
+
+_lock = threading.Lock()
+_stats = {'hit': 0, 'miss': 0}
+
+def request_key(endpoint, params):
+    """以 endpoint + 排序後的參數做 SHA-256，同樣的請求永遠對應同一個檔案"""
+    clean = {k: v for k, v in params.items() if v is not None}
+    raw = endpoint + '?' + json.dumps(clean, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def cache_path(endpoint, params):
+    key = request_key(endpoint, params)
+    return os.path.join(CACHE_DIR, endpoint, key[:2], f"{key}.json.gz")
+
+def season_of_request(params):
+    """從參數推出賽季：game log 類有 Season，box score 類則從 GameID 第 4~5 碼推算"""
+    season = params.get('Season')
+    if season:
+        return season
+    game_id = str(params.get('GameID') or '')
+    if len(game_id) == 10:
+        start_year = 2000 + int(game_id[3:5])
+        return f"{start_year}-{str(start_year + 1)[-2:]}"
+    return None
+
+def is_finished_season(season):
+    """賽季已經結束 (起始年早於去年) 就視為不會再變動"""
+    if not season:
+        return False
+    start_year = int(season.split('-')[0])
+    return start_year < datetime.datetime.now().year - 1
+
+def get(endpoint, params):
+    """命中且未過期時回傳 JSON dict，否則回傳 None"""
+    path = cache_path(endpoint, params)
+    if not os.path.exists(path):
+        with _lock: _stats['miss'] += 1
+        return None
+
+    if not REPLAY_MODE and not is_finished_season(season_of_request(params)):
+        ttl = ENDPOINT_TTL_HOURS.get(endpoint, DEFAULT_TTL_HOURS)
+        age = datetime.datetime.now().timestamp() - os.path.getmtime(path)
+        if age > ttl * 3600:
+            with _lock: _stats['miss'] += 1
+            return None
+
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        # 寫到一半被中斷的壞檔，當作沒命中
+        with _lock: _stats['miss'] += 1
+        return None
+
+    with _lock: _stats['hit'] += 1
+    return entry['data']
+
+def put(endpoint, params, data):
+    """壓縮寫入快取 (先寫暫存檔再 rename，避免崩潰時留下半個檔案)"""
+    path = cache_path(endpoint, params)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {
+        'endpoint': endpoint,
+        'params': {k: v for k, v in params.items() if v is not None},
+        'fetched_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'data': data,
+    }
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def summary():
+    return f"快取命中 {_stats['hit']} 次 / 未命中 {_stats['miss']} 次"
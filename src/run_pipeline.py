@@ -3,6 +3,11 @@ import time
 import sys
 import os
 
+# run_pipeline 從專案根目錄執行，讓它也能讀取 src/ 裡的進度公告
+sys.path.insert(0, os.path.abspath("src"))
+from nba_db import get_connection, close_connection
+from fetch_scheduler import wait_for_critical, read_progress
+
 # 定義每日更新的標準執行順序
 PIPELINE_SCRIPTS = [
     ("獲取球隊基礎數據", "src/fetch_data.py"),
@@ -16,15 +21,36 @@ PIPELINE_SCRIPTS = [
     ("重新訓練並部署模型", "src/train_deploy.py")
 ]
 
+# 在背景執行的階段：script -> 進度公告的 stage 名稱 (關鍵比賽入庫後下游就能先開工)
+# ⚠️ 背景階段會跟前景的 fetch_odds 同時寫 nba_current.db，這是刻意的：
+#    共用連線是 WAL + busy_timeout 30 秒，所有寫入都是「一批一個 BEGIN IMMEDIATE 交易」的短交易，
+#    拿不到寫入鎖的一方只會排隊等，不會失敗 (tests/test_concurrent_writers.py 驗證這個假設)。
+#    新增背景階段時，寫入也必須走 nba_db 的 transaction() / WriteBehindBuffer，不能開長交易。
+BACKGROUND_STAGES = {
+    "src/fetch_inactive_players.py": "inactive_players",
+}
+# 開始前要等哪些背景階段公告「關鍵比賽已入庫」
+WAIT_FOR_CRITICAL = {
+    "src/generate_injury.py": ["inactive_players"],
+}
+# 需要完整資料的階段：開始前必須等所有背景階段結束
+JOIN_BEFORE = "src/nba_daily_backtest.py"
+# 若背景階段在它跑完之後又補進了資料，就重跑一次
+RERUN_AFTER_JOIN = ("生成進階傷病特徵", "src/generate_injury.py")
+
+def script_env():
+    # 🔥 關鍵修復：將 src 加入 PYTHONPATH 環境變數
+    # 這樣在 src/ 裡面的檔案才能互相 import
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.path.abspath("src") + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
 def run_script(description, script_path):
     print(f"\n{'='*60}")
     print(f"▶️ 開始執行: {description} ({script_path})")
     print(f"{'='*60}")
     
-    # 🔥 關鍵修復：將 src 加入 PYTHONPATH 環境變數
-    # 這樣在 src/ 裡面的檔案才能互相 import
-    env = os.environ.copy()
-    env["PYTHONPATH"] = os.path.abspath("src") + os.pathsep + env.get("PYTHONPATH", "")
+    env = script_env()
 
     try:
         # 傳入 env=env
@@ -38,14 +64,74 @@ def run_script(description, script_path):
         print(f"\n❌ 找不到檔案: {script_path}")
         return False
 
+def start_background(description, script_path):
+    print(f"\n{'='*60}")
+    print(f"▶️ 背景執行: {description} ({script_path})")
+    print(f"{'='*60}")
+    return subprocess.Popen([sys.executable, script_path], env=script_env())
+
+def join_background(background):
+    """等所有背景階段結束；回傳是否全部成功"""
+    ok = True
+    for stage, (description, proc, _) in background.items():
+        if proc.wait() != 0:
+            print(f"\n❌ [{description}] 執行失敗！錯誤碼: {proc.returncode}")
+            ok = False
+        else:
+            print(f"\n✅ [{description}] 執行成功！")
+    return ok
+
 def main():
     print("🌟 NBA 每日 AI 預測系統 - 全自動更新管線啟動 🌟")
+    conn = get_connection()
+    try:
+        run_pipeline(conn)
+    finally:
+        # 所有背景階段都已結束 (失敗時也會先 join)，這時才把 WAL 寫回主檔並關閉
+        close_connection()
+
+def run_pipeline(conn):
+    background = {}        # stage -> (description, Popen, 啟動時間)
+    done_when_ran = {}     # script -> 它開始時各背景階段已處理的場數
+
     for desc, script in PIPELINE_SCRIPTS:
+        if script in BACKGROUND_STAGES:
+            background[BACKGROUND_STAGES[script]] = (desc, start_background(desc, script), time.time())
+            continue
+
+        for stage in WAIT_FOR_CRITICAL.get(script, []):
+            if stage not in background: continue
+            _, proc, started = background[stage]
+            print(f"\n⏳ 等待 [{stage}] 的今日關鍵比賽入庫...")
+            wait_for_critical(conn, stage, since=started, is_alive=lambda: proc.poll() is None)
+            progress = read_progress(conn, stage)
+            done_when_ran[script] = {stage: progress['done'] if progress else 0}
+
+        if script == JOIN_BEFORE and background:
+            if not join_background(background):
+                print("\n⚠️ 管線已中斷。")
+                sys.exit(1)
+            rerun_desc, rerun_script = RERUN_AFTER_JOIN
+            for stage, done in done_when_ran.get(rerun_script, {}).items():
+                progress = read_progress(conn, stage)
+                if progress and progress['done'] > done:
+                    print(f"\n🔁 [{stage}] 在特徵生成後又補進 {progress['done'] - done} 場，重新生成一次。")
+                    if not run_script(rerun_desc, rerun_script):
+                        print("\n⚠️ 管線已中斷。")
+                        sys.exit(1)
+                    break
+            background = {}
+
         success = run_script(desc, script)
         if not success:
             print("\n⚠️ 管線已中斷。")
+            join_background(background)
             sys.exit(1)
         time.sleep(2)
+
+    if background and not join_background(background):
+        print("\n⚠️ 管線已中斷。")
+        sys.exit(1)
     print(f"\n🎉 恭喜！所有更新任務皆已順利完成！")
 
 if __name__ == "__main__":
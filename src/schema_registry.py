@@ -0,0 +1,123 @@
+# ===========================
+# 🗂️ 資料表型別登記處
+# ===========================
+# 所有爬蟲寫入的資料表都在這裡宣告欄位型別 (INTEGER / REAL / TEXT)，
+# 不再讓 ALTER TABLE ... TEXT 或 pandas 自動推斷決定型別。
+
+# --- game log 類寬表 (欄位會隨 MeasureType 變動，用規則決定型別) ---
+# 表名 -> 唯一鍵
+GAME_LOG_TABLES = {
+    'boxscore_base': ['GAME_ID', 'TEAM_ID'],
+    'boxscore_advanced': ['GAME_ID', 'TEAM_ID'],
+    'boxscore_four_factors': ['GAME_ID', 'TEAM_ID'],
+    'boxscore_misc': ['GAME_ID', 'TEAM_ID'],
+    'boxscore_scoring': ['GAME_ID', 'TEAM_ID'],
+    'boxscore_opponent': ['GAME_ID', 'TEAM_ID'],
+    'player_stats_base': ['GAME_ID', 'PLAYER_ID'],
+    'player_stats_advanced': ['GAME_ID', 'PLAYER_ID'],
+    'player_stats_misc': ['GAME_ID', 'PLAYER_ID'],
+    'player_stats_scoring': ['GAME_ID', 'PLAYER_ID'],
+    'player_stats_usage': ['GAME_ID', 'PLAYER_ID'],
+}
+
+# 文字欄位 (GAME_ID 有前導 0，一定要存成 TEXT)
+TEXT_COLUMNS = {
+    'SEASON_YEAR', 'SEASON_TYPE', 'MEASURE_TYPE',
+    'GAME_ID', 'GAME_DATE', 'MATCHUP', 'WL',
+    'TEAM_ABBREVIATION', 'TEAM_NAME', 'TEAM_CITY',
+    'PLAYER_NAME', 'NICKNAME',
+}
+
+# 整數欄位：ID 與逐場計數型數據 (其餘數值欄位一律 REAL)
+INTEGER_COLUMNS = {
+    'TEAM_ID', 'PLAYER_ID',
+    'FGM', 'FGA', 'FG3M', 'FG3A', 'FTM', 'FTA',
+    'OREB', 'DREB', 'REB', 'AST', 'TOV', 'STL', 'BLK', 'BLKA', 'PF', 'PFD', 'PTS',
+    'DD2', 'TD3',
+}
+
+# --- 固定結構的資料表 ---
+FIXED_SCHEMAS = {
+    'games': {
+        'columns': [
+            ('game_id', 'TEXT'), ('date', 'TEXT'), ('season', 'TEXT'), ('game_type', 'TEXT'),
+            ('home_team', 'TEXT'), ('away_team', 'TEXT'),
+            ('home_score', 'INTEGER'), ('away_score', 'INTEGER'),
+            ('tw_spread_score', 'REAL'), ('tw_total_score', 'REAL'),
+            ('tw_moneyline_home', 'REAL'), ('tw_moneyline_away', 'REAL'),
+            ('tw_spread_home_odds', 'REAL'), ('tw_spread_away_odds', 'REAL'),
+            ('tw_total_over_odds', 'REAL'), ('tw_total_under_odds', 'REAL'),
+        ],
+        'key': ['game_id'],
+    },
+    'inactive_players': {
+        'columns': [
+            ('GAME_ID', 'TEXT'), ('TEAM_ID', 'INTEGER'), ('PLAYER_ID', 'INTEGER'),
+            ('PLAYER_NAME', 'TEXT'), ('JERSEY_NUM', 'TEXT'),
+        ],
+        'key': ['GAME_ID', 'PLAYER_ID'],
+    },
+    'empty_inactive_games': {
+        'columns': [('game_id', 'TEXT'), ('checked_at', 'TEXT')],
+        'key': ['game_id'],
+    },
+    'league_calendar': {
+        'columns': [
+            ('game_id', 'TEXT'), ('game_date', 'TEXT'), ('season', 'TEXT'),
+            ('season_type', 'TEXT'), ('fetched_at', 'TEXT'),
+        ],
+        'key': ['game_id'],
+    },
+    'fetch_ledger': {
+        'columns': [
+            ('table_name', 'TEXT'), ('season', 'TEXT'), ('season_type', 'TEXT'),
+            ('game_date', 'TEXT'), ('status', 'TEXT'), ('row_count', 'INTEGER'), ('fetched_at', 'TEXT'),
+        ],
+        'key': ['table_name', 'season', 'season_type', 'game_date'],
+    },
+    'odds_page_ledger': {
+        'columns': [('gametime', 'TEXT'), ('fetched_at', 'TEXT')],
+        'key': ['gametime'],
+    },
+    'fetch_progress': {
+        'columns': [
+            ('stage', 'TEXT'), ('started_at', 'REAL'), ('total', 'INTEGER'), ('done', 'INTEGER'),
+            ('critical_total', 'INTEGER'), ('critical_done', 'INTEGER'), ('finished', 'INTEGER'), ('updated_at', 'REAL'),
+        ],
+        'key': ['stage'],
+    },
+}
+
+def is_registered(table_name):
+    return table_name in GAME_LOG_TABLES or table_name in FIXED_SCHEMAS
+
+def key_columns(table_name):
+    if table_name in GAME_LOG_TABLES:
+        return GAME_LOG_TABLES[table_name]
+    return FIXED_SCHEMAS[table_name]['key']
+
+def column_type(table_name, col):
+    """回傳欄位的 SQLite 型別；固定結構表查表，寬表依欄位名稱規則判斷"""
+    if table_name in FIXED_SCHEMAS:
+        for name, col_type in FIXED_SCHEMAS[table_name]['columns']:
+            if name.lower() == col.lower():
+                return col_type
+        return 'TEXT'
+
+    name = col.upper()
+    if name in TEXT_COLUMNS:
+        return 'TEXT'
+    if name in INTEGER_COLUMNS or name.endswith('_RANK'):
+        return 'INTEGER'
+    return 'REAL'
+
+def has_primary_key(table_name):
+    """固定結構表用 PRIMARY KEY 去重；寬表則另外建唯一索引"""
+    return table_name in FIXED_SCHEMAS
+
+def create_table_sql(table_name, columns, name=None):
+    """依登記的型別產生 CREATE TABLE 語法 (columns 為欄位名稱列表，name 可指定實際建立的表名)"""
+    col_defs = [f"{col} {column_type(table_name, col)}" for col in columns]
+    if has_primary_key(table_name):
+        col_defs.append(f"PRIMARY KEY ({', '.join(key_columns(table_name))})")
+    return f"CREATE TABLE IF NOT EXISTS {name or table_name} ({', '.join(col_defs)})"
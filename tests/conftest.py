@@ -0,0 +1,6 @@
+import os
+import sys
+
+# 跟 run_pipeline 一樣，src/ 裡的模組用扁平的 import 互相引用
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
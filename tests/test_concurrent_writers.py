@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+from conftest import SRC_DIR
+
+# 背景的傷兵爬蟲 (WriteBehindBuffer + 進度公告) 與前景的運彩爬蟲 (transaction 批次 UPDATE)
+# 同時寫同一個 WAL 資料庫：雙方都只會排隊等鎖，不會出現 "database is locked"。
+BATCHES = 40
+
+INACTIVE_WRITER = f'''
+import pandas as pd
+from nba_db import get_connection, close_connection, WriteBehindBuffer
+from fetch_scheduler import ProgressPublisher
+conn = get_connection('db.sqlite')
+progress = ProgressPublisher(conn, 'inactive_players', {BATCHES}, 0)
+with WriteBehindBuffer(conn, flush_rows=10**9) as writer:
+    for i in range({BATCHES}):
+        writer.add_frame('inactive_players', pd.DataFrame({{
+            'GAME_ID': [f'00225{{i:05d}}'] * 50, 'TEAM_ID': [1] * 50,
+            'PLAYER_ID': list(range(50)), 'PLAYER_NAME': ['x'] * 50, 'JERSEY_NUM': ['0'] * 50}}))
+        writer.add_row("INSERT OR REPLACE INTO empty_inactive_games (game_id, checked_at) VALUES (?, ?)", (str(i), 'now'))
+        assert writer.flush()
+        progress.mark_done()
+        progress.publish()
+close_connection('db.sqlite')
+'''
+
+ODDS_WRITER = f'''
+from nba_db import get_connection, close_connection, transaction
+conn = get_connection('db.sqlite')
+for i in range({BATCHES}):
+    with transaction(conn):
+        conn.executemany("UPDATE games SET odds = odds + 1 WHERE game_id = ?", [(g,) for g in range(200)])
+close_connection('db.sqlite')
+'''
+
+def test_background_and_foreground_writers_do_not_fail(tmp_path):
+    db_path = tmp_path / 'db.sqlite'
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE games (game_id INTEGER PRIMARY KEY, odds INTEGER)")
+    conn.executemany("INSERT INTO games VALUES (?, 0)", [(g,) for g in range(200)])
+    conn.execute('''
+        CREATE TABLE inactive_players (
+            GAME_ID TEXT, TEAM_ID INTEGER, PLAYER_ID INTEGER, PLAYER_NAME TEXT, JERSEY_NUM TEXT,
+            PRIMARY KEY (GAME_ID, PLAYER_ID))
+    ''')
+    conn.execute("CREATE TABLE empty_inactive_games (game_id TEXT PRIMARY KEY, checked_at TEXT)")
+    conn.commit()
+    conn.close()
+
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    procs = [subprocess.Popen([sys.executable, '-c', script], cwd=tmp_path, env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+             for script in (INACTIVE_WRITER, ODDS_WRITER)]
+    outputs = [p.communicate(timeout=120)[0] for p in procs]
+    for p, out in zip(procs, outputs):
+        assert p.returncode == 0, out
+        assert 'locked' not in out, out
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM inactive_players").fetchone()[0] == BATCHES * 50
+    assert conn.execute("SELECT COUNT(*) FROM empty_inactive_games").fetchone()[0] == BATCHES
+    assert conn.execute("SELECT MIN(odds), MAX(odds) FROM games").fetchone() == (BATCHES, BATCHES)
+    assert conn.execute("SELECT done FROM fetch_progress WHERE stage = 'inactive_players'").fetchone()[0] == BATCHES
+    conn.close()
@@ -0,0 +1,189 @@
+import json
+import os
+import re
+import threading
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import db_sync
+
+CHUNK = 1024
+DB_NAME = '/nba_raw.db'
+
+def make_db(n_chunks, seed=0):
+    """每個區塊內容都不同的假資料庫 (最後一個區塊不滿，測邊界)"""
+    return b''.join(bytes([(seed + i) % 251]) * CHUNK for i in range(n_chunks)) + b'tail'
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """支援 Range 的靜態檔案伺服器，可模擬 5xx 與傳到一半斷線"""
+
+    def do_GET(self):
+        srv = self.server
+        rng = self.headers.get('Range')
+        srv.requests.append((self.path, rng))
+        if srv.failures.get(self.path):
+            srv.failures[self.path] -= 1
+            self.send_error(503)
+            return
+        body = srv.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+
+        status, start, end = 200, 0, len(body) - 1
+        if rng and srv.ranges:
+            m = re.fullmatch(r'bytes=(\d+)-(\d*)', rng)
+            start = int(m[1])
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(body)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            end = min(int(m[2]), len(body) - 1) if m[2] else len(body) - 1
+            status = 206
+        data = body[start:end + 1]
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+        self.end_headers()
+        cut = srv.cuts.pop(self.path, None)
+        self.wfile.write(data if cut is None else data[:cut])   # 有設定 cut 就只送一部分後斷線
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(db_sync.time, 'sleep', lambda s: None)
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    srv.files, srv.requests, srv.failures, srv.cuts, srv.ranges = {}, [], {}, {}, True
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    srv.url = f"http://127.0.0.1:{srv.server_address[1]}{DB_NAME}"
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+def publish(srv, tmp_path, content, manifest=True):
+    srv.files[DB_NAME] = content
+    if manifest:
+        src = tmp_path / 'release.db'
+        src.write_bytes(content)
+        srv.files[DB_NAME + db_sync.MANIFEST_SUFFIX] = json.dumps(db_sync.build_manifest(str(src), CHUNK)).encode()
+
+def data_requests(srv):
+    return [rng for path, rng in srv.requests if path == DB_NAME]
+
+def test_delta_downloads_only_changed_chunks(server, tmp_path):
+    old = make_db(10)
+    new = bytearray(old)
+    new[3 * CHUNK:4 * CHUNK] = b'x' * CHUNK
+    new[7 * CHUNK:8 * CHUNK] = b'y' * CHUNK
+    publish(server, tmp_path, bytes(new))
+    dest = tmp_path / 'nba.db'
+    dest.write_bytes(old)
+
+    downloaded = db_sync.sync_file(server.url, str(dest))
+
+    assert dest.read_bytes() == bytes(new)
+    assert downloaded == 2 * CHUNK
+    assert data_requests(server) == [f'bytes={3 * CHUNK}-{4 * CHUNK - 1}', f'bytes={7 * CHUNK}-{8 * CHUNK - 1}']
+    assert not os.path.exists(str(dest) + db_sync.PART_SUFFIX)
+
+def test_chunk_download_resumes_after_dropped_connection(server, tmp_path):
+    content = make_db(8)
+    publish(server, tmp_path, content)
+    server.cuts[DB_NAME] = int(2.5 * CHUNK)   # 第一個請求只送到第 3 個區塊中間
+    dest = tmp_path / 'nba.db'
+
+    db_sync.sync_file(server.url, str(dest))
+
+    assert dest.read_bytes() == content
+    # 重試只從還沒驗證完的第 2 個區塊接著抓
+    assert data_requests(server) == [f'bytes=0-{len(content) - 1}', f'bytes={2 * CHUNK}-{len(content) - 1}']
+
+def test_chunk_download_reuses_part_from_previous_run(server, tmp_path):
+    content = make_db(6)
+    publish(server, tmp_path, content)
+    dest = tmp_path / 'nba.db'
+    # 上次中斷：.part 已撐到完整大小，只有前 4 個區塊填好
+    (tmp_path / ('nba.db' + db_sync.PART_SUFFIX)).write_bytes(content[:4 * CHUNK] + b'\0' * (len(content) - 4 * CHUNK))
+
+    db_sync.sync_file(server.url, str(dest))
+
+    assert dest.read_bytes() == content
+    assert data_requests(server) == [f'bytes={4 * CHUNK}-{len(content) - 1}']
+
+def test_stream_download_resumes_after_dropped_connection(server, tmp_path):
+    content = make_db(5)
+    publish(server, tmp_path, content, manifest=False)
+    server.cuts[DB_NAME] = 1500
+    dest = tmp_path / 'nba.db'
+
+    downloaded = db_sync.sync_file(server.url, str(dest))
+
+    assert dest.read_bytes() == content
+    assert downloaded == len(content)
+    assert data_requests(server) == [None, 'bytes=1500-']
+
+def test_full_size_part_is_not_installed_when_manifest_missing(server, tmp_path):
+    # 逐區塊下載中斷後留下撐到完整大小、內容全零的 .part，而伺服器上的新版本沒有校驗清單：
+    # 完整下載不能把這個 .part 當成已下載完畢直接換上去
+    content = make_db(4)
+    publish(server, tmp_path, content, manifest=False)
+    dest = tmp_path / 'nba.db'
+    part = tmp_path / ('nba.db' + db_sync.PART_SUFFIX)
+    part.write_bytes(b'\0' * len(content))
+
+    db_sync.sync_file(server.url, str(dest))
+
+    assert dest.read_bytes() == content
+    assert not part.exists()
+
+def test_oversized_stream_part_is_discarded_on_416(server, tmp_path):
+    content = make_db(3)
+    publish(server, tmp_path, content, manifest=False)
+    dest = tmp_path / 'nba.db'
+    (tmp_path / ('nba.db' + db_sync.STREAM_PART_SUFFIX)).write_bytes(b'\0' * (len(content) + 10))
+
+    db_sync.sync_file(server.url, str(dest))
+
+    assert dest.read_bytes() == content
+    assert data_requests(server) == [f'bytes={len(content) + 10}-', None]
+
+def test_complete_stream_part_is_installed_on_matching_416(server, tmp_path):
+    content = make_db(3)
+    publish(server, tmp_path, content, manifest=False)
+    dest = tmp_path / 'nba.db'
+    (tmp_path / ('nba.db' + db_sync.STREAM_PART_SUFFIX)).write_bytes(content)
+
+    assert db_sync.sync_file(server.url, str(dest)) == 0
+    assert dest.read_bytes() == content
+
+def test_manifest_fetch_is_retried_instead_of_falling_back(server, tmp_path):
+    old = make_db(6)
+    new = bytearray(old)
+    new[:CHUNK] = b'z' * CHUNK
+    publish(server, tmp_path, bytes(new))
+    server.failures[DB_NAME + db_sync.MANIFEST_SUFFIX] = 2
+    dest = tmp_path / 'nba.db'
+    dest.write_bytes(old)
+
+    assert db_sync.sync_file(server.url, str(dest)) == CHUNK
+    assert dest.read_bytes() == bytes(new)
+
+def test_manifest_unreachable_raises(server, tmp_path):
+    publish(server, tmp_path, make_db(2))
+    server.failures[DB_NAME + db_sync.MANIFEST_SUFFIX] = db_sync.RETRIES
+    dest = tmp_path / 'nba.db'
+    dest.write_bytes(b'old')
+
+    with pytest.raises(urllib.error.HTTPError) as excinfo:
+        db_sync.sync_file(server.url, str(dest))
+    assert excinfo.value.code == 503
+    assert dest.read_bytes() == b'old'
+    assert data_requests(server) == []
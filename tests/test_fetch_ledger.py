@@ -0,0 +1,79 @@
+import datetime
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import fetch_ledger
+from fetch_ledger import (EMPTY_RECHECK_DAYS, PARTIAL_RECHECK_DAYS, init_ledger, pending_dates,
+                          record_fetch, seed_ledger)
+
+TABLE, SEASON, TYPE = 'player_stats_base', '2025-26', 'Regular Season'
+TODAY = datetime.date.today()
+
+def days_ago(n):
+    return TODAY - datetime.timedelta(days=n)
+
+def player_rows(day, game_ids, players=3):
+    """每場比賽 players 列 (逐球員的 game log)，帳本要記的是場次而不是列數"""
+    return [{'GAME_ID': gid, 'GAME_DATE': f"{day}T00:00:00", 'PLAYER_ID': p}
+            for gid in game_ids for p in range(players)]
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    init_ledger(conn)
+    yield conn
+    conn.close()
+
+def pending(conn, dates, expected_games=None):
+    return pending_dates(conn, TABLE, SEASON, TYPE, dates, expected_games)
+
+def test_empty_day_is_rechecked_only_inside_window(conn):
+    recent, old = days_ago(EMPTY_RECHECK_DAYS - 1), days_ago(EMPTY_RECHECK_DAYS + 1)
+    record_fetch(conn, TABLE, SEASON, TYPE, {recent, old}, pd.DataFrame(), [])
+    assert pending(conn, {recent, old}) == {recent}
+    assert pending(conn, {recent, old}, expected_games={}) == {recent}
+
+def test_ok_day_without_calendar_is_rechecked_inside_empty_window(conn):
+    recent, old = days_ago(1), days_ago(EMPTY_RECHECK_DAYS + 1)
+    df = pd.DataFrame(player_rows(recent, ['g1']) + player_rows(old, ['g2']))
+    record_fetch(conn, TABLE, SEASON, TYPE, {recent, old}, df, [])
+    assert pending(conn, {recent, old}) == {recent}
+
+def test_partial_day_is_rechecked_against_expected_games(conn):
+    partial, stale = days_ago(EMPTY_RECHECK_DAYS + 1), days_ago(PARTIAL_RECHECK_DAYS + 1)
+    df = pd.DataFrame(player_rows(partial, ['g1']) + player_rows(stale, ['g2']))
+    record_fetch(conn, TABLE, SEASON, TYPE, {partial, stale}, df, [])
+    dates = {partial, stale}
+    # 賽程表說兩天各有 2 場，只抓到 1 場：視窗內的重抓，超過 PARTIAL_RECHECK_DAYS 的不再重抓
+    assert pending(conn, dates, expected_games={partial: 2, stale: 2}) == {partial}
+    # 場次齊了就算完成 (逐球員多列不會被當成多場)
+    assert pending(conn, dates, expected_games={partial: 1, stale: 1}) == set()
+
+def test_failed_range_is_always_pending(conn):
+    old = days_ago(PARTIAL_RECHECK_DAYS + 30)
+    df = pd.DataFrame(player_rows(old, ['g1']))
+    assert record_fetch(conn, TABLE, SEASON, TYPE, {old}, df, [(old, old)]) == 1
+    assert pending(conn, {old}, expected_games={old: 1}) == {old}
+
+def test_seed_ledger_from_existing_table(conn):
+    day, other_type_day = days_ago(PARTIAL_RECHECK_DAYS + 2), days_ago(PARTIAL_RECHECK_DAYS + 3)
+    df = pd.DataFrame(player_rows(day, ['g1', 'g2']) + player_rows(other_type_day, ['p1']))
+    df['SEASON_YEAR'] = SEASON
+    df['SEASON_TYPE'] = [TYPE] * 6 + ['Playoffs'] * 3
+    df.to_sql(TABLE, conn, index=False)
+
+    seed_ledger(conn, TABLE, SEASON, TYPE)
+    rows = conn.execute(f"SELECT game_date, status, row_count FROM {fetch_ledger.LEDGER_TABLE}").fetchall()
+    assert rows == [(day.isoformat(), 'ok', 2)]
+    assert pending(conn, {day, other_type_day}, expected_games={day: 2, other_type_day: 1}) == {other_type_day}
+
+    # 已經有帳本紀錄就不再補登 (不會蓋掉之後記下的 'failed')
+    record_fetch(conn, TABLE, SEASON, TYPE, {day}, pd.DataFrame(), [(day, day)])
+    seed_ledger(conn, TABLE, SEASON, TYPE)
+    assert conn.execute(f"SELECT status FROM {fetch_ledger.LEDGER_TABLE}").fetchall() == [('failed',)]
+
+def test_seed_ledger_without_table_is_noop(conn):
+    seed_ledger(conn, 'missing_table', SEASON, TYPE)
+    assert conn.execute(f"SELECT COUNT(*) FROM {fetch_ledger.LEDGER_TABLE}").fetchone()[0] == 0
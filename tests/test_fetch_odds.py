@@ -0,0 +1,25 @@
+import pytest
+
+import fetch_odds
+
+def game_rows(gid, away, home):
+    info = (f'<td class="td-teaminfo" rowspan="2"><a href="/team?teamid=1">{away}</a>'
+            f'<a href="/other">x</a><a href="/team?teamid=2"> {home} </a></td>')
+    return (f'<tr gameid="{gid}">{info}<td class="td-bank-bet01">-3.5<br>1.75</td>'
+            f'<td class="td-bank-bet02">大 220.5<br>1.75</td><td class="td-bank-bet03">1.45</td></tr>'
+            f'<tr gameid="{gid}"><td class="td-bank-bet01">1.85</td>'
+            f'<td class="td-bank-bet02">小<br>1.80</td><td class="td-bank-bet03">2.60</td></tr>')
+
+# 沒有 <meta charset> 的賽果頁，跟爬蟲下載 / 封存的一樣是 UTF-8 bytes
+PAGE = ('<html><head><title>賽果</title></head><body><table>'
+        + game_rows('1', '湖人', '勇士') + '</table></body></html>').encode('utf-8')
+
+@pytest.mark.parametrize('extract', [
+    pytest.param(fetch_odds.extract_games_lxml, marks=pytest.mark.skipif(not fetch_odds.HAS_LXML, reason='lxml 未安裝')),
+    fetch_odds.extract_games_bs4,
+])
+def test_page_without_charset_keeps_chinese_team_names(extract):
+    games = extract(PAGE)
+    assert [(away, home) for away, home, _ in games] == [('湖人', '勇士')]
+    assert games[0][2]['spread'] == ('-3.5,1.75', '1.85')
+    assert all(team in fetch_odds.TEAM_MAPPING for team in games[0][:2])
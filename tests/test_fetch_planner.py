@@ -0,0 +1,76 @@
+import asyncio
+import datetime
+
+import pytest
+
+import nba_http
+from fetch_planner import fetch_ranges, plan_date_ranges, MAX_RANGE_DAYS
+
+D = datetime.date
+
+class FakeClient:
+    """依日期區間回應的假 NBAStatsClient：bad_days 裡的日期一律失敗，失敗原因由 failure 決定"""
+
+    def __init__(self, failure, bad_days=()):
+        self.failure = failure
+        self.bad_days = set(bad_days)
+        self.requests = []
+
+    async def fetch_json(self, endpoint, params, label='', priority=None, use_cache=True):
+        d_from, d_to = params['DateFrom'], params['DateTo']
+        self.requests.append((d_from, d_to))
+        start = datetime.datetime.strptime(d_from, '%m/%d/%Y').date()
+        end = datetime.datetime.strptime(d_to, '%m/%d/%Y').date()
+        days = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+        if self.bad_days & set(days):
+            return None, self.failure
+        rows = [[str(d)] for d in days]
+        return {'resultSets': [{'headers': ['GAME_DATE'], 'rowSet': rows}]}, None
+
+def days(start, end):
+    return [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+
+def test_plan_without_calendar_cuts_every_max_days():
+    ranges = plan_date_ranges(datetime.datetime(2025, 1, 1), datetime.datetime(2025, 3, 5))
+    assert ranges == [(D(2025, 1, 1), D(2025, 1, 31)), (D(2025, 2, 1), D(2025, 3, 3)), (D(2025, 3, 4), D(2025, 3, 5))]
+    assert all((end - start).days + 1 <= MAX_RANGE_DAYS for start, end in ranges)
+
+def test_plan_merges_across_non_game_days():
+    game_dates = {D(2025, 1, 1), D(2025, 1, 3), D(2025, 1, 10), D(2024, 12, 31), D(2025, 2, 1)}
+    assert plan_date_ranges(D(2025, 1, 1), D(2025, 1, 31), game_dates) == [(D(2025, 1, 1), D(2025, 1, 10))]
+
+def test_plan_does_not_span_skipped_dates():
+    game_dates = {D(2025, 1, 1), D(2025, 1, 3), D(2025, 1, 10)}
+    # 1/5 已經抓好 (雖然不在待抓清單裡)，區間不能跨過它
+    ranges = plan_date_ranges(D(2025, 1, 1), D(2025, 1, 31), game_dates, skip_dates={D(2025, 1, 5)})
+    assert ranges == [(D(2025, 1, 1), D(2025, 1, 3)), (D(2025, 1, 10), D(2025, 1, 10))]
+
+def test_plan_caps_ranges_at_max_days():
+    game_dates = set(days(D(2025, 1, 1), D(2025, 2, 5)))
+    assert plan_date_ranges(D(2025, 1, 1), D(2025, 2, 5), game_dates) == [(D(2025, 1, 1), D(2025, 1, 31)), (D(2025, 2, 1), D(2025, 2, 5))]
+    assert plan_date_ranges(D(2025, 1, 1), D(2025, 1, 10), game_dates, max_days=4) == [
+        (D(2025, 1, 1), D(2025, 1, 4)), (D(2025, 1, 5), D(2025, 1, 8)), (D(2025, 1, 9), D(2025, 1, 10))]
+
+def test_plan_with_no_game_dates_requests_nothing():
+    assert plan_date_ranges(D(2025, 1, 1), D(2025, 1, 31), set()) == []
+
+def build(d_from=None, d_to=None):
+    return 'leaguegamelog', {'DateFrom': d_from, 'DateTo': d_to}, f"{d_from}~{d_to}"
+
+def run(client, ranges):
+    return asyncio.run(fetch_ranges(client, build, ranges))
+
+@pytest.mark.parametrize('failure', [nba_http.FAIL_RETRY_EXHAUSTED, nba_http.FAIL_BAD_JSON])
+def test_retryable_failure_is_split_down_to_the_bad_day(failure):
+    client = FakeClient(failure, bad_days=[D(2025, 1, 3)])
+    df, failed = run(client, [(D(2025, 1, 1), D(2025, 1, 4))])
+    assert failed == [(D(2025, 1, 3), D(2025, 1, 3))]
+    assert sorted(df['GAME_DATE']) == ['2025-01-01', '2025-01-02', '2025-01-04']
+
+@pytest.mark.parametrize('failure', [nba_http.FAIL_REJECTED, nba_http.FAIL_CIRCUIT_OPEN, nba_http.FAIL_REPLAY_MISS])
+def test_non_retryable_failure_is_not_split(failure):
+    client = FakeClient(failure, bad_days=[D(2025, 1, 3)])
+    df, failed = run(client, [(D(2025, 1, 1), D(2025, 1, 31))])
+    assert df.empty
+    assert failed == [(D(2025, 1, 1), D(2025, 1, 31))]
+    assert len(client.requests) == 1
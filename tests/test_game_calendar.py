@@ -0,0 +1,27 @@
+import datetime
+import sqlite3
+
+import pytest
+
+import game_calendar
+
+@pytest.fixture
+def conn():
+    game_calendar._DATES_CACHE.clear()
+    conn = sqlite3.connect(':memory:')
+    game_calendar.init_calendar_table(conn)
+    conn.execute(f"INSERT INTO {game_calendar.CALENDAR_TABLE} VALUES ('0022500001', '2025-10-21', '2025-26', 'Regular Season', '2025-10-20T00:00:00')")
+    conn.execute("CREATE TABLE games (game_id TEXT, date TEXT, season TEXT, game_type TEXT)")
+    yield conn
+    conn.close()
+    game_calendar._DATES_CACHE.clear()
+
+def test_game_dates_follow_new_games_rows(conn):
+    assert game_calendar.get_game_dates(conn, '2025-26', 'Regular Season') == {datetime.date(2025, 10, 21)}
+    # pipeline 執行中 fetch_data 寫入新比賽，同一個行程再問一次要看得到
+    conn.execute("INSERT INTO games VALUES ('0022500002', '2025-10-22', '2025-26', 'Regular Season')")
+    assert game_calendar.get_game_dates(conn, '2025-26', 'Regular Season') == {datetime.date(2025, 10, 21), datetime.date(2025, 10, 22)}
+
+def test_unknown_calendar_returns_none(conn):
+    conn.execute("INSERT INTO games VALUES ('0022400002', '2024-10-22', '2024-25', 'Regular Season')")
+    assert game_calendar.get_game_dates(conn, '2024-25', 'Regular Season') is None
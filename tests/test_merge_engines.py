@@ -0,0 +1,101 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import nba_db
+import parquet_mirror
+import prepare_data
+
+# 歷史資料庫：寫入順序刻意打亂賽季，INT_COL 有 NULL，2025-26 要被排除
+HIST_ROWS = [
+    ('2016-17', 'A', 1, 1.5, '2017-01-02'),
+    ('2014-15', 'B', None, 2.5, '2015-01-03'),
+    ('2025-26', 'C', 3, 3.5, '2025-11-01'),
+    ('2015-16', 'D', 4, None, '2016-01-04'),
+    ('2014-15', 'E', 5, 5.5, '2015-02-05'),
+]
+CURR_ROWS = [
+    ('2025-26', 'F', 6, 6.5, '2025-12-01', 'x'),
+    ('2025-26', 'G', 7, 7.5, '2025-12-02', None),
+]
+# 沒有賽季欄位的關聯表：兩邊有重複列，需要去重
+HIST_LINKS = [(1, 'a'), (2, 'b'), (1, 'a'), (3, None)]
+CURR_LINKS = [(2, 'b'), (4, 'd'), (3, None)]
+
+@pytest.fixture
+def dbs(tmp_path, monkeypatch):
+    hist_path, curr_path = str(tmp_path / 'hist.db'), str(tmp_path / 'curr.db')
+    with sqlite3.connect(hist_path) as conn:
+        conn.execute("CREATE TABLE games (season TEXT, TEAM TEXT, INT_COL INTEGER, REAL_COL REAL, GAME_DATE TEXT)")
+        conn.execute("CREATE INDEX idx_team ON games (TEAM DESC)")   # 走索引時順序不能跟著變
+        conn.executemany("INSERT INTO games VALUES (?, ?, ?, ?, ?)", HIST_ROWS)
+        conn.execute("CREATE TABLE links (GAME_ID INTEGER, TAG TEXT)")
+        conn.executemany("INSERT INTO links VALUES (?, ?)", HIST_LINKS)
+    with sqlite3.connect(curr_path) as conn:
+        conn.execute("CREATE TABLE games (season TEXT, TEAM TEXT, INT_COL INTEGER, REAL_COL REAL, GAME_DATE TEXT, NOTE TEXT)")
+        conn.executemany("INSERT INTO games VALUES (?, ?, ?, ?, ?, ?)", CURR_ROWS)
+        conn.execute("CREATE TABLE links (GAME_ID INTEGER, TAG TEXT)")
+        conn.executemany("INSERT INTO links VALUES (?, ?)", CURR_LINKS)
+
+    monkeypatch.setattr(prepare_data, 'HISTORICAL_DB_PATH', hist_path)
+    monkeypatch.setattr(prepare_data, 'CURRENT_DB_PATH', curr_path)
+    monkeypatch.setattr(parquet_mirror, 'MIRROR_DIR', str(tmp_path / 'parquet'))
+    yield
+    nba_db.close_connection(curr_path)
+
+def load_both(monkeypatch, table_name, **kwargs):
+    frames = {}
+    for engine in ('parquet', 'sqlite'):
+        monkeypatch.setattr(prepare_data, 'MERGE_ENGINE', engine)
+        frames[engine] = prepare_data.load_merged_dataframe(table_name, **kwargs)
+    return frames['parquet'], frames['sqlite']
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'columns': ['TEAM', 'INT_COL']},
+    {'columns': ['TEAM', 'NOTE']},
+    {'date_from': '2015-02-01'},
+    {'seasons': ['2014-15']},
+    {'columns': ['TEAM', 'INT_COL'], 'seasons': ['2016-17']},   # INT_COL 全部有值 → int64
+    {'seasons': ['1999-00']},                                   # 篩完沒有資料
+    {'seasons': ['1999-00'], 'columns': ['REAL_COL', 'NOTE']},
+])
+def test_engines_identical(dbs, monkeypatch, kwargs):
+    df_parquet, df_sqlite = load_both(monkeypatch, 'games', **kwargs)
+    pd.testing.assert_frame_equal(df_parquet, df_sqlite)
+
+def test_engine_order_is_season_then_write_order(dbs, monkeypatch):
+    df_parquet, df_sqlite = load_both(monkeypatch, 'games')
+    assert list(df_sqlite['TEAM']) == ['B', 'E', 'D', 'A', 'F', 'G']
+    pd.testing.assert_frame_equal(df_parquet, df_sqlite)
+
+def test_empty_result_keeps_historical_dtypes(dbs, monkeypatch):
+    df_parquet, df_sqlite = load_both(monkeypatch, 'games', seasons=['1999-00'])
+    assert df_sqlite.empty
+    assert df_sqlite['INT_COL'].dtype == 'int64'
+    assert df_sqlite['REAL_COL'].dtype == 'float64'
+    pd.testing.assert_frame_equal(df_parquet, df_sqlite)
+
+@pytest.mark.parametrize('kwargs', [{}, {'columns': ['TAG']}])
+def test_dedup_engines_identical(dbs, monkeypatch, kwargs):
+    df_parquet, df_sqlite = load_both(monkeypatch, 'links', **kwargs)
+    pd.testing.assert_frame_equal(df_parquet, df_sqlite)
+    if not kwargs:
+        assert list(df_sqlite['GAME_ID']) == [1, 2, 3, 4]   # 保留第一次出現的位置
+
+@pytest.mark.parametrize('chunksize', [1, 2, 100])
+def test_iter_merged_matches_load_merged(dbs, monkeypatch, chunksize):
+    monkeypatch.setattr(prepare_data, '_historical_checked', True)
+    chunks = list(prepare_data.iter_merged('games', by='season', chunksize=chunksize,
+                                           columns=('TEAM', 'INT_COL'), order_by='GAME_DATE'))
+    # 同一個賽季一定落在同一批
+    seasons = [s for chunk in chunks for s in chunk['season'].unique()]
+    assert len(seasons) == len(set(seasons))
+
+    streamed = pd.concat(chunks, ignore_index=True)
+    expected = (prepare_data.load_merged_dataframe('games', columns=['TEAM', 'INT_COL', 'season', 'GAME_DATE'])
+                .sort_values(['season', 'GAME_DATE'], kind='stable', ignore_index=True))
+    pd.testing.assert_frame_equal(streamed, expected)
@@ -0,0 +1,44 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import AdaptiveRateLimiter, CircuitOpenError, BREAKER_THRESHOLD, BREAKER_COOLDOWN
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', lambda: now[0])
+    return now
+
+def tripped_limiter(clock):
+    limiter = AdaptiveRateLimiter('test', start_rate=1000, min_rate=1000, max_rate=1000)
+    for _ in range(BREAKER_THRESHOLD):
+        limiter.on_throttle('HTTP 429')
+    with pytest.raises(CircuitOpenError):
+        limiter._reserve()
+    clock[0] += BREAKER_COOLDOWN
+    return limiter
+
+def test_half_open_lets_one_probe_through_and_closes_on_success(clock):
+    limiter = tripped_limiter(clock)
+    limiter._reserve()                      # 探測請求
+    with pytest.raises(CircuitOpenError):   # 探測還沒回來，其他請求照樣失敗
+        limiter._reserve()
+    limiter.on_success()
+    limiter._reserve()
+    limiter._reserve()
+
+def test_throttled_probe_reopens_immediately_with_longer_cooldown(clock):
+    limiter = tripped_limiter(clock)
+    limiter._reserve()
+    limiter.on_throttle('HTTP 429')         # 一次就重新開啟，不用再累積到門檻
+    clock[0] += BREAKER_COOLDOWN
+    with pytest.raises(CircuitOpenError):
+        limiter._reserve()
+    clock[0] += BREAKER_COOLDOWN
+    limiter._reserve()
+
+def test_probe_without_outcome_is_replaced_after_timeout(clock):
+    limiter = tripped_limiter(clock)
+    limiter._reserve()                      # 探測請求沒有回報結果 (例如 404)
+    clock[0] += rate_limiter.BREAKER_PROBE_TIMEOUT
+    limiter._reserve()